@@ -0,0 +1,4 @@
+"""Benchmarks for the budget tracker services
+
+Run them from the repository root, e.g. python -m benchmarks.tableBenchmark
+"""
@@ -0,0 +1,52 @@
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+
+def timeCalls(call, count):
+    """Seconds each of count calls of call(number) took"""
+    samples = []
+    for number in range(count):
+        start = time.perf_counter()
+        call(number)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def describe(samples):
+    """Latency figures of a list of seconds, in milliseconds"""
+    ordered = sorted(samples)
+
+    def percentile(share):
+        return ordered[min(len(ordered) - 1, int(share * len(ordered)))] * 1000
+
+    return {
+        "calls": len(ordered),
+        "totalSeconds": sum(ordered),
+        "meanMs": sum(ordered) / len(ordered) * 1000,
+        "p50Ms": percentile(0.5),
+        "p95Ms": percentile(0.95),
+        "maxMs": ordered[-1] * 1000,
+    }
+
+def writeResults(path, benchmark, parameters, results):
+    """Write a run as JSON: what ran, on what, with which parameters, and its figures per case"""
+    run = {
+        "benchmark": benchmark,
+        "finished": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parameters": parameters,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+    print(f"results written to {path}")
+
+def printResults(results):
+    for name, figures in results.items():
+        first = f"  first {figures['firstMs']:8.1f}ms" if "firstMs" in figures else ""
+        print(f"{name:<28} {figures['calls']:>5} calls  mean {figures['meanMs']:8.2f}ms  "
+              f"p50 {figures['p50Ms']:8.2f}ms  p95 {figures['p95Ms']:8.2f}ms{first}")
@@ -0,0 +1,62 @@
+import argparse
+import datetime
+import random
+import time
+
+from benchmarks.ledgerGenerator import generateRows
+from transactionTable import dateOrdinal
+
+# forms strptime treats in its own ways: unpadded, padded with a space, out of range, other digits
+EDGE_CASES = [
+    "2024-01-05", "2024-1-5", "2024-01-5", "2024-1-05", "2024-01- 5", " 2024-01-05", "2024-01-05 ",
+    "2024-02-29", "2023-02-29", "2024-13-01", "2024-00-10", "2024-01-00", "2024-04-31", "0000-01-01",
+    "0001-01-01", "9999-12-31", "10000-01-01", "999-01-01", "2024/01/05", "2024-01-05T00:00", "",
+    "24-01-05", "2024--01-05", "2024-001-05", "٢٠٢٤-01-05", "２０２４-01-05",
+]
+
+def strptimeOrdinal(text):
+    try:
+        return datetime.datetime.strptime(text, "%Y-%m-%d").toordinal()
+    except ValueError:
+        return None
+
+def fuzzCases(count, seed=0):
+    rng = random.Random(seed)
+    alphabet = "0123456789- "
+    for _ in range(count):
+        yield "".join(rng.choice(alphabet) for _ in range(rng.randint(6, 12)))
+
+def timeIt(function, texts, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            function(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="The memoized date parser against strptime, for speed and same answers")
+    parser.add_argument("--rows", type=int, default=1000000, help="dates timed, as a generated ledger has them")
+    parser.add_argument("--days", type=int, default=5 * 365, help="days the dates are spread over")
+    parser.add_argument("--fuzz", type=int, default=200000, help="random strings checked against strptime")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for text in EDGE_CASES + list(fuzzCases(args.fuzz)):
+        dateOrdinal.cache_clear()
+        if dateOrdinal(text) != strptimeOrdinal(text):
+            raise SystemExit(f"{text!r}: {dateOrdinal(text)} but strptime gives {strptimeOrdinal(text)}")
+    print(f"same answers as strptime for {len(EDGE_CASES)} edge cases and {args.fuzz} random strings")
+
+    texts = [row[3] for row in generateRows(args.rows, days=args.days)]
+    strptime = timeIt(strptimeOrdinal, texts, args.repeat)
+    dateOrdinal.cache_clear()
+    cached = timeIt(dateOrdinal, texts, args.repeat)
+    print(f"{args.rows} dates over {args.days} days")
+    print(f"strptime     {strptime:6.2f}s  {strptime / args.rows * 1e9:6.0f}ns/date")
+    print(f"dateOrdinal  {cached:6.2f}s  {cached / args.rows * 1e9:6.0f}ns/date  {strptime / cached:5.1f}x")
+
+if __name__ == "__main__":
+    main()
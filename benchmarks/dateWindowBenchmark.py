@@ -0,0 +1,68 @@
+import argparse
+import csv
+import datetime
+import os
+import tempfile
+import time
+
+from benchmarks.ledgerGenerator import generateRows
+from transactionStore import getStore
+from transactionDates import getDateIndex
+from transactionSummary import createSummary, createWindowSummary, loadWindow
+
+WINDOWS = ["7", "30", "365"]
+
+def timeIt(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def strptimeScan(path, days):
+    # the dated branch as it used to be: every row parsed and strptime'd on every request
+    endDate = datetime.date.today()
+    startDate = endDate - datetime.timedelta(days=int(days))
+    total = 0.0
+    with open(path, "r") as f:
+        for row in csv.reader(f):
+            if len(row) >= 4:
+                transDate = datetime.datetime.strptime(row[3], "%Y-%m-%d").date()
+                if transDate < startDate or transDate > endDate:
+                    continue
+            total += float(row[2])
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the summary date window scan with the date index")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=5 * 365, help="days the transactions are spread over")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "transactions.csv")
+        with open(path, "w", newline="") as f:
+            csv.writer(f).writerows(generateRows(args.rows, days=args.days))
+
+        start = time.perf_counter()
+        table = getStore(path).getTable()
+        print(f"rows: {args.rows} over {args.days} days")
+        print(f"load table:       {time.perf_counter() - start:.3f}s")
+        start = time.perf_counter()
+        list(getDateIndex(path).window(0, 0))
+        print(f"build date index: {time.perf_counter() - start:.3f}s")
+
+        for days in WINDOWS:
+            if createSummary(table.iterRows(), days) != createWindowSummary(loadWindow(path, days), days):
+                raise SystemExit(f"summary {days} differs between the scan and the date index")
+            original = timeIt(lambda: strptimeScan(path, days), repeat=1)
+            scan = timeIt(lambda: createSummary(table.iterRows(), days))
+            indexed = timeIt(lambda: createWindowSummary(loadWindow(path, days), days))
+            rows = sum(1 for _ in loadWindow(path, days))
+            print(f"summary {days:>3}: strptime scan {original:.4f}s  table scan {scan:.4f}s  "
+                  f"date index {indexed:.4f}s  ({rows} rows read)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import datetime
+import json
+import os
+import tempfile
+import time
+
+from editHistory import EditHistory
+
+def rewriteEdit(path, transactionId, original, updatedData):
+    # what every edit used to cost: parse the whole JSON history, add one record, write it all back
+    with open(path, 'r') as f:
+        history = json.load(f)
+    history.setdefault(transactionId, []).append(
+        {"timestamp": datetime.datetime.now().isoformat(), "original": original, "updated": updatedData})
+    with open(path, 'w') as f:
+        json.dump(history, f, indent=2)
+
+def legacyHistory(path, edits, transactions):
+    history = {}
+    for number in range(edits):
+        transactionId = f"{number % transactions + 1:03d}"
+        history.setdefault(transactionId, []).append(
+            {"timestamp": datetime.datetime.now().isoformat(), "original": {"id": transactionId, "amount": "10"},
+             "updated": {"amount": str(number)}})
+    with open(path, 'w') as f:
+        json.dump(history, f, indent=2)
+
+def timeEach(function, count):
+    start = time.perf_counter()
+    for number in range(count):
+        function(number)
+    return (time.perf_counter() - start) / count
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of one edit and one history lookup against the size of the history")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated edits already in the history")
+    parser.add_argument("--transactions", type=int, default=1000, help="transactions the edits are spread over")
+    parser.add_argument("--edits", type=int, default=20, help="edits timed per size")
+    args = parser.parse_args()
+
+    for size in [int(count) for count in args.sizes.split(",")]:
+        with tempfile.TemporaryDirectory() as directory:
+            legacyPath = os.path.join(directory, "edit_history.json")
+            legacyHistory(legacyPath, size, args.transactions)
+            history = EditHistory(os.path.join(directory, "edit_history.jsonl"), legacyPath)
+            start = time.perf_counter()
+            history.repair()
+            migration = time.perf_counter() - start
+
+            rewrite = timeEach(lambda number: rewriteEdit(legacyPath, "001", {}, {"amount": str(number)}), args.edits)
+            append = timeEach(lambda number: history.append([("001", {}, {"amount": str(number)})]), args.edits)
+            lookup = timeEach(lambda number: history.get(str(number % args.transactions + 1)), args.edits)
+            print(f"{size:>8} edits  migration {migration:6.2f}s  edit: rewrite {rewrite * 1000:8.2f}ms  "
+                  f"append {append * 1000:6.2f}ms  lookup {lookup * 1000:6.2f}ms")
+
+if __name__ == "__main__":
+    main()
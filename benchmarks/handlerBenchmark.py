@@ -0,0 +1,50 @@
+import argparse
+import contextlib
+import os
+import random
+import tempfile
+
+from benchmarks.benchmarkResults import timeCalls, describe, writeResults, printResults
+from benchmarks.serviceCases import addLedgerOptions, ledgerParameters, prepareLedger, serviceCases, encodeRequest, checkReply
+from resultCache import ResultCache
+from servicePool import handleInProcess
+
+def handlers():
+    # imported once the ledger is in place, the modules open it by its relative name
+    import transactionSummary, editTransactions, deleteTransactions, searchTransactions
+    # no cache, so every call is answered from the ledger
+    transactionSummary.resultCache = ResultCache(0)
+    searchTransactions.resultCache = ResultCache(0)
+    return {"A": transactionSummary.handleRequest, "B": editTransactions.handleRequest,
+            "C": deleteTransactions.handleRequest, "D": searchTransactions.handleRequest}
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each service command's handler in this process, no sockets")
+    args = addLedgerOptions(parser).parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        descriptions = prepareLedger(directory, args)
+        handle = handlers()
+        for service, name, make in serviceCases(args.rows, descriptions):
+            rng = random.Random(args.seed)
+
+            def call(number):
+                # handleInProcess, so a streamed reply is read to its end as a worker would
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    reply = handleInProcess(handle[service], encodeRequest(make(rng, number)))
+                checkReply(service, name, reply)
+
+            # the first call loads the ledger's indexes and is kept apart from the rest
+            first = timeCalls(call, 1)[0]
+            figures = describe(timeCalls(lambda number: call(number + 1), args.calls))
+            results[f"{service} {name}"] = dict(figures, firstMs=first * 1000)
+        os.chdir(os.path.dirname(directory))
+
+    printResults(results)
+    if args.out:
+        writeResults(args.out, "handlers", ledgerParameters(args), results)
+
+if __name__ == "__main__":
+    main()
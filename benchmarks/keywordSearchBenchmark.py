@@ -0,0 +1,69 @@
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.ledgerGenerator import generateRows, DESCRIPTIONS
+from transactionStore import getStore
+from transactionKeywords import KeywordIndex
+from mutationLog import LedgerWriter
+from transactionPipeline import ledgerRows, validRows, withIds
+from transactionTable import formatId
+import searchTransactions
+
+def loadTransactions(path):
+    """A dict per row, as Service D built them before it kept a table"""
+    transactions = []
+    for transactionId, row in withIds(validRows(ledgerRows(path))):
+        transaction = {
+            "id": formatId(transactionId),
+            "type": row[0],
+            "description": row[1],
+            "amount": row[2]
+        }
+        if len(row) >= 4 and row[3]:
+            transaction["date"] = row[3]
+        transactions.append(transaction)
+    return transactions
+
+def baselineSearch(transactions, keyword):
+    # the original linear search, every description of every row
+    results = [t for t in transactions if keyword.lower() in t['description'].lower()]
+    return {"success": True, "count": len(results), "results": results}
+
+def timeIt(function, words):
+    start = time.perf_counter()
+    for word in words:
+        function(word)
+    return (time.perf_counter() - start) / len(words)
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the keyword index against the scan and the linear search "
+                                                 "(tests/test_keywordSearch.py checks they agree)")
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "transactions.csv")
+        with open(path, "w", newline="") as f:
+            csv.writer(f).writerows(generateRows(args.rows))
+
+        # a ledger with many distinct descriptions, where the scan has to look at all of them
+        with LedgerWriter(path) as writer:
+            for i in range(args.rows // 10):
+                writer.add(["expense", f"Invoice {i} {rng.choice(DESCRIPTIONS)}", "1", "2024-03-03"])
+        table = getStore(path).getTable()
+        index = KeywordIndex()
+        index.sync(table)
+        rare = ["Invoice 123 ", "invoice 9999", "xyz", "Textbook"]
+        print(f"rows: {len(table)}, distinct descriptions: {len(table.descPool)}")
+        transactions = loadTransactions(path)
+        print(f"linear: {timeIt(lambda word: baselineSearch(transactions, word), rare) * 1000:.2f} ms/search")
+        print(f"scan:  {timeIt(lambda word: searchTransactions.scanByKeyword(table, word), rare) * 1000:.2f} ms/search")
+        print(f"index: {timeIt(index.search, rare) * 1000:.2f} ms/search")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import csv
+import datetime
+import random
+
+DESCRIPTIONS = [
+    "Salary", "Freelance", "Rent", "Groceries", "Gym membership", "Textbook",
+    "Coffee", "Electric bill", "Internet", "Phone bill", "Restaurant", "Gas",
+    "Movie tickets", "Bonus", "Insurance", "Parking", "Books", "Clothes",
+]
+
+def vocabulary(size):
+    """size descriptions: the usual ones first, then numbered merchants"""
+    if size <= len(DESCRIPTIONS):
+        return DESCRIPTIONS[:max(1, size)]
+    return DESCRIPTIONS + [f"Merchant {number:06d}" for number in range(size - len(DESCRIPTIONS))]
+
+def generateRows(count, seed=0, days=365, endDate=None, descriptions=DESCRIPTIONS, incomeRatio=0.2):
+    """Yield count deterministic transaction rows spread over the last days days
+
+    descriptions is the vocabulary the descriptions are drawn from and
+    incomeRatio the share of income rows, the defaults give the same rows
+    as always.
+    """
+    rng = random.Random(seed)
+    endOrdinal = (endDate or datetime.date.today()).toordinal()
+    for _ in range(count):
+        transType = "income" if rng.random() < incomeRatio else "expense"
+        desc = rng.choice(descriptions)
+        amount = f"{rng.randint(1, 500000) / 100:g}"
+        date = datetime.date.fromordinal(endOrdinal - rng.randrange(days))
+        yield [transType, desc, amount, date.isoformat()]
+
+def writeLedger(path, count, seed=0, days=365, descriptions=DESCRIPTIONS, incomeRatio=0.2):
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerows(generateRows(count, seed, days, descriptions=descriptions, incomeRatio=incomeRatio))
@@ -0,0 +1,52 @@
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.ledgerGenerator import writeLedger
+from mutationLog import LedgerWriter
+from transactionSummary import createSummary, parseCSV, parallelSummary, getPool
+
+def timeIt(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def changeSome(path):
+    # a few log records, so the parallel summary has an overlay to apply too
+    with LedgerWriter(path) as writer:
+        writer.edit(2, ["income", "Edited", "12.5", "2020-01-01"], writer.getRow(2))
+        writer.delete(5, writer.getRow(5))
+        writer.add(["expense", "Added", "3", "2020-01-02"])
+
+def main():
+    parser = argparse.ArgumentParser(description="Summary latency of the serial scan against the process pool")
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--processes", default="1,2,4,8", help="comma separated pool sizes")
+    parser.add_argument("--range", default="all", help="summary to time ('all' or a number of days)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "transactions.csv")
+        writeLedger(path, args.rows, days=5 * 365)
+        changeSome(path)
+        print(f"{args.rows} rows, {os.path.getsize(path) / 2**20:.0f} MB, summary {args.range}, "
+              f"{os.cpu_count()} CPUs")
+
+        expected = createSummary(parseCSV(path), args.range)
+        serial = timeIt(lambda: createSummary(parseCSV(path), args.range), args.repeat)
+        print(f"serial      {serial:7.2f}s")
+        for processes in [int(count) for count in args.processes.split(",")]:
+            getPool(processes)  # started outside the timing
+            if parallelSummary(path, args.range, processes) != expected:
+                raise SystemExit(f"parallel summary with {processes} processes differs from the serial one")
+            seconds = timeIt(lambda: parallelSummary(path, args.range, processes), args.repeat)
+            print(f"{processes:>3} processes {seconds:7.2f}s  {serial / seconds:5.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.benchmarkResults import timeCalls, describe, writeResults, printResults
+from benchmarks.serviceCases import addLedgerOptions, ledgerParameters, prepareLedger, serviceCases, encodeRequest, checkReply
+from serviceClient import ServiceClient, SERVICE_ADDRESSES
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# each service's script, a cheap request it answers once it is up, and the one that stops it
+SERVICES = {
+    "A": ("transactionSummary.py", b"cache stats", b"end 0"),
+    "B": ("editTransactions.py", {"command": "history", "id": "1"}, {"command": "end"}),
+    "C": ("deleteTransactions.py", {"command": "delete", "id": "1"}, {"command": "end"}),
+    "D": ("searchTransactions.py", {"command": "cache_stats"}, {"command": "end"}),
+}
+
+def startService(service, directory, workers):
+    command = [sys.executable, os.path.join(REPO, SERVICES[service][0]), "--workers", str(workers)]
+    if service in ("A", "D"):
+        command += ["--cache-entries", "0"]  # every request is answered from the ledger
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO, os.environ.get("PYTHONPATH")])))
+    return subprocess.Popen(command, cwd=directory, env=env, stdout=subprocess.DEVNULL)
+
+def main():
+    parser = argparse.ArgumentParser(description="Start the four services on a generated ledger and time each command over ZeroMQ")
+    parser.add_argument("--workers", type=int, default=4, help="workers each service runs")
+    args = addLedgerOptions(parser).parse_args()
+
+    client = ServiceClient(SERVICE_ADDRESSES, timeout=300)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        descriptions = prepareLedger(directory, args)
+        processes = {service: startService(service, directory, args.workers) for service in SERVICES}
+        try:
+            for service, (_, ready, _) in SERVICES.items():
+                # answered once the service is listening, it may have to load the ledger first
+                client.requestBytes(service, encodeRequest(ready), timeout=300)
+            for service, name, make in serviceCases(args.rows, descriptions):
+                rng = random.Random(args.seed)
+
+                def call(number):
+                    checkReply(service, name, client.requestBytes(service, encodeRequest(make(rng, number))))
+
+                first = timeCalls(call, 1)[0]
+                figures = describe(timeCalls(lambda number: call(number + 1), args.calls))
+                results[f"{service} {name}"] = dict(figures, firstMs=first * 1000)
+        finally:
+            for service, process in processes.items():
+                if process.poll() is None:
+                    client.requestBytes(service, encodeRequest(SERVICES[service][2]))
+                    process.wait(timeout=30)
+            os.chdir(os.path.dirname(directory))
+    client.close()
+
+    printResults(results)
+    if args.out:
+        writeResults(args.out, "services", dict(ledgerParameters(args), workers=args.workers), results)
+
+if __name__ == "__main__":
+    main()
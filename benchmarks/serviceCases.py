@@ -0,0 +1,81 @@
+import json
+import os
+
+from benchmarks.ledgerGenerator import DESCRIPTIONS, vocabulary, writeLedger
+
+# requests of every service command the benchmarks time, in the order they
+# run: the reads first, then edits and last the deletes, which take IDs
+# from the end of the ledger so no request asks for a deleted transaction
+
+def addLedgerOptions(parser):
+    """The options of the generated ledger both service benchmarks take"""
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=3 * 365, help="days the dates are spread over")
+    parser.add_argument("--descriptions", type=int, default=len(DESCRIPTIONS), help="size of the description vocabulary")
+    parser.add_argument("--income-ratio", type=float, default=0.2, help="share of income transactions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--calls", type=int, default=50, help="requests timed per command")
+    parser.add_argument("--out", help="JSON file the results are written to")
+    return parser
+
+def ledgerParameters(args):
+    return {"rows": args.rows, "days": args.days, "descriptions": args.descriptions,
+            "incomeRatio": args.income_ratio, "seed": args.seed, "calls": args.calls}
+
+def prepareLedger(directory, args):
+    """Write the ledger into directory, the current one, and give it IDs as the first start of main.py does"""
+    descriptions = vocabulary(args.descriptions)
+    writeLedger(os.path.join(directory, "transactions.csv"), args.rows, args.seed, args.days,
+                descriptions, args.income_ratio)
+    import main
+    main.migrateTransactions()
+    return descriptions
+
+def randomAmount(rng):
+    return f"{rng.randint(1, 500000) / 100:g}"
+
+def keyword(rng, descriptions):
+    description = rng.choice(descriptions)
+    return description[:rng.randint(3, len(description))]
+
+def serviceCases(rows, descriptions=DESCRIPTIONS, batchSize=100):
+    """[(service, name, make(rng, number))], make gives the request: bytes for A, a JSON dict for B, C and D"""
+    def someId(rng):
+        return str(rng.randint(1, rows))
+
+    return [
+        ("A", "summary all", lambda rng, number: b"summary all"),
+        ("A", "summary 30", lambda rng, number: b"summary 30"),
+        ("A", "summary 365 page", lambda rng, number: b"summary 365 offset=0 limit=100"),
+        ("A", "rollup month", lambda rng, number: b"rollup month"),
+        ("A", "rollup description", lambda rng, number: b"rollup description"),
+        ("D", "search_keyword", lambda rng, number: {"command": "search_keyword", "keyword": keyword(rng, descriptions)}),
+        ("D", "search_keyword page", lambda rng, number: {"command": "search_keyword", "keyword": keyword(rng, descriptions),
+                                                         "limit": 100}),
+        ("D", "filter_amount", lambda rng, number: {"command": "filter_amount", "amount": randomAmount(rng)}),
+        ("D", "filter_amount_range", lambda rng, number: {"command": "filter_amount_range", "min": rng.randint(1, 4900),
+                                                          "max": rng.randint(4900, 5000)}),
+        ("D", "top_amounts", lambda rng, number: {"command": "top_amounts", "count": 10,
+                                                  "type": rng.choice(["income", "expense", None])}),
+        ("B", "edit", lambda rng, number: {"command": "edit", "id": someId(rng), "data": {"amount": randomAmount(rng)}}),
+        ("B", "edit_batch", lambda rng, number: {"command": "edit_batch", "updates": [
+            {"id": someId(rng), "data": {"amount": randomAmount(rng)}} for _ in range(batchSize)]}),
+        ("B", "history", lambda rng, number: {"command": "history", "id": someId(rng)}),
+        ("C", "delete preview", lambda rng, number: {"command": "delete", "id": someId(rng)}),
+        ("C", "delete", lambda rng, number: {"command": "delete", "id": str(rows - number), "confirm": True}),
+    ]
+
+def encodeRequest(request):
+    return request if isinstance(request, bytes) else json.dumps(request).encode()
+
+def checkReply(service, name, reply):
+    """Raise SystemExit if a reply is an error, a benchmark of failing requests means nothing"""
+    if service == "A" and not reply.lstrip().startswith(b"{"):
+        failed = reply.startswith(b"Error") or reply.startswith(b"Unknown")
+        message = reply[:200].decode(errors="replace")
+    else:
+        result = json.loads(reply)
+        failed = result.get("success") is False
+        message = result.get("message")
+    if failed:
+        raise SystemExit(f"{service} {name} failed: {message}")
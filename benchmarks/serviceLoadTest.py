@@ -0,0 +1,94 @@
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.ledgerGenerator import writeLedger
+from serviceClient import ServiceClient, SERVICE_ADDRESSES
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the script and a request generator for each service that can be load tested
+SERVICES = {
+    "A": ("transactionSummary.py", lambda rng: ("bytes", f"summary {rng.choice([7, 14, 30])}".encode())),
+    "D": ("searchTransactions.py", lambda rng: ("json", rng.choice([
+        {"command": "filter_amount", "amount": f"{rng.randint(1, 5000)}"},
+        {"command": "filter_amount_range", "min": rng.randint(1, 4990), "max": rng.randint(4990, 5000)},
+        {"command": "top_amounts", "count": 10, "type": rng.choice(["income", "expense", None])},
+        {"command": "search_keyword", "keyword": rng.choice(["Gym", "Textbook", "Movie"])},
+    ]))),
+}
+
+def send(client, service, request, timeout=None):
+    kind, payload = request
+    if kind == "bytes":
+        return client.requestBytes(service, payload, timeout)
+    return client.requestJson(service, payload, timeout)
+
+def startService(service, directory, workers, processes):
+    script, _ = SERVICES[service]
+    command = [sys.executable, os.path.join(REPO, script), "--workers", str(workers)]
+    if processes:
+        command.append("--processes")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO, os.environ.get("PYTHONPATH")])))
+    process = subprocess.Popen(command, cwd=directory, env=env, stdout=subprocess.DEVNULL)
+    return process
+
+def stopService(client, service, process):
+    send(client, service, ("bytes", b"end 0") if service == "A" else ("json", {"command": "end"}))
+    process.wait(timeout=30)
+
+def measure(client, service, clients, seconds):
+    """Requests per second answered with clients threads sending back to back"""
+    deadline = time.perf_counter() + seconds
+    counts = [0] * clients
+
+    def run(number):
+        rng = random.Random(number)
+        while time.perf_counter() < deadline:
+            send(client, service, SERVICES[service][1](rng))
+            counts[number] += 1
+
+    threads = [threading.Thread(target=run, args=(number,)) for number in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Requests per second of a service as its worker pool grows")
+    parser.add_argument("--service", choices=sorted(SERVICES), default="A")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--workers", default="1,2,4,8", help="comma separated worker counts")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent client threads")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--mode", choices=["threads", "processes", "both"], default="both")
+    args = parser.parse_args()
+
+    modes = [False, True] if args.mode == "both" else [args.mode == "processes"]
+    client = ServiceClient(SERVICE_ADDRESSES, timeout=120, poolSize=args.clients)
+    with tempfile.TemporaryDirectory() as directory:
+        writeLedger(os.path.join(directory, "transactions.csv"), args.rows, days=3 * 365)
+        print(f"service {args.service}, {args.rows} rows, {args.clients} clients, {args.seconds:g}s per run")
+        for processes in modes:
+            for workers in [int(count) for count in args.workers.split(",")]:
+                process = startService(args.service, directory, workers, processes)
+                try:
+                    # the first requests wait for the service to start and every worker to load the ledger
+                    send(client, args.service, SERVICES[args.service][1](random.Random(0)), timeout=300)
+                    measure(client, args.service, args.clients, 1)
+                    rate = measure(client, args.service, args.clients, args.seconds)
+                finally:
+                    stopService(client, args.service, process)
+                kind = "processes" if processes else "threads"
+                print(f"{workers:>3} {kind:<9} {rate:8.1f} requests/s")
+    client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.ledgerGenerator import writeLedger
+from transactionIndex import INDEX_SUFFIX
+from transactionStore import META_SUFFIX
+
+# what main.py does before the menu comes up
+STARTUP = "import main; main.migrateTransactions()"
+
+def timeStart(directory, code, repeat):
+    # a new interpreter each time, in the ledger's directory as main.py expects
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=directory, env=env, check=True, stdout=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def dropMark(path):
+    # the meta as it was before startup kept the mark
+    with open(path + META_SUFFIX) as f:
+        meta = json.load(f)
+    meta.pop("migrated", None)
+    with open(path + META_SUFFIX, 'w') as f:
+        json.dump(meta, f)
+
+def main():
+    parser = argparse.ArgumentParser(description="Time from launching main.py to its menu against the ledger size")
+    parser.add_argument("--rows", default="1000,10000000", help="comma separated ledger sizes")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"interpreter alone {timeStart(directory, 'pass', args.repeat) * 1000:7.0f}ms")
+    for rows in [int(count) for count in args.rows.split(",")]:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "transactions.csv")
+            writeLedger(path, rows, days=5 * 365)
+            # the generated rows have no IDs yet, the first start writes them in
+            migrate = timeStart(directory, STARTUP, 1)
+            marked = timeStart(directory, STARTUP, args.repeat)
+            dropMark(path)
+            indexed = timeStart(directory, STARTUP, 1)  # reads the id index header, then marks the ledger
+            dropMark(path)
+            os.remove(path + INDEX_SUFFIX)
+            scanned = timeStart(directory, STARTUP, 1)  # no index to ask, the whole file is scanned
+            print(f"{rows:>9} rows  first start (migration) {migrate * 1000:8.0f}ms  "
+                  f"unmarked: index {indexed * 1000:7.0f}ms  scan {scanned * 1000:7.0f}ms  "
+                  f"marked {marked * 1000:5.0f}ms")
+
+if __name__ == "__main__":
+    main()
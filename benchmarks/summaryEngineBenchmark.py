@@ -0,0 +1,44 @@
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.ledgerGenerator import writeLedger
+import transactionArrays
+import transactionSummary
+
+def timeIt(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def summary(path, timeRange, arrays):
+    transactionSummary.useArrays = arrays
+    return "".join(transactionSummary.summaryParts(path, timeRange))
+
+def main():
+    parser = argparse.ArgumentParser(description="Summary latency of the row by row loop against the NumPy engine")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--ranges", default="all,365,30", help="comma separated summaries to time")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    if not transactionArrays.available():
+        raise SystemExit("NumPy isn't installed, there is only the pure-Python engine")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "transactions.csv")
+        writeLedger(path, args.rows, days=5 * 365)
+        print(f"{args.rows} rows, {os.path.getsize(path) / 2**20:.0f} MB")
+        for timeRange in args.ranges.split(","):
+            if summary(path, timeRange, True) != summary(path, timeRange, False):
+                raise SystemExit(f"the engines disagree on summary {timeRange}")
+            python = timeIt(lambda: summary(path, timeRange, False), args.repeat)
+            numpy = timeIt(lambda: summary(path, timeRange, True), args.repeat)
+            print(f"summary {timeRange:>4}  python {python:6.2f}s  numpy {numpy:6.2f}s  {python / numpy:5.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import gc
+import time
+import tracemalloc
+
+from benchmarks.ledgerGenerator import generateRows
+from transactionTable import TransactionTable, TYPE_EXPENSE
+
+def buildDicts(rows):
+    # what loadTransactions used to build for every request
+    transactions = []
+    for idx, row in enumerate(rows):
+        transaction = {
+            "id": f"{idx+1:03d}",
+            "type": row[0],
+            "description": row[1],
+            "amount": row[2],
+            "date": row[3]
+        }
+        transactions.append(transaction)
+    return transactions
+
+def measureMemory(build, count):
+    # rows are generated inside the trace so the strings each representation keeps are counted
+    gc.collect()
+    tracemalloc.start()
+    result = build(generateRows(count))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+def timeIt(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def scanDicts(transactions):
+    keywordHits = [t for t in transactions if "bill" in t["description"].lower()]
+    amountHits = [t for t in transactions if float(t["amount"]) == 60.0]
+    expense = sum(float(t["amount"]) for t in transactions if t["type"] == "expense")
+    return len(keywordHits), len(amountHits), expense
+
+def scanTable(table):
+    matching = {i for i, desc in enumerate(table.descPool) if "bill" in desc.lower()}
+    keywordHits = [i for i, descId in enumerate(table.descIds) if descId in matching]
+    amountHits = [i for i, cents in enumerate(table.amounts) if cents == 6000]
+    types = table.types
+    expense = sum(cents for i, cents in enumerate(table.amounts) if types[i] == TYPE_EXPENSE)
+    return len(keywordHits), len(amountHits), expense
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare list-of-dicts and columnar transactions")
+    parser.add_argument("--rows", type=int, default=500000)
+    args = parser.parse_args()
+
+    transactions, dictBytes = measureMemory(buildDicts, args.rows)
+    table, tableBytes = measureMemory(TransactionTable.fromRows, args.rows)
+
+    print(f"rows: {args.rows}")
+    print(f"dicts:  {dictBytes / args.rows:8.1f} bytes/row  scan {timeIt(lambda: scanDicts(transactions)):.3f}s")
+    print(f"table:  {tableBytes / args.rows:8.1f} bytes/row  scan {timeIt(lambda: scanTable(table)):.3f}s")
+
+if __name__ == "__main__":
+    main()
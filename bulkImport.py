@@ -0,0 +1,191 @@
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import os
+import sys
+import time
+from transactionPipeline import ledgerRows, validRows
+from money import parseAmount, isAmount
+from transactionTable import parseDate, dateOrdinal
+from mutationLog import LedgerWriter, compact, pendingRecords, COMPACT_MIN_RECORDS
+
+BATCH_SIZE = 10000  # rows validated and appended together
+FIELDS = ["type", "description", "amount", "date"]
+READ_SIZE = 1 << 20  # bytes read at a time from a JSON file
+MAX_ERRORS = 10  # invalid rows shown in the report
+
+def csvRecords(f):
+    """Rows of an import CSV as dicts, by header if it has one or else by position (type, description, amount, date)"""
+    reader = csv.reader(f)
+    first = next(reader, None)
+    if first is None:
+        return
+    names = [name.strip().lower() for name in first]
+    if "amount" in names:
+        columns = [(field, names.index(field)) for field in FIELDS if field in names]
+    else:
+        columns = list(zip(FIELDS, range(len(FIELDS))))
+        reader = itertools.chain([first], reader)
+    for row in reader:
+        yield {field: row[column] for field, column in columns if column < len(row)}
+
+def jsonRecords(f):
+    """Objects of a JSON array or of JSON lines, decoded as the file is read"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    done = False
+    while True:
+        position = 0
+        while True:
+            # skip what sits between the objects of an array or lines
+            while position < len(buffer) and buffer[position] in " \t\r\n,[]":
+                position += 1
+            if position == len(buffer):
+                break
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if done:
+                    raise
+                break  # the object goes on in the next chunk
+            yield record
+            position = end
+        if done:
+            return
+        chunk = f.read(READ_SIZE)
+        done = not chunk
+        buffer = buffer[position:] + chunk
+
+def readRecords(source, fileFormat=None):
+    """Records (dicts) of an import file, read one at a time"""
+    if fileFormat is None:
+        fileFormat = "json" if os.path.splitext(source)[1].lower() in (".json", ".jsonl") else "csv"
+    with open(source, 'r', newline='', encoding="utf-8-sig") as f:
+        yield from (csvRecords(f) if fileFormat == "csv" else jsonRecords(f))
+
+def checkDate(text, dates):
+    """Date as YYYY-MM-DD, None if it isn't a date; dates remembers the ones already checked"""
+    if text in dates:
+        return dates[text]
+    if parseDate(text) is not None:
+        date = text
+    else:
+        # what addTransaction accepts, written back the way it writes dates
+        ordinal = dateOrdinal(text)
+        date = datetime.date.fromordinal(ordinal).strftime("%Y-%m-%d") if ordinal is not None else None
+    dates[text] = date
+    return date
+
+def validateBatch(records, today):
+    """(rows to add, errors) for a batch of records, rows are [type, description, amount, date]"""
+    rows, errors = [], []
+    dates = {}  # a bank export repeats the same few dates, each is only parsed once a batch
+    for number, record in records:
+        if not isinstance(record, dict):
+            errors.append((number, "not an object"))
+            continue
+        # a JSON amount can be a number, 0 included
+        values = {field: "" if record.get(field) is None else str(record[field]).strip() for field in FIELDS}
+        amount, transType = values["amount"], values["type"].lower()
+        if not transType and amount:
+            # a signed amount with no type, as most bank exports have
+            transType = "expense" if amount[0] == "-" else "income"
+            if amount[0] in "+-":
+                amount = amount[1:]
+        if transType not in ("income", "expense"):
+            errors.append((number, "type must be income or expense"))
+            continue
+        if not values["description"]:
+            errors.append((number, "no description"))
+            continue
+        if not isAmount(amount):
+            errors.append((number, f"invalid amount {amount!r}"))
+            continue
+        date = checkDate(values["date"], dates) if values["date"] else today
+        if date is None:
+            errors.append((number, f"invalid date {values['date']!r}"))
+            continue
+        rows.append([transType, values["description"], amount, date])
+    return rows, errors
+
+def rowKey(row):
+    # the fields themselves, so no two transactions share a key; 12.5 and 12.50 are the
+    # same amount, and the descriptions and dates a ledger repeats are kept once
+    amount = parseAmount(row[2])
+    return (row[0], sys.intern(row[1]), amount[0] if amount is not None else row[2],
+            sys.intern(row[3]) if len(row) > 3 else "")
+
+def existingKeys(path):
+    """How many times each transaction (type, description, amount, date) is in the ledger"""
+    counts = {}
+    for row in validRows(ledgerRows(path)):
+        key = rowKey(row)
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+def importFile(path, source, fileFormat=None, batchSize=BATCH_SIZE, dedupe=True, report=print):
+    """Add every valid transaction of source to the ledger at path, returns the counts
+
+    Each batch is one log append, so the ledger's index and totals are
+    updated once per batch; the log is folded into the base file at the
+    end if it holds COMPACT_MIN_RECORDS records, as the services'
+    compactor would. With dedupe a row is skipped once for each time the
+    same transaction is already in the ledger, so importing an overlapping
+    export again doesn't add its rows twice.
+    """
+    start = time.perf_counter()
+    stats = {"read": 0, "imported": 0, "duplicates": 0, "invalid": 0}
+    errors = []
+    counts = existingKeys(path) if dedupe else {}
+    today = datetime.date.today().strftime("%Y-%m-%d")
+
+    records = enumerate(readRecords(source, fileFormat), 1)
+    while True:
+        batch = list(itertools.islice(records, batchSize))
+        if not batch:
+            break
+        stats["read"] += len(batch)
+        rows, batchErrors = validateBatch(batch, today)
+        stats["invalid"] += len(batchErrors)
+        errors.extend(batchErrors[:MAX_ERRORS - len(errors)])
+
+        added = 0
+        with LedgerWriter(path) as writer:
+            for row in rows:
+                if dedupe:
+                    key = rowKey(row)
+                    if counts.get(key):
+                        counts[key] -= 1
+                        stats["duplicates"] += 1
+                        continue
+                writer.add(row)
+                added += 1
+        stats["imported"] += added
+        seconds = time.perf_counter() - start
+        report(f"{stats['read']} rows read, {stats['imported']} imported ({stats['read'] / seconds:.0f} rows/s)")
+
+    if stats["imported"] and pendingRecords(path) >= COMPACT_MIN_RECORDS:
+        compact(path)
+    stats["seconds"] = time.perf_counter() - start
+    for number, message in errors:
+        report(f"Skipped record {number}: {message}")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Add the transactions of a CSV or JSON file to the ledger")
+    parser.add_argument("source", help="CSV (type, description, amount, date) or JSON array / JSON lines of objects")
+    parser.add_argument("--file", default="transactions.csv", help="ledger to import into")
+    parser.add_argument("--format", choices=["csv", "json"], help="default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--keep-duplicates", action="store_true", help="add rows already in the ledger again")
+    args = parser.parse_args()
+
+    stats = importFile(args.file, args.source, args.format, max(1, args.batch_size), not args.keep_duplicates)
+    rate = stats["read"] / stats["seconds"] if stats["seconds"] else 0
+    print(f"Imported {stats['imported']} of {stats['read']} rows in {stats['seconds']:.1f}s ({rate:.0f} rows/s), "
+          f"{stats['duplicates']} duplicates and {stats['invalid']} invalid rows skipped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import argparse
+import csv
+import os
+from transactionStore import getStore, getLedgerLock, _signature, TMP_SUFFIX
+from transactionIndex import readTail
+from transactionBinary import BinaryWriter, openLedger, BINARY_SUFFIX
+
+def csvToBinary(path):
+    """Write the binary copy of a base CSV next to it (path + ".bin")
+
+    From then on the services load the ledger from the binary file and
+    compactions keep it up to date. Returns the number of rows.
+    """
+    store = getStore(path)
+    signature = _signature(path)
+    if signature is None:
+        raise FileNotFoundError(path)
+    binary = BinaryWriter(path)
+    # parsed the way the store parses it, the ledger lock is only needed to check nothing changed
+    with open(path, 'r', newline='', encoding=store.encoding) as f:
+        for row in csv.reader(f):
+            binary.add(row)
+    with getLedgerLock(path).hold():
+        if _signature(path) != signature:
+            binary.discard()
+            raise RuntimeError(f"{path} changed while it was converted, try again")
+        binary.finish(signature, readTail(path, signature[1]))
+    return binary.rows
+
+def binaryToCsv(path, outPath):
+    """Write the rows of the binary copy of path as CSV to outPath, returns the number of rows
+
+    Writing to path itself restores a lost or damaged base CSV, the binary
+    copy is then marked as matching it.
+    """
+    ledger = openLedger(path + BINARY_SUFFIX)
+    if ledger is None:
+        raise FileNotFoundError(path + BINARY_SUFFIX)
+    tmpPath = outPath + TMP_SUFFIX
+    with ledger:
+        with open(tmpPath, 'w', newline='', encoding=getStore(path).encoding) as f:
+            csv.writer(f).writerows(ledger.iterRows())
+        rows = len(ledger)
+    if os.path.abspath(outPath) != os.path.abspath(path):
+        os.replace(tmpPath, outPath)
+        return rows
+
+    with getLedgerLock(path).hold(exclusive=True):
+        os.replace(tmpPath, path)
+    csvToBinary(path)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the ledger between CSV and the binary format")
+    parser.add_argument("direction", choices=["to-binary", "to-csv"])
+    parser.add_argument("--file", default="transactions.csv", help="ledger CSV (the binary file is FILE.bin)")
+    parser.add_argument("--out", help="CSV to write for to-csv (default: FILE itself)")
+    args = parser.parse_args()
+
+    if args.direction == "to-binary":
+        rows = csvToBinary(args.file)
+        print(f"Wrote {rows} rows to {args.file + BINARY_SUFFIX}")
+    else:
+        outPath = args.out or args.file
+        rows = binaryToCsv(args.file, outPath)
+        print(f"Wrote {rows} rows to {outPath}")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
-import zmq
-import csv
 import os
 import time
 from pathlib import Path
+from transactionStore import LOG_SUFFIX
+from transactionIndex import lookupTransaction
+from transactionTable import parseId
+from mutationLog import LedgerWriter, startCompactor
+from servicePool import serve, serviceArguments, decodeJson, encodeJson, READ, WRITE, END, DEFAULT_WORKERS
 
 # path to transactions
 transactionsFile = "transactions.csv"
@@ -10,125 +13,193 @@ transactionsFile = "transactions.csv"
 def printDebug(message):
     print(f"[DEBUG {time.strftime('%H:%M:%S')}] {message}")
 
+def transactionDetails(row):
+    # building object
+    transaction = {
+        "type": row[0],
+        "description": row[1],
+        "amount": row[2]
+    }
+    
+    # add date if available
+    if len(row) >= 4 and row[3]:
+        transaction["date"] = row[3]
+    return transaction
+
 def deleteTransaction(transactionId, confirm=False):
     printDebug(f"Received delete request for ID: '{transactionId}', confirm={confirm}")
     
-    if not Path(transactionsFile).exists():
+    if not (Path(transactionsFile).exists() or Path(transactionsFile + LOG_SUFFIX).exists()):
         printDebug(f"CSV file not found: {transactionsFile}")
         return {"success": False, "message": "No transactions file found"}
     
-    # read all transactions from the CSV
-    allRows = []
+    # IDs are stored with each row (001, 002, etc.), the index seeks straight to it
+    idNum = parseId(transactionId)
+    if idNum is None:
+        printDebug(f"Invalid ID format: {transactionId}")
+        return {"success": False, "message": "Invalid transaction ID. Please enter a number."}
+    printDebug(f"Converted '{transactionId}' number {idNum}")
+    
     try:
-        with open(transactionsFile, 'r') as f:
-            reader = csv.reader(f)
-            allRows = list(reader)
-            printDebug(f"Loaded {len(allRows)} rows from CSV")
+        row = lookupTransaction(transactionsFile, idNum)
     except Exception as e:
         printDebug(f"Error reading CSV: {e}")
         return {"success": False, "message": f"Error reading transactions: {str(e)}"}
     
-    # we convert our 001, 002, etc. IDs to 0, 1, etc. for list index
+    if row is None:
+        printDebug(f"No transaction with ID {idNum}")
+        return {"success": False, "message": f"Transaction ID {transactionId} not found"}
+    printDebug(f"Found row for ID {idNum}: {row}")
+    
+    if len(row) < 3:
+        printDebug(f"Row is missing information: {row}")
+        return {"success": False, "message": "Transaction has invalid format"}
+    
+    transaction = transactionDetails(row)
+    
+    # if requesting confirmation, return transaction details
+    if not confirm:
+        printDebug("Returning transaction for confirmation")
+        return {
+            "success": True,
+            "require_confirmation": True,
+            "transaction": transaction
+        }
+    
+    # confirmed deletion - one delete record in the mutation log
+    printDebug(f"Deleting transaction {idNum}: {row}")
     try:
-        idNum = int(transactionId)
-        printDebug(f"Converted '{transactionId}' number {idNum}")
-        
-        # check if we have a valid index
-        indexToDelete = idNum - 1
-        if indexToDelete < 0 or indexToDelete >= len(allRows):
-            printDebug(f"Index {indexToDelete} is out of range (0-{len(allRows)-1})")
-            return {"success": False, "message": f"Transaction ID {transactionId} not found (out of range)"}
-        
-        # get the transaction to delete
-        row = allRows[indexToDelete]
-        printDebug(f"Found row at index {indexToDelete}: {row}")
+        with LedgerWriter(transactionsFile) as writer:
+            # someone may have deleted it since we looked it up
+            row = writer.getRow(idNum)
+            if row is None:
+                printDebug(f"Transaction {idNum} is already gone")
+                return {"success": False, "message": f"Transaction ID {transactionId} not found"}
+            writer.delete(idNum, row)
+        printDebug(f"Logged deletion of transaction {idNum}")
+        return {"success": True, "message": f"Transaction {transactionId} deleted successfully"}
+    except Exception as e:
+        print(f"Error writing CSV: {e}")
+        return {"success": False, "message": f"Error saving after deletion: {str(e)}"}
+
+def batchResults(transactionIds, getRow, delete=None):
+    """A result per ID, each found transaction is passed to delete(idNum, row) if given"""
+    results = []
+    for transactionId in transactionIds:
+        idNum = parseId(str(transactionId))
+        if idNum is None:
+            results.append({"id": transactionId, "success": False, "message": "Invalid transaction ID. Please enter a number."})
+            continue
         
+        # with a writer, getRow sees the batch's own deletes so a repeated ID is reported as gone
+        row = getRow(idNum)
+        if row is None:
+            results.append({"id": transactionId, "success": False, "message": f"Transaction ID {transactionId} not found"})
+            continue
         if len(row) < 3:
-            printDebug(f"Row is missing information: {row}")
-            return {"success": False, "message": "Transaction has invalid format"}
+            results.append({"id": transactionId, "success": False, "message": "Transaction has invalid format"})
+            continue
         
-        # building object
-        transaction = {
-            "type": row[0],
-            "description": row[1],
-            "amount": row[2]
-        }
+        result = {"id": transactionId, "success": True, "transaction": transactionDetails(row)}
+        if delete is not None:
+            delete(idNum, row)
+            result["message"] = f"Transaction {transactionId} deleted successfully"
+        results.append(result)
+    return results
+
+def deleteBatch(transactionIds, confirm=False, partial=False):
+    """Delete a list of transactions with one log append, with a result per ID
+
+    Without confirm nothing is deleted and the results show what would be.
+    If one of the IDs can't be deleted, none are and the results list the
+    ones that failed; with partial the rest are deleted anyway.
+    """
+    printDebug(f"Received batch delete request for {transactionIds}, confirm={confirm}")
+    
+    if not isinstance(transactionIds, list) or not transactionIds:
+        return {"success": False, "message": "No transaction IDs provided"}
+    
+    if not (Path(transactionsFile).exists() or Path(transactionsFile + LOG_SUFFIX).exists()):
+        printDebug(f"CSV file not found: {transactionsFile}")
+        return {"success": False, "message": "No transactions file found"}
+    
+    if not confirm:
+        results = batchResults(transactionIds, lambda idNum: lookupTransaction(transactionsFile, idNum))
+        return {"success": True, "require_confirmation": True, "results": results}
+    
+    try:
+        # every delete record is written in one append when the block ends
+        with LedgerWriter(transactionsFile) as writer:
+            results = batchResults(transactionIds, writer.getRow, writer.delete)
+            failed = [result for result in results if not result["success"]]
+            if failed and not partial:
+                writer.discard()
+    except Exception as e:
+        print(f"Error writing CSV: {e}")
+        return {"success": False, "message": f"Error saving after deletion: {str(e)}"}
+    
+    if failed and not partial:
+        printDebug(f"Deleted nothing, {len(failed)} of the IDs can't be deleted")
+        return {"success": False, "count": 0, "results": failed,
+                "message": f"No transactions were deleted, {len(failed)} of the IDs can't be deleted"}
+    count = len(results) - len(failed)
+    printDebug(f"Logged deletion of {count} transactions")
+    return {"success": True, "count": count, "results": results}
+
+def routeRequest(data):
+    # confirmed deletes go through the single writer, the confirmation lookups run in parallel
+    message = decodeJson(data)
+    command = message.get("command")
+    if command == "end":
+        return END
+    if command in ("delete", "delete_batch") and message.get("confirm", False):
+        return WRITE
+    return READ
+
+def handleRequest(data):
+    try:
+        message = decodeJson(data)
+        printDebug(f"Received message: {message}")
         
-        # add date if available
-        if len(row) >= 4:
-            transaction["date"] = row[3]
+        command = message.get("command")
         
-        # if requesting confirmation, return transaction details
-        if not confirm:
-            printDebug("Returning transaction for confirmation")
-            return {
-                "success": True,
-                "require_confirmation": True,
-                "transaction": transaction
-            }
+        if command == "delete":
+            transactionId = message.get("id")
+            confirm = message.get("confirm", False)
+            printDebug(f"We are deleting: id={transactionId}, confirm={confirm}")
+            
+            result = deleteTransaction(transactionId, confirm)
+            printDebug(f"Delete result: {result}")
         
-        # confirmed deletion - remove the row
-        printDebug(f"Deleting row {indexToDelete}: {row}")
-        deletedRow = allRows.pop(indexToDelete)
-        printDebug(f"Deleted row: {deletedRow}")
+        elif command == "delete_batch":
+            transactionIds = message.get("ids")
+            confirm = message.get("confirm", False)
+            printDebug(f"We are deleting a batch: ids={transactionIds}, confirm={confirm}")
+            
+            result = deleteBatch(transactionIds, confirm, message.get("partial", False))
+            printDebug(f"Batch delete result: {result}")
         
-        # update the CSV file
-        try:
-            with open(transactionsFile, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerows(allRows)
-                printDebug(f"Wrote {len(allRows)} rows back to CSV")
-            return {"success": True, "message": f"Transaction {transactionId} deleted successfully"}
-        except Exception as e:
-            print(f"Error writing CSV: {e}")
-            return {"success": False, "message": f"Error saving after deletion: {str(e)}"}
+        elif command == "end":
+            printDebug("Received shutdown command")
+            result = {"success": True, "message": "Transaction Delete Microservice shutting down"}
         
-    except ValueError:
-        printDebug(f"Invalid ID format: {transactionId}")
-        return {"success": False, "message": "Invalid transaction ID. Please enter a number."}
+        else:
+            printDebug(f"Unknown command: {command}")
+            result = {"success": False, "message": "Unknown command"}
+    
+    except Exception as e:
+        printDebug(f"Error processing request: {e}")
+        result = {"success": False, "message": f"Error: {str(e)}"}
+    return encodeJson(result)
 
-def main():
+def main(workers=DEFAULT_WORKERS, processes=False, asyncRuntime=False):
     print("Transaction Delete (C)")
-    context = zmq.Context()
-    socket = context.socket(zmq.REP)
-    socket.bind("tcp://*:5557")  # 5557 is for microservice C
-    
+    startCompactor(transactionsFile)
     
-    while True:
-        try:
-            message = socket.recv_json()
-            printDebug(f"Received message: {message}")
-            
-            command = message.get("command")
-            
-            if command == "delete":
-                transactionId = message.get("id")
-                confirm = message.get("confirm", False)
-                printDebug(f"We are deleting: id={transactionId}, confirm={confirm}")
-                
-                result = deleteTransaction(transactionId, confirm)
-                printDebug(f"Delete result: {result}")
-                socket.send_json(result)
-            
-            elif command == "end":
-                printDebug("Received shutdown command")
-                socket.send_json({"success": True, "message": "Transaction Delete Microservice shutting down"})
-                break
-            
-            else:
-                printDebug(f"Unknown command: {command}")
-                socket.send_json({"success": False, "message": "Unknown command"})
-        
-        except Exception as e:
-            printDebug(f"Error processing request: {e}")
-            try:
-                socket.send_json({"success": False, "message": f"Error: {str(e)}"})
-            except:
-                pass
+    serve("tcp://*:5557", handleRequest, routeRequest, workers, processes, asyncRuntime)  # 5557 is for microservice C
     
     printDebug("Transaction Delete (C) shutting down")
-    socket.close()
-    context.term()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = serviceArguments("Transaction Delete (C)")
+    main(args.workers, args.processes, args.asyncRuntime)
@@ -0,0 +1,239 @@
+import datetime
+import json
+import os
+import struct
+import threading
+from transactionStore import TMP_SUFFIX
+from transactionTable import parseId, formatId
+from mutationLog import repairLog
+
+# The edit history is a JSON-lines file that is only ever appended to, one
+# {"id": "005", "timestamp": ..., "original": {...}, "updated": {...}} per
+# edit. The .idx sidecar holds the id, offset and length of every line, so
+# a transaction's history is read without parsing anyone else's.
+
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"EDITIDX1"
+INDEX_HEADER = struct.Struct("<8sQ")  # magic, inode of the history file it was written for
+RECORD = struct.Struct("<qQI")  # transaction id, offset and length of its line
+
+class EditHistory:
+    """Append-only edit history with a per-transaction offset index
+
+    Appends come from one writer at a time (Service B's single writer),
+    any number of readers can look up histories meanwhile: they only trust
+    whole index records and index a tail the index doesn't cover yet (a
+    crash, or an append still under way) from the history file itself.
+    Only the writer repairs the index file.
+    """
+
+    def __init__(self, path, legacyPath=None):
+        self.path = path
+        self.indexPath = path + INDEX_SUFFIX
+        self.legacyPath = legacyPath  # old JSON history, migrated the first time
+        self.lock = threading.Lock()
+        self.reset(None)
+
+    def reset(self, inode):
+        self.inode = inode
+        self.offsets = {}  # id -> [(offset, length)] of its lines, in order
+        self.indexRead = 0  # bytes of the index file read, None if it doesn't match the history file
+        self.indexCovers = 0  # history bytes the index file has records for
+        self.scanned = 0  # history bytes in self.offsets
+
+    def migrate(self):
+        """Write the old JSON history out as the history file, if there's no history file yet"""
+        if self.legacyPath is None or os.path.exists(self.path) or not os.path.exists(self.legacyPath):
+            return False
+        with open(self.legacyPath, 'r') as f:
+            try:
+                history = json.load(f)
+            except json.JSONDecodeError:
+                history = {}
+        edits = [(key, edit) for key, edits in history.items() for edit in edits]
+        edits.sort(key=lambda item: str(item[1].get("timestamp", "")))  # one transaction's edits keep their order
+        tmpPath = f"{self.path}.{os.getpid()}{TMP_SUFFIX}"
+        with open(tmpPath, 'wb') as f:
+            for key, edit in edits:
+                f.write(historyLine(key, edit))
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.link(tmpPath, self.path)  # unlike a rename, never replaces a history another process migrated
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmpPath)
+        self.refresh()
+        self.writeIndex()
+        return True
+
+    def refresh(self):
+        """Catch up with lines appended since the last call"""
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            self.reset(None)
+            return
+        if inode != self.inode:
+            self.reset(inode)
+        if self.indexRead is not None:
+            self.readIndex()
+        self.scanTail()
+
+    def readIndex(self):
+        try:
+            with open(self.indexPath, 'rb') as f:
+                if self.indexRead == 0:
+                    header = f.read(INDEX_HEADER.size)
+                    if len(header) < INDEX_HEADER.size or INDEX_HEADER.unpack(header) != (INDEX_MAGIC, self.inode):
+                        self.indexRead = None  # left from another history file, the writer rewrites it
+                        return
+                    self.indexRead = INDEX_HEADER.size
+                f.seek(self.indexRead)
+                data = f.read()
+        except FileNotFoundError:
+            self.indexRead = None
+            return
+        whole = len(data) - len(data) % RECORD.size  # a record still being written is read next time
+        for transactionId, offset, length in RECORD.iter_unpack(data[:whole]):
+            if offset >= self.scanned:  # lines a reader indexed itself are already in
+                self.offsets.setdefault(transactionId, []).append((offset, length))
+                self.scanned = offset + length
+            self.indexCovers = offset + length
+        self.indexRead += whole
+
+    def scanTail(self):
+        # complete lines past what the index covers
+        with open(self.path, 'rb') as f:
+            f.seek(self.scanned)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                transactionId = lineId(line)
+                if transactionId is not None:
+                    self.offsets.setdefault(transactionId, []).append((self.scanned, len(line)))
+                self.scanned += len(line)
+
+    def writeIndex(self):
+        spans = sorted((offset, length, transactionId)
+                       for transactionId, lines in self.offsets.items() for offset, length in lines)
+        tmpPath = f"{self.indexPath}.{os.getpid()}{TMP_SUFFIX}"
+        with open(tmpPath, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, self.inode))
+            f.write(b"".join(RECORD.pack(transactionId, offset, length) for offset, length, transactionId in spans))
+        os.replace(tmpPath, self.indexPath)
+        self.indexRead = INDEX_HEADER.size + len(spans) * RECORD.size
+        self.indexCovers = self.scanned
+
+    def repair(self):
+        """Migrate the old JSON history, drop a line a crash cut off and bring the index file up to date"""
+        with self.lock:
+            self.prepare()
+
+    def prepare(self):
+        # the writer's side, readers never write either file
+        self.migrate()
+        repairLog(self.path)
+        self.refresh()
+        if self.inode is None:
+            return
+        if self.indexRead is None:
+            self.writeIndex()
+            return
+        size = os.path.getsize(self.indexPath)
+        if size < self.indexRead:
+            self.writeIndex()  # replaced by a shorter one
+            return
+        if size > self.indexRead:
+            os.truncate(self.indexPath, self.indexRead)  # a record cut off by a crash
+        if self.indexCovers < self.scanned:
+            missing = sorted((offset, length, transactionId) for transactionId, lines in self.offsets.items()
+                             for offset, length in lines if offset >= self.indexCovers)
+            with open(self.indexPath, 'ab') as f:
+                f.write(b"".join(RECORD.pack(transactionId, offset, length) for offset, length, transactionId in missing))
+            self.indexRead += len(missing) * RECORD.size
+            self.indexCovers = self.scanned
+
+    def append(self, edits):
+        """Record (transaction id, original, updated) edits: one append to the history file and one to its index"""
+        if not edits:
+            return
+        timestamp = datetime.datetime.now().isoformat()
+        with self.lock:
+            self.prepare()
+            lines, records = [], []
+            offset = self.scanned
+            for transactionId, original, updatedData in edits:
+                idNum = parseId(transactionId)
+                edit = {"timestamp": timestamp, "original": original, "updated": updatedData}
+                line = historyLine(formatId(idNum) if idNum is not None else transactionId, edit)
+                lines.append(line)
+                if idNum is not None:
+                    records.append((idNum, offset, len(line)))
+                offset += len(line)
+            with open(self.path, 'ab') as f:
+                f.write(b"".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+            if self.inode is None:
+                self.reset(os.stat(self.path).st_ino)
+                self.writeIndex()
+            with open(self.indexPath, 'ab') as f:
+                f.write(b"".join(RECORD.pack(*record) for record in records))
+            for idNum, start, length in records:
+                self.offsets.setdefault(idNum, []).append((start, length))
+            self.indexRead += len(records) * RECORD.size
+            self.scanned = self.indexCovers = offset
+
+    def get(self, transactionId):
+        """Edits of one transaction, oldest first, as {"timestamp", "original", "updated"}"""
+        idNum = parseId(transactionId)
+        if idNum is None:
+            return []
+        with self.lock:
+            self.refresh()
+            if self.inode is None:
+                return self.legacyEdits(idNum)
+            spans = list(self.offsets.get(idNum, ()))
+        edits = []
+        if spans:
+            with open(self.path, 'rb') as f:
+                for offset, length in spans:
+                    f.seek(offset)
+                    edit = json.loads(f.read(length))
+                    edit.pop("id", None)
+                    edits.append(edit)
+        return edits
+
+    def legacyEdits(self, idNum):
+        # before the writer has migrated the old JSON history
+        if self.legacyPath is None or not os.path.exists(self.legacyPath):
+            return []
+        with open(self.legacyPath, 'r') as f:
+            try:
+                history = json.load(f)
+            except json.JSONDecodeError:
+                return []
+        return history.get(formatId(idNum), [])
+
+def historyLine(transactionId, edit):
+    return (json.dumps({"id": transactionId, **edit}) + "\n").encode("utf-8")
+
+def lineId(line):
+    try:
+        transactionId = json.loads(line).get("id")
+    except (ValueError, AttributeError):
+        return None
+    return parseId(transactionId)
+
+# one history per file, shared in the process
+_histories = {}
+_historiesLock = threading.Lock()
+
+def getHistory(path, legacyPath=None):
+    key = os.path.abspath(path)
+    with _historiesLock:
+        if key not in _histories:
+            _histories[key] = EditHistory(path, legacyPath)
+        return _histories[key]
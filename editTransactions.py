@@ -1,184 +1,228 @@
-import zmq
-import json
-import csv
 import datetime
-from pathlib import Path
+from transactionPipeline import ledgerRows, validRows, withIds
+from transactionIndex import lookupTransaction
+from money import isAmount
+from transactionTable import parseId, formatId, dateOrdinal
+from mutationLog import LedgerWriter, startCompactor
+from editHistory import getHistory
+from servicePool import serve, serviceArguments, decodeJson, encodeJson, READ, WRITE, END, DEFAULT_WORKERS
 
 # path to transactions
 transactionsFile = "transactions.csv"
-historyFile = "edit_history.json"
+historyFile = "edit_history.jsonl"
+legacyHistoryFile = "edit_history.json"  # before the history was append-only, migrated on start
 
-def loadTransactions():
-    transactions = []
-    if Path(transactionsFile).exists():
-        with open(transactionsFile, 'r') as f:
-            reader = csv.reader(f)
-            rows = list(reader)
-            for idx, row in enumerate(rows):
-                if len(row) >= 3:  # At minimum: Type, Description, Amount
-                    transaction = {
-                        "id": f"{idx+1:03d}",
-                        "type": row[0],
-                        "description": row[1],
-                        "amount": row[2],
-                        "index": idx 
-                    }
-                    
-                    # add date if available
-                    if len(row) >= 4:
-                        transaction["date"] = row[3]
-                    
-                    transactions.append(transaction)
-    return transactions
-
-def saveTransactions(transactions):
-    if not transactions:
-        return False
-    
-    # read existing file
-    existingTransactions = []
-    try:
-        with open(transactionsFile, 'r') as f:
-            reader = csv.reader(f)
-            existingTransactions = list(reader)
-    except FileNotFoundError:
-        pass
-    
-    # opdate transactions in the list
-    for transaction in transactions:
-        idx = transaction.get("index", -1)
-        if idx >= 0 and idx < len(existingTransactions):
-            row = [
-                transaction["type"], 
-                transaction["description"], 
-                transaction["amount"]
-            ]
-            
-            if "date" in transaction:
-                row.append(transaction["date"])
-            elif len(existingTransactions[idx]) >= 4:
-                row.append(existingTransactions[idx][3])
-            else:
-                # add today's date if no date exists
-                row.append(datetime.date.today().strftime("%Y-%m-%d"))
-                
-            # update the row at the specified index
-            existingTransactions[idx] = row
+# what an edit can change
+EDIT_FIELDS = ["type", "description", "amount", "date"]
+
+def transactionFromRow(transactionId, row):
+    if row is None or len(row) < 3:  # At minimum: Type, Description, Amount
+        return None
+    transaction = {
+        "id": formatId(transactionId),
+        "type": row[0],
+        "description": row[1],
+        "amount": row[2]
+    }
     
-    # write back to file
-    with open(transactionsFile, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerows(existingTransactions)
+    # add date if available
+    if len(row) >= 4 and row[3]:
+        transaction["date"] = row[3]
+    return transaction
+
+def loadTransactions():
+    # one transaction at a time, straight from the ledger file
+    for transactionId, row in withIds(validRows(ledgerRows(transactionsFile))):
+        yield transactionFromRow(transactionId, row)
+
+def findTransaction(ledger, transactionId):
+    # IDs are stored with each row, the index takes us straight to it
+    idNum = parseId(transactionId)
+    if idNum is None:
+        return None
+    return transactionFromRow(idNum, ledger.getRow(idNum))
+
+def transactionRow(transaction, existing):
+    row = [
+        transaction["type"], 
+        transaction["description"], 
+        transaction["amount"]
+    ]
     
-    return True
-
-def loadHistory():
-    history = {}
-    if Path(historyFile).exists():
-        with open(historyFile, 'r') as f:
-            try:
-                history = json.load(f)
-            except json.JSONDecodeError:
-                history = {}
-    return history
-
-def saveHistory(history):
-    with open(historyFile, 'w') as f:
-        json.dump(history, f, indent=2)
+    if "date" in transaction:
+        row.append(transaction["date"])
+    elif len(existing) >= 4 and existing[3]:
+        row.append(existing[3])
+    else:
+        # add today's date if no date exists
+        row.append(datetime.date.today().strftime("%Y-%m-%d"))
+    return row
+
+def saveTransaction(writer, transaction):
+    # each update is one small record in the mutation log, not a rewrite of the CSV
+    idNum = parseId(transaction["id"])
+    existing = writer.getRow(idNum)
+    writer.edit(idNum, transactionRow(transaction, existing), existing)
+
+def historyStore():
+    return getHistory(historyFile, legacyHistoryFile)
+
+def applyUpdate(trans, updatedData):
+    # update transaction with new data
+    for key, value in updatedData.items():
+        if key in trans and key != 'id': # why does it keep changing
+            trans[key] = value
 
 def editTransaction(transactionId, updatedData):
-    transactions = loadTransactions()
-    
-    # find the transaction to edit
-    found = False
-    original = None
-    for i, trans in enumerate(transactions):
-        if trans.get('id') == transactionId:
-            original = dict(trans)  # make a copy of original just in case
-            found = True
-            # update transaction with new data
-            for key, value in updatedData.items():
-                if key in trans and key != 'id': # why does it keep changing
-                    trans[key] = value
-            transactions[i] = trans
-            break
+    # hold the ledger so nobody changes the row between the lookup and the save
+    with LedgerWriter(transactionsFile) as writer:
+        trans = findTransaction(writer, transactionId)
+        if trans is None:
+            return {"success": False, "message": "Transaction not found"}
+        
+        transactionId = trans["id"]  # same key for "5" and "005"
+        original = dict(trans)  # make a copy of original just in case
+        applyUpdate(trans, updatedData)
+        saveTransaction(writer, trans)
+        
+        # throw the transaction into the history before the edit is written, an
+        # edit never goes in without its history (if this fails, nothing is saved)
+        historyStore().append([(transactionId, original, updatedData)])
     
-    if not found:
-        return {"success": False, "message": "Transaction not found"}
+    return {"success": True, "message": "Transaction updated successfully!"}
+
+def checkUpdate(updatedData):
+    """Why a batch can't apply an update, None if it can"""
+    if not isinstance(updatedData, dict) or not updatedData:
+        return "No changes provided"
+    for field, value in updatedData.items():
+        if field not in EDIT_FIELDS:
+            return f"Invalid field: {field}. Please choose type, description, amount, or date."
+        if not isinstance(value, str):
+            return f"The new {field} must be text"
+    if "type" in updatedData and updatedData["type"] not in ["income", "expense"]:
+        return "Type must be 'income' or 'expense'"
+    if "amount" in updatedData and not isAmount(updatedData["amount"]):
+        return "Amount must be a number"
+    if "date" in updatedData and dateOrdinal(updatedData["date"]) is None:
+        return "Invalid date format. Please use YYYY-MM-DD."
+    return None
+
+def editBatch(updates, partial=False):
+    """Apply a list of {"id": ..., "data": {...}} updates with one log append
+
+    Every update is checked before anything is written. If one can't be
+    applied, none are and the results list the ones that failed. With
+    partial the ones that fail are reported and the rest are applied, with
+    a result per update.
+    """
+    if not isinstance(updates, list) or not updates:
+        return {"success": False, "message": "No updates provided"}
     
-    # save changes
-    if saveTransactions(transactions):
-        # throw the transaction into the history
-        history = loadHistory()
-        if transactionId not in history:
-            history[transactionId] = []
-        
-        editRecord = {
-            "timestamp": datetime.datetime.now().isoformat(),
-            "original": original,
-            "updated": updatedData
-        }
-        history[transactionId].append(editRecord)
-        saveHistory(history)
+    results = []
+    edits = []  # (id, original, updatedData) for the history
+    with LedgerWriter(transactionsFile) as writer:
+        for update in updates:
+            if not isinstance(update, dict):
+                results.append({"id": None, "success": False, "message": "Update must have an id and data"})
+                continue
+            transactionId, updatedData = update.get("id"), update.get("data")
+            
+            error = checkUpdate(updatedData)
+            # the writer sees the batch's own earlier edits, so one id can come up twice
+            trans = findTransaction(writer, str(transactionId)) if error is None else None
+            if error is None and trans is None:
+                error = "Transaction not found"
+            if error is not None:
+                results.append({"id": transactionId, "success": False, "message": error})
+                continue
+            
+            original = dict(trans)
+            applyUpdate(trans, updatedData)
+            saveTransaction(writer, trans)
+            edits.append((trans["id"], original, updatedData))
+            results.append({"id": trans["id"], "success": True, "message": "Transaction updated successfully!"})
         
-        return {"success": True, "message": "Transaction updated successfully!"}
-    else:
-        return {"success": False, "message": "Failed to save transaction updates."}
+        if len(edits) < len(updates) and not partial:
+            writer.discard()
+            failed = [result for result in results if not result["success"]]
+            return {"success": False, "count": 0, "results": failed,
+                    "message": f"No transactions were updated, {len(failed)} of the updates can't be applied"}
+        # their history is one append, made before the edits are written when the block ends
+        historyStore().append(edits)
+    
+    return {"success": True, "count": len(edits), "results": results}
 
 def getEditHistory(transactionId):
     """Get the edit history for a transaction"""
-    history = loadHistory()
-    if transactionId in history:
-        return {"success": True, "history": history[transactionId]}
+    idNum = parseId(transactionId)
+    if idNum is not None:
+        transactionId = formatId(idNum)
+    
+    history = historyStore().get(transactionId)
+    if history:
+        result = {"success": True, "history": history}
     else:
-        return {"success": True, "history": [], "message": "No edit history found"}
+        result = {"success": True, "history": [], "message": "No edit history found"}
+    
+    # current state of the transaction, if it still exists
+    if idNum is not None:
+        current = transactionFromRow(idNum, lookupTransaction(transactionsFile, idNum))
+        if current is not None:
+            result["transaction"] = current
+    return result
+
+def routeRequest(data):
+    # edits go through the single writer, history lookups run in parallel
+    command = decodeJson(data).get("command")
+    return {"edit": WRITE, "edit_batch": WRITE, "end": END}.get(command, READ)
 
-def main():
-    context = zmq.Context()
-    socket = context.socket(zmq.REP)
-    socket.bind("tcp://*:5556")  # Using port 5556 for this microservice
+def handleRequest(data):
+    try:
+        message = decodeJson(data)
+        command = message.get("command")
+        
+        if command == "edit":
+            transactionId = message.get("id")
+            updatedData = message.get("data")
+            print(f"Received edit request for transaction {transactionId}")
+            result = editTransaction(transactionId, updatedData)
+            print(f"Sent response: {result['message']}")
+        
+        elif command == "edit_batch":
+            updates = message.get("updates")
+            print(f"Received batch edit request for {len(updates) if isinstance(updates, list) else 0} transactions")
+            result = editBatch(updates, message.get("partial", False))
+            print(f"Sent response: {result.get('count', 0)} transactions updated")
+        
+        elif command == "history":
+            transactionId = message.get("id")
+            print(f"Received history request for transaction {transactionId}")
+            result = getEditHistory(transactionId)
+            print(f"Sent history response")
+        
+        elif command == "end":
+            print("Received shutdown command")
+            result = {"success": True, "message": "Transaction Edit Microservice shutting down"}
+        
+        else:
+            print(f"Received unknown command: {command}")
+            result = {"success": False, "message": "Unknown command"}
     
+    except Exception as e:
+        print(f"Error processing request: {e}")
+        result = {"success": False, "message": f"Error: {str(e)}"}
+    return encodeJson(result)
+
+def main(workers=DEFAULT_WORKERS, processes=False, asyncRuntime=False):
     print("Transaction Edit (B)")
+    startCompactor(transactionsFile)
+    historyStore().repair()
     
-    while True:
-        try:
-            message = socket.recv_json()
-            command = message.get("command")
-            
-            if command == "edit":
-                transactionId = message.get("id")
-                updatedData = message.get("data")
-                print(f"Received edit request for transaction {transactionId}")
-                result = editTransaction(transactionId, updatedData)
-                socket.send_json(result)
-                print(f"Sent response: {result['message']}")
-            
-            elif command == "history":
-                transactionId = message.get("id")
-                print(f"Received history request for transaction {transactionId}")
-                result = getEditHistory(transactionId)
-                socket.send_json(result)
-                print(f"Sent history response")
-            
-            elif command == "end":
-                print("Received shutdown command")
-                socket.send_json({"success": True, "message": "Transaction Edit Microservice shutting down"})
-                break
-            
-            else:
-                print(f"Received unknown command: {command}")
-                socket.send_json({"success": False, "message": "Unknown command"})
-        
-        except Exception as e:
-            print(f"Error processing request: {e}")
-            try:
-                socket.send_json({"success": False, "message": f"Error: {str(e)}"})
-            except:
-                pass
+    serve("tcp://*:5556", handleRequest, routeRequest, workers, processes, asyncRuntime)  # Using port 5556 for this microservice
     
     print("Transaction Edit (B) shutting down")
-    socket.close()
-    context.term()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = serviceArguments("Transaction Edit (B)")
+    main(args.workers, args.processes, args.asyncRuntime)
@@ -1,16 +1,23 @@
-import csv  # https://docs.python.org/3/library/csv.html
-import zmq
+import codecs
 import json
 import datetime
+import importlib.util
+import itertools
+from money import toCents, formatCents, isAmount
+from transactionStore import isMigrated
+from transactionTable import formatId, dateOrdinal, TYPE_INCOME, TYPE_EXPENSE
+
+# the ledger modules and zmq are imported by the options that use them, so the menu comes up at once
 
 spreadsheet = "transactions.csv" 
+SUMMARY_TIMEOUT = 300  # seconds
 
 def addTransaction(transactionType): 
     desc = input(f"Enter {transactionType} description: ").strip()
     amount = input(f"Enter {transactionType} amount: ").strip()
 
     # validate amount
-    if not desc or not amount.replace(".", "").isdigit():
+    if not desc or not isAmount(amount):
         print("Invalid input. Please try again.")
         return
     
@@ -20,179 +27,240 @@ def addTransaction(transactionType):
     if useCustomDate == 'y':
         while True:
             dateStr = input("Enter date (YYYY-MM-DD): ").strip()
-            try:
-                # validate the date
-                transDate = datetime.datetime.strptime(dateStr, "%Y-%m-%d").date()
-                transDate = transDate.strftime("%Y-%m-%d")  # format
+            # validate the date
+            ordinal = dateOrdinal(dateStr)
+            if ordinal is not None:
+                transDate = datetime.date.fromordinal(ordinal).strftime("%Y-%m-%d")  # format
                 break
-            except ValueError:
-                print("Invalid date format. Please use YYYY-MM-DD.")
+            print("Invalid date format. Please use YYYY-MM-DD.")
     else:
         transDate = datetime.date.today().strftime("%Y-%m-%d")
     
-    # append transaction with date
-    with open(spreadsheet, "a", newline="") as file:
-        csv.writer(file).writerow([transactionType, desc, amount, transDate])
+    # append transaction with date (one record in the mutation log)
+    from mutationLog import addTransaction as logTransaction
+    transId = logTransaction(spreadsheet, [transactionType, desc, amount, transDate])
 
     # success message
-    print(f"{transactionType} added with date {transDate}!\n")
+    print(f"{transactionType} added with date {transDate} (ID {transId})!\n")
 
 def viewSummary():
-    totalIncome = 0
-    totalExpenses = 0
-
-    try:
-        with open(spreadsheet, "r") as file:
-            for row in csv.reader(file):
-                if len(row) < 3:  # skip invalid rows
-                    continue
-                    
-                # calculate total income
-                if row[0] == "income":
-                    totalIncome += float(row[2])
-                
-                # calculate total expenses
-                elif row[0] == "expense":
-                    totalExpenses += float(row[2]) 
-
-    # handle file not found error
-    except FileNotFoundError:
+    from transactionPipeline import ledgerRows, validRows
+    from transactionTotals import getTotals
+    
+    # running totals kept up to date by every add, edit and delete
+    totals = getTotals(spreadsheet).get()
+    if not totals["rows"]:
         print("No transactions found.")
         return
     
-    # display summary
-    print(f"Total Income: ${totalIncome:.2f}")
-    print(f"Total Expenses: ${totalExpenses:.2f}")
-    print(f"Net Income: ${totalIncome - totalExpenses:.2f}")
+    totalIncome = totals["totals"][TYPE_INCOME]
+    totalExpenses = totals["totals"][TYPE_EXPENSE]
+    
+    # a row whose amount isn't a number, add it up the slow way so it errors like it always did
+    if totals["invalid"][TYPE_INCOME] or totals["invalid"][TYPE_EXPENSE]:
+        totalIncome = 0
+        totalExpenses = 0
+        for row in validRows(ledgerRows(spreadsheet)):  # skip invalid rows
+            # calculate total income
+            if row[0] == "income":
+                totalIncome += toCents(row[2])
+            
+            # calculate total expenses
+            elif row[0] == "expense":
+                totalExpenses += toCents(row[2])
+    
+    # display summary, the totals are exact cents
+    print(f"Total Income: ${formatCents(totalIncome)}")
+    print(f"Total Expenses: ${formatCents(totalExpenses)}")
+    print(f"Net Income: ${formatCents(totalIncome - totalExpenses)}")
+
+# integrating microservices, all requests share one client (see serviceClient.py)
+client = None
+
+def getClient():
+    global client
+    if client is None:
+        from serviceClient import ServiceClient
+        client = ServiceClient()
+    return client
 
-# integrating microservices
 def getTransactionSummary(days):
-    context = zmq.Context()
-    socket = context.socket(zmq.REQ)
-    socket.connect("tcp://localhost:5555") # 5555 is A
-    
     req = f"summary {days}"
-    socket.send(str.encode(req))
-    
-    summary = socket.recv()
+    # a summary of a large ledger takes a while
+    summary = getClient().requestBytes("A", str.encode(req), timeout=SUMMARY_TIMEOUT)
     return summary.decode()
 
+def streamTransactionSummary(days):
+    """Yield the summary text as Service A sends it, for printing while the rest is still coming"""
+    req = f"summary {days} stream"
+    # a chunk can end inside a character
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in getClient().requestStream("A", str.encode(req), timeout=SUMMARY_TIMEOUT):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+def getTransactionSummaryPage(days, offset=None, limit=None, cursor=None):
+    """One page of a summary: header, limit lines from offset (or the cursor's page) and the totals"""
+    req = f"summary {days}"
+    for name, value in (("offset", offset), ("limit", limit), ("cursor", cursor)):
+        if value is not None:
+            req += f" {name}={value}"
+    return json.loads(getClient().requestBytes("A", str.encode(req), timeout=SUMMARY_TIMEOUT))
+
+def getRollup(period, limit=None):
+    """Totals per day/week/month/year or the top descriptions by spend ("description"), amounts in cents"""
+    req = f"rollup {period}" if limit is None else f"rollup {period} {limit}"
+    return json.loads(getClient().requestBytes("A", str.encode(req)))
+
 def editTransaction(transactionId, updatedData):
-    context = zmq.Context()
-    socket = context.socket(zmq.REQ)
-    socket.connect("tcp://localhost:5556") # 5556 is B
-    
     message = {
         "command": "edit",
         "id": transactionId,
         "data": updatedData
     }
-    socket.send_json(message)
-    
-    response = socket.recv_json()
-    return response
+    return getClient().requestJson("B", message)
+
+def editTransactionBatch(updates, partial=False):
+    """Apply a list of {"id": ..., "data": {...}} updates in one write
+
+    All or nothing: if any update can't be applied, nothing is changed and
+    the reply's results list the ones that failed. With partial=True the
+    valid updates are applied anyway and every update gets its own result.
+    """
+    message = {
+        "command": "edit_batch",
+        "updates": updates,
+        "partial": partial
+    }
+    return getClient().requestJson("B", message)
 
 def getEditHistory(transactionId):
-    context = zmq.Context()
-    socket = context.socket(zmq.REQ)
-    socket.connect("tcp://localhost:5556") # 5556 is B
-    
     message = {
         "command": "history",
         "id": transactionId
     }
-    socket.send_json(message)
-    
-    response = socket.recv_json()
-    return response
+    return getClient().requestJson("B", message)
 
 def deleteTransaction(transactionId, confirm=False):
-    context = zmq.Context()
-    socket = context.socket(zmq.REQ)
-    socket.connect("tcp://localhost:5557") # 5557 is C
-    
     message = {
         "command": "delete",
         "id": transactionId,
         "confirm": confirm
     }
-    socket.send_json(message)
-    
-    response = socket.recv_json()
-    return response
+    return getClient().requestJson("C", message)
 
-def searchByKeyword(keyword):
-    context = zmq.Context()
-    socket = context.socket(zmq.REQ)
-    socket.connect("tcp://localhost:5558") # 5558 is D
-    
+def deleteTransactionBatch(transactionIds, confirm=False, partial=False):
+    """Preview, or with confirm=True delete, a list of transactions in one write
+
+    All or nothing: if any ID can't be deleted, nothing is and the reply's
+    results list the ones that failed. With partial=True the others are
+    deleted anyway and every ID gets its own result.
+    """
+    message = {
+        "command": "delete_batch",
+        "ids": transactionIds,
+        "confirm": confirm,
+        "partial": partial
+    }
+    return getClient().requestJson("C", message)
+
+def searchByKeyword(keyword, offset=None, limit=None, cursor=None):
     message = {
         "command": "search_keyword",
         "keyword": keyword
     }
-    socket.send_json(message)
-    
-    response = socket.recv_json()
-    return response
+    # a page of the results, the reply's nextCursor asks for the next one
+    for name, value in (("offset", offset), ("limit", limit), ("cursor", cursor)):
+        if value is not None:
+            message[name] = value
+    return getClient().requestJson("D", message)
+
+def streamSearchByKeyword(keyword):
+    """Yield Service D's replies for a streamed search: {"results": [...]} pages, then success with the count"""
+    message = {
+        "command": "search_keyword",
+        "keyword": keyword,
+        "stream": True
+    }
+    for chunk in getClient().requestStream("D", json.dumps(message).encode()):
+        yield json.loads(chunk)
 
 def filterByAmount(amount):
-    context = zmq.Context()
-    socket = context.socket(zmq.REQ)
-    socket.connect("tcp://localhost:5558") # 5558 is D
-    
     message = {
         "command": "filter_amount",
         "amount": amount
     }
-    socket.send_json(message)
-    
-    response = socket.recv_json()
-    return response
+    return getClient().requestJson("D", message)
 
-def listTransactions():
-    try:
-        with open(spreadsheet, "r") as file:
-            reader = csv.reader(file)
-            transactions = list(reader)
-            
-            if not transactions:
-                print("No transactions found.")
-                return
-            
-            print("\n===== Transaction List =====")
-            for idx, row in enumerate(transactions):
-                if len(row) >= 3:  # validate
-                    transId = f"{idx+1:03d}"  # format as 001, 002, etc.
-                    
-                    # date check
-                    dateStr = row[3] if len(row) >= 4 else "N/A"
-                    
-                    print(f"ID: {transId} | {row[0].capitalize()}: {row[1]} | ${float(row[2]):.2f} | Date: {dateStr}")
+def filterByAmountRange(minAmount, maxAmount, transactionType=None):
+    # either limit can be None, type is "income", "expense" or None for both
+    message = {
+        "command": "filter_amount_range",
+        "min": minAmount,
+        "max": maxAmount,
+        "type": transactionType
+    }
+    return getClient().requestJson("D", message)
+
+def getTopAmounts(count, transactionType=None):
+    message = {
+        "command": "top_amounts",
+        "count": count,
+        "type": transactionType
+    }
+    return getClient().requestJson("D", message)
+
+def listTransactions(offset=0, limit=None):
+    from transactionPipeline import ledgerRows, validRows, withIds
     
-    except FileNotFoundError:
+    # printed as the rows are read, the ledger is never loaded as a whole
+    rows = ledgerRows(spreadsheet)
+    first = next(rows, None)
+    if first is None:
         print("No transactions found.")
-
-def migrateTransactions():
-    try:
-        with open(spreadsheet, "r") as file:
-            reader = csv.reader(file)
-            transactions = list(reader)
+        return
+    
+    print("\n===== Transaction List =====")
+    transactions = withIds(validRows(itertools.chain([first], rows)))  # validate
+    stop = offset + limit if limit is not None else None
+    for transactionId, row in itertools.islice(transactions, offset, stop):
+        transId = formatId(transactionId)  # stored ID, formatted as 001, 002, etc.
         
-        modified = False
-        for i, row in enumerate(transactions):
-            if len(row) == 3:  # if no date
-                # Add today's date
-                transactions[i].append(datetime.date.today().strftime("%Y-%m-%d"))
-                modified = True
+        # date check
+        dateStr = row[3] if len(row) >= 4 and row[3] else "N/A"
         
-        if modified:
-            with open(spreadsheet, "w", newline="") as file:
-                writer = csv.writer(file)
-                writer.writerows(transactions)
-            print("Added dates to existing transactions")
-    except FileNotFoundError:
-        # worst case scenario
-        pass
+        print(f"ID: {transId} | {row[0].capitalize()}: {row[1]} | ${formatCents(toCents(row[2]))} | Date: {dateStr}")
+
+def findRow(idNum):
+    from transactionIndex import lookupTransaction
+    return lookupTransaction(spreadsheet, idNum)
+
+def addMissingDate(row):
+    if len(row) >= 4 and not row[3]:  # if no date
+        # Add today's date
+        row = row[:3] + [datetime.date.today().strftime("%Y-%m-%d")] + row[4:]
+    return row
+
+def migrateTransactions():
+    # the base file's meta says when it is known to need nothing, then the ledger isn't read at all
+    if isMigrated(spreadsheet):
+        return
+    from transactionIndex import getIndex
+    from mutationLog import compact, markMigrated
+    
+    # the index counts rows without a date or a stored ID while it's built
+    index = getIndex(spreadsheet)
+    with index.lock, index.ledgerLock.hold():
+        index.refresh()
+        index.loadOffsets()
+        signature, migrate = index.baseSignature, index.migrate
+    if not migrate:
+        markMigrated(spreadsheet, signature)
+        return
+    
+    # rewrite the CSV with every row's date and ID (swapped in atomically)
+    if compact(spreadsheet, transform=addMissingDate, force=True):
+        print("Added dates and IDs to existing transactions")
 
 def extendedMenu():
     print("\n===== Transaction Management System =====")
@@ -235,9 +303,11 @@ def main():
             elif choice == "4":
                 try:
                     days = input("Enter number of days (or 'all' for all transactions): ")
-                    summary = getTransactionSummary(days)
                     print("\nTransaction Summary from Microservice A:")
-                    print(summary)
+                    # printed as it arrives, a long summary starts showing right away
+                    for text in streamTransactionSummary(days):
+                        print(text, end="")
+                    print()
                 except Exception as e:
                     print(f"Error connecting to Microservice A: {e}")
                     print("Make sure Microservice A is running")
@@ -263,38 +333,29 @@ def main():
                         print("Type must be 'income' or 'expense'")
                         continue
                     
-                    if field == "amount" and not value.replace(".", "").isdigit():
+                    if field == "amount" and not isAmount(value):
                         print("Amount must be a number")
                         continue
                     
-                    if field == "date":
-                        try:
-                            # make sure we have a valid date
-                            datetime.datetime.strptime(value, "%Y-%m-%d")
-                        except ValueError:
-                            print("Invalid date format. Please use YYYY-MM-DD.")
-                            continue
-                    
-                    # get all transactions to find matching ID
-                    with open(spreadsheet, "r") as file:
-                        transactions = list(csv.reader(file))
+                    # make sure we have a valid date
+                    if field == "date" and dateOrdinal(value) is None:
+                        print("Invalid date format. Please use YYYY-MM-DD.")
+                        continue
                     
                     # find matching ID
                     try:
                         idNum = int(transactionId)
-                        if idNum < 1 or idNum > len(transactions):
+                        if idNum < 1:
                             print("Transaction not found")
                             continue
                             
-                        # get the row at that index
-                        # -1 because IDs start at 1!!!
-                        row = transactions[idNum-1]
-                        if len(row) < 3:  # make sure valid
+                        # IDs are stored with the rows, the index finds it without a scan
+                        row = findRow(idNum)
+                        if row is None or len(row) < 3:  # make sure valid
                             print("Transaction not found")
                             continue
                             
-                        # use index as ID
-                        fullId = f"{idNum:03d}"
+                        fullId = formatId(idNum)
                     except ValueError:
                         print("Invalid ID format. Please enter a number.")
                         continue
@@ -315,25 +376,19 @@ def main():
                     listTransactions()
                     transactionId = input("\nEnter transaction ID: ").strip()
                     
-                    # get all transactions to find matching ID
-                    with open(spreadsheet, "r") as file:
-                        transactions = list(csv.reader(file))
-                    
-                    # Find transaction with matching ID (now using simple sequential IDs)
+                    # Find transaction with matching ID (stored with each row)
                     try:
                         idNum = int(transactionId)
-                        if idNum < 1 or idNum > len(transactions):
+                        if idNum < 1:
                             print("Transaction not found")
                             continue
                             
-                        # Get the row at that index (-1 because IDs start at 1)
-                        row = transactions[idNum-1]
-                        if len(row) < 3:  # Make sure it's valid
+                        row = findRow(idNum)
+                        if row is None or len(row) < 3:  # Make sure it's valid
                             print("Transaction not found")
                             continue
                             
-                        # Use index as ID
-                        fullId = f"{idNum:03d}"
+                        fullId = formatId(idNum)
                     except ValueError:
                         print("Invalid ID format. Please enter a number.")
                         continue
@@ -363,7 +418,7 @@ def main():
                     try:
                         idNum = int(transactionId)
                         # format as 3-digit ID
-                        formattedId = f"{idNum:03d}"
+                        formattedId = formatId(idNum)
                         
                         # first get confirmation info
                         result = deleteTransaction(formattedId)
@@ -377,7 +432,7 @@ def main():
                             transaction = result["transaction"]
                             print(f"Type: {transaction['type']}")
                             print(f"Description: {transaction['description']}")
-                            print(f"Amount: ${float(transaction['amount']):.2f}")
+                            print(f"Amount: ${formatCents(toCents(transaction['amount']))}")
                             if 'date' in transaction:
                                 print(f"Date: {transaction['date']}")
                             
@@ -402,13 +457,20 @@ def main():
             elif choice == "9":
                 try:
                     keyword = input("Enter keyword to search for: ")
-                    results = searchByKeyword(keyword)
                     
-                    if results["success"]:
-                        print(f"\nFound {results['count']} transactions:")
-                        for i, trans in enumerate(results["results"], 1):
+                    # results are printed a page at a time as Service D sends them
+                    i = 0
+                    results = {}
+                    for results in streamSearchByKeyword(keyword):
+                        for trans in results.get("results", ()):
+                            i += 1
+                            if i == 1:
+                                print("\nSearch results:")
                             dateInfo = f" | Date: {trans.get('date', 'N/A')}"
-                            print(f"{i}. {trans['description']} - ${float(trans['amount']):.2f} ({trans['type']}){dateInfo}")
+                            print(f"{i}. {trans['description']} - ${formatCents(toCents(trans['amount']))} ({trans['type']}){dateInfo}")
+                    
+                    if results.get("success"):
+                        print(f"\nFound {results['count']} transactions")
                     else:
                         print(f"Error: {results.get('message', 'Unknown error')}")
                 
@@ -426,7 +488,7 @@ def main():
                         print(f"\nFound {results['count']} transactions:")
                         for i, trans in enumerate(results["results"], 1):
                             dateInfo = f" | Date: {trans.get('date', 'N/A')}"
-                            print(f"{i}. {trans['description']} - ${float(trans['amount']):.2f} ({trans['type']}){dateInfo}")
+                            print(f"{i}. {trans['description']} - ${formatCents(toCents(trans['amount']))} ({trans['type']}){dateInfo}")
                     else:
                         print(f"Error: {results.get('message', 'Unknown error')}")
                 
@@ -447,13 +509,14 @@ def main():
     except KeyboardInterrupt:
         print("\nShutting down due to keyboard interrupt...")
     finally:
+        if client is not None:
+            client.close()
         print("System shutdown complete.")
 
 if __name__ == "__main__":
-    try:
-        # Check if pyzmq is installed
-        import zmq
-        main()
-    except ImportError:
+    # Check if pyzmq is installed, without importing it before an option needs it
+    if importlib.util.find_spec("zmq") is None:
         print("ZMQ is required for this application.")
-        print("Please install it using: pip install pyzmq")
\ No newline at end of file
+        print("Please install it using: pip install pyzmq")
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,57 @@
+import math
+import re
+from decimal import Decimal, ROUND_HALF_UP
+
+# Money is an int number of cents everywhere: parsed once from the amount
+# text, added up and compared as ints, and only turned back into text to
+# be shown. The ledger keeps the text it was given, so "12.5" stays "12.5".
+
+AMOUNT_PATTERN = re.compile(r"(\d+)(?:\.(\d{1,2}))?")
+
+def parseAmount(text):
+    """Turn an amount like "12.5" into (cents, digits after the point), None if it isn't that simple"""
+    match = AMOUNT_PATTERN.fullmatch(text)
+    if not match:
+        return None
+    whole, fraction = match.groups()
+    fraction = fraction or ""
+    cents = int(whole) * 100 + int(fraction.ljust(2, "0"))
+    return cents, len(fraction)
+
+def formatAmount(cents, scale):
+    if scale == 0:
+        return str(cents // 100)
+    if scale == 1:
+        return f"{cents // 100}.{cents % 100 // 10}"
+    return f"{cents // 100}.{cents % 100:02d}"
+
+def toCents(text):
+    """Cents of an amount, one with more decimals is rounded to the cent (halves up)
+
+    What float() doesn't take raises its ValueError, and infinity an
+    OverflowError, as the amounts always have.
+    """
+    amount = parseAmount(text)
+    if amount is not None:
+        return amount[0]
+    value = float(text)
+    if not math.isfinite(value):
+        return round(value)  # the error round() always gave
+    # decimal, so 1.005 is 101 cents and not the 100 its float would round to
+    return int((Decimal(text) * 100).to_integral_value(ROUND_HALF_UP))
+
+def centsOrNone(text):
+    """toCents, None if the amount isn't a number"""
+    try:
+        return toCents(text)
+    except (ValueError, OverflowError, TypeError):
+        return None
+
+def isAmount(text):
+    """Whether text is an amount a transaction can have: digits with at most one decimal point"""
+    return text.count(".") <= 1 and text.replace(".", "").isdigit()
+
+def formatCents(cents):
+    """Cents as 12.50 or -3.00, what f"{amount:.2f}" shows without going through a float"""
+    sign = "-" if cents < 0 else ""
+    return f"{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}"
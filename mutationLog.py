@@ -0,0 +1,312 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import threading
+import time
+from transactionStore import getLedgerLock, readBaseMeta, _signature, fcntl, LOG_SUFFIX, META_SUFFIX, TMP_SUFFIX
+from transactionIndex import getIndex, writeIndexFile, needsMigration, readTail, OffsetEntries, MAX_IDS_PER_ROW
+from transactionTable import rowId, withId, formatId, ID_COLUMN
+from transactionTotals import getTotals, rowDate
+from transactionDates import writeDatesFile, DateRuns
+from transactionBinary import BinaryWriter, BINARY_SUFFIX
+
+COMPACT_LOCK_SUFFIX = ".compact.lock"
+
+# compact once the log holds this many records
+COMPACT_MIN_RECORDS = 1000
+COMPACT_INTERVAL = 60  # seconds between checks
+
+class LedgerWriter:
+    """Exclusive access to a ledger for appending mutation records
+
+    with LedgerWriter(path) as writer:
+        row = writer.getRow(5)
+        writer.edit(5, newRow, row)
+
+    Records are written in one append (and fsync) when the block exits.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.logPath = path + LOG_SUFFIX
+        self.index = getIndex(path)
+        self.ledgerLock = getLedgerLock(path)
+        self.records = []
+        self.pending = {}  # rows changed in this block, not written yet
+        self.stack = None
+
+    def __enter__(self):
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(self.index.lock)
+            stack.enter_context(self.ledgerLock.hold(exclusive=True))
+            self.index.refresh()
+            self.nextId = self.index.nextId
+            self.startSeq = self.index.lastSeq
+            self.stack = stack.pop_all()
+        return self
+
+    def __exit__(self, excType, exc, tb):
+        with self.stack:
+            if excType is None:
+                self.flush()
+            changed = self.index.lastSeq != self.startSeq
+            nested = self.ledgerLock.depth > 1  # a writer further out updates the totals
+        if changed and not nested:
+            # outside the ledger lock, the totals cache takes the store's lock first
+            getTotals(self.path).refresh(rebuild=False, save=True)
+        return False
+
+    def getRow(self, transactionId):
+        if transactionId in self.pending:
+            return self.pending[transactionId]
+        return self.index.getRow(transactionId)
+
+    def add(self, row):
+        """Log a new transaction, returns its id"""
+        transactionId = self.nextId
+        self.nextId += 1
+        row = withId(row[:ID_COLUMN], transactionId)
+        self.records.append({"op": "add", "id": transactionId, "row": row})
+        self.pending[transactionId] = row
+        return transactionId
+
+    def edit(self, transactionId, row, old):
+        row = withId(row[:ID_COLUMN], transactionId)
+        self.records.append({"op": "edit", "id": transactionId, "row": row, "old": old})
+        self.pending[transactionId] = row
+
+    def delete(self, transactionId, old):
+        self.records.append({"op": "delete", "id": transactionId, "old": old})
+        self.pending[transactionId] = None
+
+    def discard(self):
+        """Drop the records of this block, nothing of it is written"""
+        self.records = []
+        self.pending = {}
+        self.nextId = self.index.nextId
+
+    def flush(self):
+        if not self.records:
+            return
+        seq = self.index.lastSeq
+        lines = []
+        for record in self.records:
+            seq += 1
+            lines.append(json.dumps({"seq": seq, **record}) + "\n")
+        self.records = []
+        self.pending = {}
+
+        repairLog(self.logPath)
+        with open(self.logPath, 'ab') as f:
+            f.write("".join(lines).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        self.index.refresh()
+
+def repairLog(logPath):
+    # drop a half-written last record left by a crash
+    try:
+        with open(logPath, 'rb+') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return  # the usual case, only the last byte is read
+            f.seek(0)
+            data = f.read()
+            f.truncate(data.rfind(b"\n") + 1)
+    except FileNotFoundError:
+        pass
+
+def addTransaction(path, row):
+    """Append one transaction to the ledger, returns its id (001, 002, etc.)"""
+    with LedgerWriter(path) as writer:
+        return formatId(writer.add(row))
+
+def recoverBase(path):
+    """Finish or roll back a compaction that was interrupted (call with the lock held)"""
+    baseTmp, metaTmp = path + TMP_SUFFIX, path + META_SUFFIX + TMP_SUFFIX
+    if os.path.exists(baseTmp):
+        # the new base never replaced the old one, the old base + log are still right
+        os.remove(baseTmp)
+        if os.path.exists(metaTmp):
+            os.remove(metaTmp)
+    elif os.path.exists(metaTmp):
+        os.replace(metaTmp, path + META_SUFFIX)
+
+@contextlib.contextmanager
+def compactionLock(path):
+    # only one process at a time may write a new base file
+    if fcntl is None:
+        yield
+        return
+    with open(path + COMPACT_LOCK_SUFFIX, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def writeBase(path, rows, seq, nextId, expectedSignature=None, keepsView=True):
+    """Write rows as the new base file holding every log record up to seq
+
+    Call with the compaction lock held. The rows are written to a temporary
+    file first and swapped in with an atomic rename, together with a fresh
+    id index and date index (and binary copy, if the ledger has one). keepsView says the rows are exactly the ledger at seq, so
+    readers may keep their parsed copy. Returns False (and changes nothing)
+    if the base file changed while we wrote.
+    """
+    index = getIndex(path)
+    baseTmp, metaTmp = path + TMP_SUFFIX, path + META_SUFFIX + TMP_SUFFIX
+
+    with getLedgerLock(path).hold(exclusive=True):
+        recoverBase(path)
+
+    # the slow part happens without the ledger lock, the old base stays valid meanwhile
+    entries = OffsetEntries()
+    dateEntries = DateRuns(path)
+    maxId = migrate = 0
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    rowCount = 0
+    binary = BinaryWriter(path) if os.path.exists(path + BINARY_SUFFIX) else None
+    with open(baseTmp, 'wb') as f:
+        offset = 0
+        for position, row in enumerate(rows):
+            rowCount = position + 1
+            writer.writerow(row)
+            if binary is not None:
+                binary.add(row)
+            data = buffer.getvalue().encode(index.encoding)
+            buffer.seek(0)
+            buffer.truncate()
+            f.write(data)
+
+            transactionId = rowId(row, position) if len(row) >= 3 else None
+            if transactionId is not None:
+                entries.append(transactionId, offset)
+                dateEntries.append(rowDate(row), offset, transactionId)
+                maxId = max(maxId, transactionId)
+                if needsMigration(row):
+                    migrate += 1
+            offset += len(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    with getLedgerLock(path).hold(exclusive=True):
+        meta = readBaseMeta(path)
+        if meta["seq"] > seq or (expectedSignature is not None and _signature(path) != expectedSignature):
+            os.remove(baseTmp)
+            if binary is not None:
+                binary.discard()
+            return False
+
+        newMeta = {
+            "seq": seq,
+            "nextId": max(nextId, maxId + 1),
+            "generation": meta.get("generation", 0) + 1,
+            "keepsView": keepsView,
+            # the log keeps the records this base just folded in, so readers
+            # that already applied up to logStart can carry on without re-parsing
+            "logStart": meta["seq"],
+        }
+        if not migrate:
+            # a rename keeps the file's inode, size and mtime
+            newMeta["migrated"] = list(_signature(baseTmp))
+        with open(metaTmp, 'w') as f:
+            json.dump(newMeta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(baseTmp, path)
+        os.replace(metaTmp, path + META_SUFFIX)
+        trimLog(path + LOG_SUFFIX, meta["seq"])
+
+        if maxId <= MAX_IDS_PER_ROW * rowCount + 1024:
+            writeIndexFile(path, _signature(path), entries.dense(maxId), rowCount, maxId, migrate)
+        writeDatesFile(path, _signature(path), dateEntries, rowCount)
+        if binary is not None:
+            signature = _signature(path)
+            binary.finish(signature, readTail(path, signature[1]))
+    return True
+
+def markMigrated(path, signature):
+    """Note in the meta that the base file with this signature needs no migration, see isMigrated"""
+    if signature is None:
+        return
+    metaPath = path + META_SUFFIX
+    with getLedgerLock(path).hold(exclusive=True):
+        recoverBase(path)
+        if _signature(path) != tuple(signature):
+            return  # compacted meanwhile, the new base has its own mark
+        meta = readBaseMeta(path)
+        meta["migrated"] = list(signature)
+        # not metaPath + TMP_SUFFIX, that one is a compaction's
+        tmpPath = f"{metaPath}.{os.getpid()}{TMP_SUFFIX}"
+        with open(tmpPath, 'w') as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmpPath, metaPath)
+
+def trimLog(logPath, seq):
+    """Keep only the log records newer than seq"""
+    try:
+        with open(logPath, 'rb') as f:
+            lines = f.read().splitlines(keepends=True)
+    except FileNotFoundError:
+        return
+    keep = [line for line in lines if line.endswith(b"\n") and json.loads(line)["seq"] > seq]
+    with open(logPath + TMP_SUFFIX, 'wb') as f:
+        f.writelines(keep)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(logPath + TMP_SUFFIX, logPath)
+
+def pendingRecords(path):
+    index = getIndex(path)
+    with index.lock:
+        index.refresh()
+        return index.lastSeq - index.baseSeq
+
+def compact(path, transform=None, force=False):
+    """Fold the mutation log into a new base file
+
+    The ledger is streamed from the old base and the log, so this never
+    holds the whole ledger in memory, only the new indexes' entries in
+    arrays of a few bytes per row. transform (row -> row) rewrites
+    every row on the way, force compacts even with an empty log.
+    """
+    index = getIndex(path)
+    with compactionLock(path):
+        with index.lock, index.ledgerLock.hold():
+            index.refresh()
+            seq, nextId, signature = index.lastSeq, index.nextId, index.baseSignature
+            if seq == index.baseSeq and not force:
+                return False
+            rows = index.iterRows()
+
+        if transform is not None:
+            rows = map(transform, rows)
+        if not writeBase(path, rows, seq, nextId, signature, keepsView=transform is None):
+            return False
+    # the totals are saved between compactions only every so many records
+    getTotals(path).persist()
+    return True
+
+def startCompactor(path, interval=COMPACT_INTERVAL, minRecords=COMPACT_MIN_RECORDS):
+    """Compact the log in a background thread once it gets long"""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                if pendingRecords(path) >= minRecords:
+                    compact(path)
+            except Exception as e:
+                print(f"Compaction failed: {e}")
+
+    thread = threading.Thread(target=run, name="compactor", daemon=True)
+    thread.start()
+    return thread
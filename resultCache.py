@@ -0,0 +1,109 @@
+import threading
+from collections import OrderedDict
+
+DEFAULT_ENTRIES = 256
+DEFAULT_MB = 64
+
+class ResultCache:
+    """Encoded replies of recent requests, least recently used dropped first
+
+    Bounded by entry count and by the bytes of the replies held. Entries
+    are only good for one ledger version: the first request that sees a
+    new version empties the cache, and a reply made for an older version
+    is not kept. With maxEntries 0 it is off and only computes replies.
+    """
+
+    def __init__(self, maxEntries=DEFAULT_ENTRIES, maxBytes=DEFAULT_MB << 20):
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()  # key -> reply
+        self.size = 0
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.maxEntries > 0
+
+    def checkVersion(self, version):
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.size = 0
+            self.version = version
+
+    def get(self, key, version):
+        """Cached reply for key, None on a miss"""
+        with self.lock:
+            self.checkVersion(version)
+            reply = self.entries.get(key)
+            if reply is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return reply
+
+    def put(self, key, version, reply):
+        with self.lock:
+            if version != self.version or len(reply) > self.maxBytes or self.maxEntries < 1:
+                return  # made for a ledger that has changed since, or too big to keep
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = reply
+            self.size += len(reply)
+            while len(self.entries) > self.maxEntries or self.size > self.maxBytes:
+                _, dropped = self.entries.popitem(last=False)
+                self.size -= len(dropped)
+                self.evictions += 1
+
+    def reply(self, key, version, compute):
+        """The cached reply for key, or compute() cached for next time"""
+        if not self.enabled:
+            return compute()
+        reply = self.get(key, version)
+        if reply is None:
+            reply = compute()
+            self.put(key, version, reply)
+        return reply
+
+    def stats(self):
+        """Counters for tuning the limits, as a dict"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "maxEntries": self.maxEntries,
+                "maxBytes": self.maxBytes,
+            }
+
+def processCache(maxEntries, maxBytes, processes):
+    """The cache main() gives a service, off when its readers run as processes
+
+    Each reader process would have a cache and counters of its own, and the
+    stats request would be answered from whichever one took it.
+    """
+    if processes and maxEntries > 0:
+        print("The result cache is off with --processes")
+    return ResultCache(0 if processes else maxEntries, maxBytes)
+
+def disabledReply():
+    return {"success": False, "message": "The result cache is off (--cache-entries 0 or --processes)"}
+
+def addCacheOptions(parser):
+    parser.add_argument("--cache-entries", type=int, default=DEFAULT_ENTRIES,
+                        help="replies kept in the result cache, 0 turns it off (it is always off with --processes)")
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_MB, help="megabytes of replies kept in the result cache")
+    return parser
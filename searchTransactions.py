@@ -1,41 +1,200 @@
-import zmq
-import csv
-from pathlib import Path
+import contextlib
+import json
+from money import toCents, centsOrNone
+from transactionStore import getStore, versionOf, ledgerVersion
+from transactionTable import TYPE_INVALID, TYPE_NAMES
+from transactionKeywords import KeywordIndex
+from transactionAmounts import AmountIndex
+from resultCache import ResultCache, processCache, disabledReply, addCacheOptions, DEFAULT_ENTRIES, DEFAULT_MB
+from servicePool import serve, serviceParser, decodeJson, encodeJson, makeCursor, readPage, READ, END, DEFAULT_WORKERS
 
 # Path to transaction data
 transactionsFile = "transactions.csv"
 
+PAGE_RESULTS = 100  # results on a page unless a limit is given
+STREAM_RESULTS = 500  # results per message of a streamed search
+CACHED_COMMANDS = ("search_keyword", "filter_amount", "filter_amount_range", "top_amounts")
+
+# kept in step with the store's table between requests
+keywordIndex = KeywordIndex()
+amountIndex = AmountIndex()
+# replies to repeated queries, turned on by main() unless the readers are processes
+resultCache = ResultCache(0)
+
 def loadTransactions():
-    """Load transactions from CSV file"""
-    transactions = []
-    if Path(transactionsFile).exists():
-        with open(transactionsFile, 'r') as f:
-            reader = csv.reader(f)
-            rows = list(reader)
-            for idx, row in enumerate(rows):
-                if len(row) >= 3:  # Format: Type, Description, Amount, [Date]
-                    transaction = {
-                        "id": f"{idx+1:03d}",  # we are using a simple sequential ID (001, 002, etc.)
-                        "type": row[0],
-                        "description": row[1],
-                        "amount": row[2]
-                    }
-                    
-                    # add date if available
-                    if len(row) >= 4:
-                        transaction["date"] = row[3]
-                        
-                    transactions.append(transaction)
-    return transactions
-
-def searchByKeyword(keyword):
-    """Search transactions by keyword in description"""
-    transactions = loadTransactions()
+    """Load transactions from the shared CSV store"""
+    return getStore(transactionsFile).getTable()
+
+@contextlib.contextmanager
+def readTable():
+    """The table with both indexes in step, for reading only
+
+    The store's lock is only held while the table and indexes are brought
+    up to date, the searches themselves run side by side.
+    """
+    store = getStore(transactionsFile)
+    with contextlib.ExitStack() as stack:
+        with store.lock:
+            if (not store.isCurrent() or not keywordIndex.current(store.table)
+                    or amountIndex.table is not store.table):
+                # waits for the searches still reading the old version
+                with store.tableLock.writing():
+                    table = loadTransactions()
+                    keywordIndex.sync(table)
+                    amountIndex.sync(table)
+            table = store.table
+            stack.enter_context(store.tableLock.reading())
+        yield table
+
+def tableVersion():
+    """Version of the ledger the table was read from, call inside readTable()"""
+    store = getStore(transactionsFile)
+    return versionOf(store.signature, store.logSignature)
+
+def scanByKeyword(table, keyword):
+    """Slots whose description contains keyword, by checking every row"""
+    # check each distinct description once instead of every row
+    keyword = keyword.lower()
+    matching = {descId for descId, desc in enumerate(table.descPool) if keyword in desc.lower()}
+    
+    positions = []
+    if matching:
+        types = table.types
+        for i, descId in enumerate(table.descIds):
+            if descId in matching and types[i] != TYPE_INVALID:
+                positions.append(i)
+    return positions
+
+def keywordPositions(table, keyword):
+    # the n-gram index finds the matches without looking at every row
+    if keywordIndex.usable():
+        return keywordIndex.search(keyword)
+    return scanByKeyword(table, keyword)
+
+def searchByKeyword(keyword, offset=None, limit=None, cursor=None):
+    """Search transactions by keyword in description
+
+    With an offset, limit or cursor only that page of the results is
+    returned, with a nextCursor for the page after it.
+    """
     if not keyword:
         return {"success": False, "message": "No keyword provided"}
+    paged = (offset, limit, cursor) != (None, None, None)
     
-    keyword = keyword.lower()
-    results = [t for t in transactions if keyword in t.get('description', '').lower()]
+    with readTable() as table:
+        positions = keywordPositions(table, keyword)
+        count = len(positions)
+        if paged:
+            version = tableVersion()
+            try:
+                offset, limit = readPage(offset, limit, cursor, version, PAGE_RESULTS)
+            except ValueError as e:
+                return {"success": False, "message": str(e)}
+            positions = positions[offset:offset + limit]
+        results = [table.transaction(i) for i in positions]
+    
+    if not paged:
+        return {
+            "success": True,
+            "count": count,
+            "results": results
+        }
+    return {
+        "success": True,
+        "count": count,
+        "offset": offset,
+        "results": results,
+        "nextCursor": makeCursor(version, offset + limit, limit) if offset + limit < count else None
+    }
+
+def streamSearchByKeyword(keyword):
+    """The results of searchByKeyword as JSON messages of STREAM_RESULTS results, then one with the count
+
+    The table is only read-locked while a message is made, if it changes
+    between two of them the stream ends with an error.
+    """
+    if not keyword:
+        yield encodeJson({"success": False, "message": "No keyword provided"})
+        return
+    try:
+        with readTable() as table:
+            positions = keywordPositions(table, keyword)
+            version = tableVersion()
+        for start in range(0, len(positions), STREAM_RESULTS):
+            with readTable() as table:
+                if tableVersion() != version:
+                    yield encodeJson({"success": False, "message": "The transactions changed during the search"})
+                    return
+                results = [table.transaction(i) for i in positions[start:start + STREAM_RESULTS]]
+            yield encodeJson({"results": results})
+        print(f"Streamed search results: {len(positions)} transactions found!")
+        yield encodeJson({"success": True, "count": len(positions)})
+    except Exception as e:
+        print(f"Error processing request: {e}")
+        yield encodeJson({"success": False, "message": f"Error: {str(e)}"})
+
+def requestCents(amount):
+    # a JSON request can give an amount as a number too
+    return toCents(amount if isinstance(amount, str) else str(amount))
+
+def rowAmount(table, position):
+    """Amount of a slot in cents, None if it isn't a number"""
+    raw = table.rawRows.get(position)
+    if raw is None:
+        return table.amounts[position]
+    return centsOrNone(raw[2])  # skip if weird amount
+
+def rawAmounts(table, transactionType=None):
+    """(amount, slot) for the rows the amount index leaves out"""
+    result = []
+    for position, raw in table.rawRows.items():
+        if table.types[position] == TYPE_INVALID:
+            continue
+        if transactionType is not None and raw[0] != transactionType:
+            continue
+        amount = rowAmount(table, position)
+        if amount is not None:
+            result.append((amount, position))
+    return result
+
+def allAmounts(table, transactionType=None):
+    """(amount, slot) for every row, the slow way"""
+    result = []
+    for position in range(len(table)):
+        transType = table.types[position]
+        if transType == TYPE_INVALID:
+            continue
+        if transactionType is not None and TYPE_NAMES[transactionType] != transType:
+            continue
+        amount = rowAmount(table, position)
+        if amount is not None:
+            result.append((amount, position))
+    return result
+
+def parseType(transactionType):
+    """TYPE_INCOME/TYPE_EXPENSE for a type filter, None for no filter; raises ValueError otherwise"""
+    if transactionType in (None, "", "all"):
+        return None
+    if transactionType not in TYPE_NAMES:
+        raise ValueError(transactionType)
+    return TYPE_NAMES[transactionType]
+
+def filterByAmount(amount):
+    """Filter transactions by exact amount, compared in cents"""
+    try:
+        cents = requestCents(amount)
+    except (ValueError, OverflowError):
+        return {"success": False, "message": "Invalid amount provided"}
+    
+    with readTable() as table:
+        if amountIndex.usable():
+            # binary search in the sorted amounts, the few raw rows are checked one by one
+            positions = [position for _, position in amountIndex.exact(cents)]
+            positions += [position for value, position in rawAmounts(table) if value == cents]
+            positions.sort()
+        else:
+            positions = [position for value, position in allAmounts(table) if value == cents]
+        results = [table.transaction(i) for i in positions]
     
     return {
         "success": True,
@@ -43,22 +202,28 @@ def searchByKeyword(keyword):
         "results": results
     }
 
-def filterByAmount(amount):
-    """Filter transactions by exact amount"""
-    transactions = loadTransactions()
+def filterByAmountRange(minAmount=None, maxAmount=None, transactionType=None):
+    """Filter transactions with minAmount <= amount <= maxAmount, smallest first"""
     try:
-        amount = float(amount)
+        low = requestCents(minAmount) if minAmount not in (None, "") else None
+        high = requestCents(maxAmount) if maxAmount not in (None, "") else None
+    except (ValueError, OverflowError):
+        return {"success": False, "message": "Invalid amount range provided"}
+    try:
+        transType = parseType(transactionType)
     except (ValueError, TypeError):
-        return {"success": False, "message": "Invalid amount provided"}
+        return {"success": False, "message": "Invalid transaction type. Use income or expense."}
+    if transType is None:
+        transactionType = None
     
-    results = []
-    for t in transactions:
-        try:
-            if float(t.get('amount', 0)) == amount:
-                results.append(t)
-        except (ValueError, TypeError):
-            # skip if weird amount
-            continue
+    with readTable() as table:
+        if amountIndex.usable():
+            matches = amountIndex.between(low, high, transType) + rawAmounts(table, transactionType)
+        else:
+            matches = allAmounts(table, transactionType)
+        matches = sorted((value, position) for value, position in matches
+                         if (low is None or value >= low) and (high is None or value <= high))
+        results = [table.transaction(i) for _, i in matches]
     
     return {
         "success": True,
@@ -66,51 +231,119 @@ def filterByAmount(amount):
         "results": results
     }
 
-def main():
-    context = zmq.Context()
-    socket = context.socket(zmq.REP)
-    socket.bind("tcp://*:5558")  # Using port 5558 for this microservice
+def topAmounts(count=10, transactionType=None):
+    """The count largest transactions, largest first"""
+    try:
+        count = int(count)
+    except (ValueError, TypeError):
+        return {"success": False, "message": "Invalid count provided"}
+    if count < 1:
+        return {"success": False, "message": "Count must be at least 1"}
+    try:
+        transType = parseType(transactionType)
+    except (ValueError, TypeError):
+        return {"success": False, "message": "Invalid transaction type. Use income or expense."}
+    if transType is None:
+        transactionType = None
+    
+    with readTable() as table:
+        if amountIndex.usable():
+            matches = amountIndex.largest(count, transType) + rawAmounts(table, transactionType)
+        else:
+            matches = allAmounts(table, transactionType)
+        # equal amounts stay in ledger order
+        matches.sort(key=lambda match: (-match[0], match[1]))
+        results = [table.transaction(i) for _, i in matches[:count]]
     
+    return {
+        "success": True,
+        "count": len(results),
+        "results": results
+    }
+
+def routeRequest(data):
+    # searches only read, any number can run at once
+    return END if decodeJson(data).get("command") == "end" else READ
+
+def cacheKey(message):
+    """Key of a query's reply, the same for requests that only differ in the keyword's case"""
+    if message.get("command") not in CACHED_COMMANDS or message.get("stream"):
+        return None
+    if isinstance(message.get("keyword"), str):
+        message = dict(message, keyword=message["keyword"].lower())
+    return json.dumps(message, sort_keys=True)
+
+def handleRequest(data):
+    message = decodeJson(data)
+    try:
+        if message.get("command") == "cache_stats":
+            if not resultCache.enabled:
+                return encodeJson(disabledReply())
+            return encodeJson({"success": True, **resultCache.stats()})
+        key = cacheKey(message)
+        if key is not None:
+            # only replies that were answered get cached, an error is asked again next time
+            return resultCache.reply(key, ledgerVersion(transactionsFile), lambda: encodeJson(answerRequest(message)))
+        result = answerRequest(message)
+        return encodeJson(result) if isinstance(result, dict) else result
+    except Exception as e:
+        print(f"Error processing request: {e}")
+        return encodeJson({"success": False, "message": f"Error: {str(e)}"})
+
+def answerRequest(message):
+    """Reply to a search request: a result dict, or a generator of messages for a streamed search"""
+    command = message.get("command")
+    
+    if command == "search_keyword" and message.get("stream"):
+        keyword = message.get("keyword")
+        print(f"Received streamed search request for keyword: {keyword}")
+        return streamSearchByKeyword(keyword)
+    
+    if command == "search_keyword":
+        keyword = message.get("keyword")
+        print(f"Received search request for keyword: {keyword}")
+        result = searchByKeyword(keyword, message.get("offset"), message.get("limit"), message.get("cursor"))
+        print(f"Sent search results: {result.get('count', 0)} transactions found!")
+    
+    elif command == "filter_amount":
+        amount = message.get("amount")
+        print(f"Received filter request for amount: {amount}")
+        result = filterByAmount(amount)
+        print(f"Sent filter results: {result.get('count', 0)} transactions found!")
+    
+    elif command == "filter_amount_range":
+        minAmount, maxAmount = message.get("min"), message.get("max")
+        transactionType = message.get("type")
+        print(f"Received range filter request: {minAmount} to {maxAmount} ({transactionType or 'all'})")
+        result = filterByAmountRange(minAmount, maxAmount, transactionType)
+        print(f"Sent filter results: {result.get('count', 0)} transactions found!")
+    
+    elif command == "top_amounts":
+        count = message.get("count", 10)
+        transactionType = message.get("type")
+        print(f"Received top amounts request: {count} ({transactionType or 'all'})")
+        result = topAmounts(count, transactionType)
+        print(f"Sent top amounts: {result.get('count', 0)} transactions found!")
+    
+    elif command == "end":
+        print("Received shutdown command")
+        result = {"success": True, "message": "Transaction Search Microservice shutting down"}
+    
+    else:
+        print(f"Received unknown command: {command}")
+        result = {"success": False, "message": "Unknown command"}
+    return result
+
+def main(workers=DEFAULT_WORKERS, processes=False, asyncRuntime=False,
+         cacheEntries=DEFAULT_ENTRIES, cacheBytes=DEFAULT_MB << 20):
+    global resultCache
     print("Transaction Search (D)")
+    resultCache = processCache(cacheEntries, cacheBytes, processes)
     
-    while True:
-        try:
-            message = socket.recv_json()
-            command = message.get("command")
-            
-            if command == "search_keyword":
-                keyword = message.get("keyword")
-                print(f"Received search request for keyword: {keyword}")
-                result = searchByKeyword(keyword)
-                socket.send_json(result)
-                print(f"Sent search results: {result['count']} transactions found!")
-            
-            elif command == "filter_amount":
-                amount = message.get("amount")
-                print(f"Received filter request for amount: {amount}")
-                result = filterByAmount(amount)
-                socket.send_json(result)
-                print(f"Sent filter results: {result['count']} transactions found!")
-            
-            elif command == "end":
-                print("Received shutdown command")
-                socket.send_json({"success": True, "message": "Transaction Search Microservice shutting down"})
-                break
-            
-            else:
-                print(f"Received unknown command: {command}")
-                socket.send_json({"success": False, "message": "Unknown command"})
-        
-        except Exception as e:
-            print(f"Error processing request: {e}")
-            try:
-                socket.send_json({"success": False, "message": f"Error: {str(e)}"})
-            except:
-                pass
+    serve("tcp://*:5558", handleRequest, routeRequest, workers, processes, asyncRuntime)  # Using port 5558 for this microservice
     
     print("Transaction Search (D) shutting down")
-    socket.close()
-    context.term()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = addCacheOptions(serviceParser("Transaction Search (D)")).parse_args()
+    main(args.workers, args.processes, args.asyncRuntime, args.cache_entries, args.cache_mb << 20)
@@ -0,0 +1,104 @@
+import threading
+import zmq
+
+STREAM_END = b""  # last message of a streamed reply, as servicePool sends it
+
+# where the microservices listen
+SERVICE_ADDRESSES = {
+    "A": "tcp://localhost:5555",  # transaction summary
+    "B": "tcp://localhost:5556",  # edits and edit history
+    "C": "tcp://localhost:5557",  # deletion
+    "D": "tcp://localhost:5558",  # search
+}
+
+REQUEST_TIMEOUT = 30  # seconds to wait for a reply
+POOL_SIZE = 4  # idle sockets kept per service
+
+class ServiceTimeout(Exception):
+    """A service did not reply in time (it is probably not running)"""
+
+class ServiceClient:
+    """One zmq context and a pool of connected REQ sockets per service
+
+    A socket goes back to the pool after a complete request/reply. One that
+    timed out or failed mid-request can't be used for another request (REQ
+    sockets must alternate send and receive), so it is closed and the next
+    request to that service connects a new one.
+    """
+
+    def __init__(self, addresses=SERVICE_ADDRESSES, timeout=REQUEST_TIMEOUT, poolSize=POOL_SIZE):
+        self.context = zmq.Context()
+        self.addresses = dict(addresses)
+        self.timeout = timeout
+        self.poolSize = poolSize
+        self.idle = {service: [] for service in self.addresses}
+        self.lock = threading.Lock()
+
+    def checkout(self, service):
+        with self.lock:
+            if self.idle[service]:
+                return self.idle[service].pop()
+        socket = self.context.socket(zmq.REQ)
+        socket.setsockopt(zmq.LINGER, 0)  # never block on close with an unsent request
+        socket.connect(self.addresses[service])
+        return socket
+
+    def checkin(self, service, socket):
+        with self.lock:
+            if len(self.idle[service]) < self.poolSize:
+                self.idle[service].append(socket)
+                return
+        socket.close()
+
+    def request(self, service, send, receive, timeout=None):
+        """send(socket), then wait for and return receive(socket)"""
+        timeout = self.timeout if timeout is None else timeout
+        socket = self.checkout(service)
+        try:
+            send(socket)
+            if not socket.poll(timeout * 1000, zmq.POLLIN):
+                raise ServiceTimeout(f"Microservice {service} did not reply within {timeout:g}s")
+            reply = receive(socket)
+        except BaseException:
+            socket.close()
+            raise
+        self.checkin(service, socket)
+        return reply
+
+    def requestJson(self, service, message, timeout=None):
+        return self.request(service, lambda socket: socket.send_json(message),
+                            lambda socket: socket.recv_json(), timeout)
+
+    def requestBytes(self, service, data, timeout=None):
+        return self.request(service, lambda socket: socket.send(data), lambda socket: socket.recv(), timeout)
+
+    def requestStream(self, service, data, timeout=None):
+        """Yield the chunks of a streamed reply as they arrive, timeout applies to each chunk
+
+        A REQ socket takes a single reply, a stream is read on a DEALER of
+        its own. It is closed afterwards, and if the chunks aren't all read
+        nothing is left queued for another request.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        socket = self.context.socket(zmq.DEALER)
+        socket.setsockopt(zmq.LINGER, 0)
+        try:
+            socket.connect(self.addresses[service])
+            socket.send_multipart([b"", data])  # the empty frame a REQ socket would add
+            while True:
+                if not socket.poll(timeout * 1000, zmq.POLLIN):
+                    raise ServiceTimeout(f"Microservice {service} did not reply within {timeout:g}s")
+                chunk = socket.recv_multipart()[-1]
+                if chunk == STREAM_END:
+                    return
+                yield chunk
+        finally:
+            socket.close()
+
+    def close(self):
+        with self.lock:
+            for sockets in self.idle.values():
+                for socket in sockets:
+                    socket.close()
+                sockets.clear()
+        self.context.term()
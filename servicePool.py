@@ -0,0 +1,265 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import zmq
+import zmq.asyncio
+
+# how serve() treats a request
+READ = "read"  # any reader worker, in parallel with other reads
+WRITE = "write"  # the single writer, one at a time
+END = "end"  # answered by the frontend itself, then the service stops
+
+DEFAULT_WORKERS = 4
+MAX_IN_FLIGHT = 1000  # requests the async runtime takes before waiting for replies
+STREAM_END = b""  # last message of a streamed reply
+
+def serviceArguments(description):
+    """Command line of a service: worker count and threads or processes"""
+    return serviceParser(description).parse_args()
+
+def serviceParser(description):
+    # for a service with options of its own
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="reader workers")
+    parser.add_argument("--processes", action="store_true", help="run the readers as processes instead of threads")
+    parser.add_argument("--async", dest="asyncRuntime", action="store_true",
+                        help="serve from an asyncio event loop, handlers run on executors")
+    return parser
+
+def decodeJson(data):
+    """Request dict of a JSON service, empty if it isn't one"""
+    try:
+        message = json.loads(data)
+    except ValueError:
+        return {}
+    return message if isinstance(message, dict) else {}
+
+def encodeJson(reply):
+    # what socket.send_json sends
+    return json.dumps(reply).encode("utf8")
+
+def makeCursor(version, offset, limit):
+    """Opaque cursor for the page after offset of results of one ledger version"""
+    return f"{version}:{offset}:{limit}"
+
+def readCursor(cursor, version):
+    """(offset, limit) of a cursor, ValueError if it is malformed or the ledger changed since"""
+    try:
+        cursorVersion, offset, limit = str(cursor).split(":")
+        offset, limit = int(offset), int(limit)
+    except ValueError:
+        raise ValueError("Invalid cursor") from None
+    if cursorVersion != version:
+        raise ValueError("The transactions changed since the first page, start again without a cursor")
+    return offset, limit
+
+def readPage(offset, limit, cursor, version, defaultLimit):
+    """(offset, limit) of a paged request, from its cursor if it has one, ValueError with a message for the client"""
+    if cursor is not None:
+        return readCursor(cursor, version)
+    try:
+        offset = int(offset) if offset is not None else 0
+        limit = int(limit) if limit is not None else defaultLimit
+    except (ValueError, TypeError):
+        raise ValueError("offset and limit must be whole numbers") from None
+    if offset < 0 or limit < 1:
+        raise ValueError("offset can't be negative and limit must be at least 1")
+    return offset, limit
+
+def isStream(reply):
+    # handlers return bytes, or an iterator of chunks for a streamed reply
+    return not isinstance(reply, (bytes, bytearray, memoryview))
+
+def streamChunks(reply):
+    """The chunks of a streamed reply, ending early (and quietly for the client) if the handler fails"""
+    try:
+        for chunk in reply:
+            if chunk:
+                yield chunk
+    except Exception as e:
+        print(f"Streamed reply failed: {e}")
+
+def handleInProcess(handle, data):
+    # a streamed reply can't be sent back from a process pool as an iterator, only its chunks
+    reply = handle(data)
+    return list(streamChunks(reply)) if isStream(reply) else reply
+
+def runWorker(endpoint, handle, context=None):
+    """Answer requests from a backend one at a time until the context is terminated
+
+    A DEALER, not a REP, so a streamed reply can go out as one message
+    per chunk (then STREAM_END) behind the request's envelope.
+    """
+    ownContext = context is None
+    if ownContext:
+        context = zmq.Context()
+    socket = context.socket(zmq.DEALER)
+    socket.connect(endpoint)
+    try:
+        while True:
+            frames = socket.recv_multipart()
+            envelope = frames[:-1]
+            reply = handle(frames[-1])
+            if isStream(reply):
+                for chunk in streamChunks(reply):
+                    socket.send_multipart(envelope + [chunk], copy=False)
+                reply = STREAM_END
+            # a large reply (a full summary) is handed to zmq without another copy
+            socket.send_multipart(envelope + [reply], copy=False)
+    except zmq.ContextTerminated:
+        pass
+    finally:
+        socket.close(linger=0)
+        if ownContext:
+            context.term()
+
+def serve(address, handle, route, workers=DEFAULT_WORKERS, processes=False, asyncRuntime=False):
+    """Run a service: a ROUTER on address hands requests to DEALER backends
+
+    handle(request bytes) -> reply bytes does the work (or an iterator of
+    chunks, streamed to the client one message each), route(request bytes)
+    says whether it is a READ, WRITE or END. Reads go to a pool of workers
+    (threads, or processes over ipc), writes to a single writer thread.
+    With asyncRuntime the same handle and route run under serveAsync.
+    """
+    if asyncRuntime:
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(serveAsync(address, handle, route, workers, processes))
+        finally:
+            loop.close()
+        return
+
+    name = f"{os.getpid()}-{threading.get_ident()}"
+    if processes:
+        readPath = os.path.join(tempfile.gettempdir(), f"readers-{name}")
+        readEndpoint = f"ipc://{readPath}"
+    else:
+        readEndpoint = f"inproc://readers-{name}"
+    writeEndpoint = f"inproc://writer-{name}"
+
+    # worker processes are started before this process has any zmq state to inherit
+    pool = []
+    if processes:
+        pool = [multiprocessing.Process(target=runWorker, args=(readEndpoint, handle), daemon=True)
+                for _ in range(max(1, workers))]
+        for worker in pool:
+            worker.start()
+
+    context = zmq.Context()
+    frontend = context.socket(zmq.ROUTER)
+    frontend.bind(address)
+    writer = context.socket(zmq.DEALER)
+    writer.bind(writeEndpoint)
+    readers = context.socket(zmq.DEALER)
+    readers.bind(readEndpoint)
+
+    threads = [threading.Thread(target=runWorker, args=(writeEndpoint, handle, context), daemon=True)]
+    if not processes:
+        threads += [threading.Thread(target=runWorker, args=(readEndpoint, handle, context), daemon=True)
+                    for _ in range(max(1, workers))]
+    for worker in threads:
+        worker.start()
+
+    poller = zmq.Poller()
+    for socket in (frontend, readers, writer):
+        poller.register(socket, zmq.POLLIN)
+    try:
+        running = True
+        while running:
+            for socket, _ in poller.poll():
+                if socket is not frontend:
+                    # a reply, its envelope leads back to the client; passed on as zmq frames, not copied
+                    frontend.send_multipart(socket.recv_multipart(copy=False), copy=False)
+                    continue
+                frames = frontend.recv_multipart(copy=False)
+                kind = route(frames[-1].bytes)
+                if kind == END:
+                    frontend.send_multipart(frames[:-1] + [handle(frames[-1].bytes)], copy=False)
+                    running = False
+                else:
+                    (writer if kind == WRITE else readers).send_multipart(frames, copy=False)
+    finally:
+        for worker in pool:
+            worker.terminate()
+            worker.join()
+        readers.close(linger=0)
+        writer.close(linger=0)
+        frontend.close(linger=1000)  # let the last reply go out
+        context.term()  # stops the worker threads
+        if processes:
+            try:
+                os.remove(readPath)
+            except FileNotFoundError:
+                pass
+
+async def serveAsync(address, handle, route, workers=DEFAULT_WORKERS, processes=False):
+    """Run a service from an asyncio event loop on a zmq.asyncio ROUTER
+
+    The loop only moves messages: every handle() call, and so every file
+    read and write, runs on an executor, reads on a pool of workers
+    (threads, or processes) and writes on a single writer thread. Up to
+    MAX_IN_FLIGHT requests are handled at once. END waits for the requests
+    already taken to be answered, then replies and stops the service.
+    """
+    loop = asyncio.get_event_loop()
+    readers = ProcessPoolExecutor(max(1, workers)) if processes else ThreadPoolExecutor(max(1, workers))
+    writer = ThreadPoolExecutor(1)
+    context = zmq.asyncio.Context()
+    frontend = context.socket(zmq.ROUTER)
+    frontend.bind(address)
+    slots = asyncio.Semaphore(MAX_IN_FLIGHT)
+    inFlight = set()
+
+    async def answer(frames, executor):
+        try:
+            if executor is readers and processes:
+                reply = await loop.run_in_executor(executor, handleInProcess, handle, frames[-1])
+            else:
+                reply = await loop.run_in_executor(executor, handle, frames[-1])
+            if isinstance(reply, list):
+                # the chunks a process made
+                for chunk in reply:
+                    await frontend.send_multipart(frames[:-1] + [chunk], copy=False)
+                reply = STREAM_END
+            elif isStream(reply):
+                # each chunk is produced on the executor and sent as soon as it is there
+                chunks = streamChunks(reply)
+                while True:
+                    chunk = await loop.run_in_executor(executor, next, chunks, None)
+                    if chunk is None:
+                        break
+                    await frontend.send_multipart(frames[:-1] + [chunk], copy=False)
+                reply = STREAM_END
+            await frontend.send_multipart(frames[:-1] + [reply], copy=False)
+        except Exception as e:
+            # like a worker thread that dies, the client gets no reply and times out
+            print(f"Request failed: {e}")
+        finally:
+            slots.release()
+
+    try:
+        while True:
+            await slots.acquire()
+            frames = await frontend.recv_multipart()
+            kind = route(frames[-1])
+            if kind == END:
+                slots.release()
+                if inFlight:
+                    await asyncio.wait(inFlight)
+                reply = await loop.run_in_executor(writer, handle, frames[-1])
+                await frontend.send_multipart(frames[:-1] + [reply], copy=False)
+                break
+            task = asyncio.ensure_future(answer(frames, writer if kind == WRITE else readers))
+            inFlight.add(task)
+            task.add_done_callback(inFlight.discard)
+    finally:
+        frontend.close(linger=1000)  # let the last reply go out
+        context.term()
+        readers.shutdown()
+        writer.shutdown()
@@ -0,0 +1,56 @@
+import pytest
+import editTransactions
+import deleteTransactions
+from mutationLog import addTransaction
+from transactionIndex import lookupTransaction
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    path = str(tmp_path / "transactions.csv")
+    with open(path, 'w') as f:
+        f.write("Type,Description,Amount,Date,ID\n")
+    for number in range(3):
+        addTransaction(path, ["expense", f"Item {number}", "5", "2024-01-01"])
+    monkeypatch.setattr(editTransactions, "transactionsFile", path)
+    monkeypatch.setattr(editTransactions, "historyFile", str(tmp_path / "edit_history.jsonl"))
+    monkeypatch.setattr(editTransactions, "legacyHistoryFile", str(tmp_path / "edit_history.json"))
+    monkeypatch.setattr(deleteTransactions, "transactionsFile", path)
+    return path
+
+def amounts(path):
+    return [lookupTransaction(path, idNum)[2] if lookupTransaction(path, idNum) else None for idNum in (1, 2, 3)]
+
+def test_edit_batch_is_all_or_nothing(ledger):
+    result = editTransactions.editBatch([{"id": "1", "data": {"amount": "7"}}, {"id": "9", "data": {"amount": "7"}}])
+    assert not result["success"] and result["count"] == 0
+    assert [item["id"] for item in result["results"]] == ["9"]
+    assert amounts(ledger) == ["5", "5", "5"]
+    assert editTransactions.getEditHistory("1")["history"] == []
+
+def test_edit_batch_partial_applies_the_rest(ledger):
+    result = editTransactions.editBatch([{"id": "1", "data": {"amount": "7"}}, {"id": "9", "data": {"amount": "7"}}],
+                                        partial=True)
+    assert result["success"] and result["count"] == 1
+    assert [item["success"] for item in result["results"]] == [True, False]
+    assert amounts(ledger) == ["7", "5", "5"]
+    assert len(editTransactions.getEditHistory("1")["history"]) == 1
+
+def test_no_edit_without_its_history(ledger, monkeypatch):
+    def fail(self, edits):
+        raise OSError("disk full")
+    monkeypatch.setattr(type(editTransactions.historyStore()), "append", fail)
+    with pytest.raises(OSError):
+        editTransactions.editBatch([{"id": "1", "data": {"amount": "7"}}])
+    with pytest.raises(OSError):
+        editTransactions.editTransaction("2", {"amount": "7"})
+    assert amounts(ledger) == ["5", "5", "5"]
+
+def test_delete_batch_is_all_or_nothing(ledger):
+    result = deleteTransactions.deleteBatch(["1", "x", "3"], confirm=True)
+    assert not result["success"] and result["count"] == 0
+    assert [item["id"] for item in result["results"]] == ["x"]
+    assert amounts(ledger) == ["5", "5", "5"]
+
+    result = deleteTransactions.deleteBatch(["1", "x", "3"], confirm=True, partial=True)
+    assert result["success"] and result["count"] == 2
+    assert amounts(ledger) == [None, "5", None]
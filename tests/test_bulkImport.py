@@ -0,0 +1,23 @@
+from bulkImport import validateBatch, rowKey
+
+TODAY = "2024-01-31"
+
+def validate(*records):
+    return validateBatch(list(enumerate(records, 1)), TODAY)
+
+def test_numeric_zero_amounts_are_amounts():
+    rows, errors = validate({"type": "income", "description": "Refund", "amount": 0},
+                            {"type": "income", "description": "Refund", "amount": 0.0})
+    assert errors == []
+    assert [row[2] for row in rows] == ["0", "0.0"]
+
+def test_a_signed_amount_loses_one_sign_only():
+    rows, errors = validate({"description": "Shop", "amount": "-5"}, {"description": "Pay", "amount": "+5"},
+                            {"description": "Shop", "amount": "--5"}, {"description": "Shop", "amount": "+-5"})
+    assert rows == [["expense", "Shop", "5", TODAY], ["income", "Pay", "5", TODAY]]
+    assert [number for number, _ in errors] == [3, 4]
+
+def test_row_keys_compare_the_fields():
+    assert rowKey(["expense", "Rent", "12.5", "2024-01-01"]) == rowKey(["expense", "Rent", "12.50", "2024-01-01"])
+    assert rowKey(["expense", "Rent", "12.5", "2024-01-01"]) != rowKey(["expense", "Rent", "12.51", "2024-01-01"])
+    assert rowKey(["expense", "Rent", "12.5", "2024-01-01"]) == ("expense", "Rent", 1250, "2024-01-01")
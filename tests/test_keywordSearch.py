@@ -0,0 +1,92 @@
+import csv
+import random
+
+import pytest
+
+from benchmarks.keywordSearchBenchmark import loadTransactions, baselineSearch
+from benchmarks.ledgerGenerator import generateRows, DESCRIPTIONS
+from mutationLog import LedgerWriter, compact
+from transactionKeywords import KeywordIndex, GRAM_LENGTH
+from transactionStore import getStore
+import searchTransactions
+
+# shorter than the grams, any case, spaces, letters that change length when lowered, no match at all
+FIXED_KEYWORDS = ["e", "ll", "E", " ", "re", "RENT", "rent", "Gym", "bill", "xyz", "İ", "café", "CAFÉ",
+                  "Groceries!", "ï", "f ", "ent"]
+
+def keywords(rng, count):
+    # pieces of real descriptions, some in upper case
+    result = []
+    for _ in range(count):
+        word = rng.choice(DESCRIPTIONS)
+        start = rng.randrange(len(word))
+        piece = word[start:start + rng.randint(1, 8)]
+        result.append(piece.upper() if rng.random() < 0.3 else piece)
+    return result + FIXED_KEYWORDS
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    path = str(tmp_path / "transactions.csv")
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        # a broken row anywhere but at the start would send the searches to the scan
+        writer.writerow(["bad"])
+        writer.writerows(generateRows(2000))
+        writer.writerows([["income", "Ünïcode Café", "5"], ["other", "Refund of bill", "1.005"]])
+    monkeypatch.setattr(searchTransactions, "transactionsFile", path)
+    return path
+
+def mutate(path, rng, count):
+    with LedgerWriter(path) as writer:
+        for _ in range(count):
+            transactionId = rng.randint(1, writer.nextId - 1)
+            row = writer.getRow(transactionId)
+            choice = rng.random()
+            if choice < 0.4:
+                writer.add(["expense", rng.choice(DESCRIPTIONS) + " extra", "12.50", "2024-02-02"])
+            elif row is None:
+                continue
+            elif choice < 0.8:
+                writer.edit(transactionId, [row[0], rng.choice(DESCRIPTIONS).lower(), row[2], row[3]], row)
+            else:
+                writer.delete(transactionId, row)
+
+def checkAgainstLinearSearch(path, words):
+    # the index against a scan of every description
+    store = getStore(path)
+    with store.lock:
+        table = store.getTable()
+        index = KeywordIndex()
+        index.sync(table)
+        assert index.usable()
+        for word in words:
+            assert index.search(word) == searchTransactions.scanByKeyword(table, word), word
+    # what the service answers, ids and fields included, against the original search
+    transactions = loadTransactions(path)
+    for word in words:
+        assert searchTransactions.searchByKeyword(word) == baselineSearch(transactions, word), word
+    assert searchTransactions.keywordIndex.usable()  # the service's searches went through its index
+
+def test_keywords_find_what_the_linear_search_finds(ledger):
+    checkAgainstLinearSearch(ledger, keywords(random.Random(1), 100))
+
+def test_keywords_shorter_than_the_grams(ledger):
+    words = [word for word in keywords(random.Random(2), 200) if len(word) < GRAM_LENGTH]
+    assert words
+    checkAgainstLinearSearch(ledger, words)
+
+def test_search_ignores_case(ledger):
+    for word in ("rent", "gym", "café", "e"):
+        lower = searchTransactions.searchByKeyword(word)
+        assert lower["count"] > 0
+        assert searchTransactions.searchByKeyword(word.upper()) == lower
+
+def test_the_index_follows_adds_edits_and_deletes(ledger):
+    rng = random.Random(3)
+    words = keywords(rng, 50)
+    checkAgainstLinearSearch(ledger, words)
+    for round in range(4):
+        mutate(ledger, rng, 200)
+        if round == 1:
+            compact(ledger)
+        checkAgainstLinearSearch(ledger, words)
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.ledgerGenerator import writeLedger
+
+pytest.importorskip("resource")  # the child processes report their peak RSS with it
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# set SUMMARY_MEMORY_ROWS=10000000 for the full size check
+ROWS = int(os.environ.get("SUMMARY_MEMORY_ROWS", 1000000))
+# peak RSS a summary may take besides the interpreter and the reply, whatever the ledger size
+BUDGET_MB = 24
+
+# exactly what Service A runs for a request, reply bytes included
+SUMMARISE = """
+import resource, sys
+from transactionSummary import handleRequest
+reply = handleRequest(("summary " + sys.argv[1]).encode())
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, len(reply))
+"""
+
+def summarise(directory, timeRange):
+    """(peak RSS in MB, reply bytes) of a summary request in a new interpreter"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO, os.environ.get("PYTHONPATH")])))
+    result = subprocess.run([sys.executable, "-c", SUMMARISE, timeRange], cwd=directory, env=env,
+                            stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    peak, size = result.stdout.splitlines()[-1].split()  # after what the service logs
+    return float(peak), int(size)
+
+def makeLedger(directory, rows):
+    directory.mkdir()
+    writeLedger(str(directory / "transactions.csv"), rows, days=5 * 365)
+    return directory
+
+def test_summaries_stay_within_budget_from_a_cold_start(tmp_path):
+    # the same requests on a tiny ledger measure the interpreter, its imports and the fixed costs
+    small = makeLedger(tmp_path / "small", 1000)
+    large = makeLedger(tmp_path / "large", ROWS)
+    # the ledger has no indexes yet, the first dated summary builds the date index
+    for timeRange in ("30", "all", "30"):
+        baseline, _ = summarise(small, timeRange)
+        peak, size = summarise(large, timeRange)
+        overhead = peak - baseline - size / 2**20
+        assert overhead <= BUDGET_MB, f"summary {timeRange} of {ROWS} rows took {overhead:.1f} MB besides the reply"
@@ -0,0 +1,54 @@
+import bisect
+from transactionTable import TYPE_INCOME, TYPE_EXPENSE
+
+class AmountIndex:
+    """Amount lookups on a TransactionTable through its sorted amount arrays
+
+    Only covers income and expense rows outside rawRows (see
+    TransactionTable.trackAmounts), callers check the raw rows themselves.
+    Everything is returned as (cents, slot) pairs.
+    """
+
+    def __init__(self):
+        self.table = None
+
+    def sync(self, table):
+        """Follow the table the store hands out (a new one after a full reload)"""
+        if table is not self.table:
+            self.table = table
+            table.trackAmounts()
+
+    def usable(self):
+        # repeated or broken ids (hand-edited files) are searched the slow way
+        return self.table.idsUnique()
+
+    def orders(self, transType=None):
+        if transType is None:
+            return [self.table.amountOrder[TYPE_INCOME], self.table.amountOrder[TYPE_EXPENSE]]
+        return [self.table.amountOrder[transType]]
+
+    def slots(self, amounts, ids, start, end):
+        find = self.table.find
+        return [(amounts[i], find(ids[i])) for i in range(start, end)]
+
+    def between(self, low=None, high=None, transType=None):
+        """Rows with low <= cents <= high (None for no limit)"""
+        result = []
+        for amounts, ids in self.orders(transType):
+            start = 0 if low is None else bisect.bisect_left(amounts, low)
+            end = len(amounts) if high is None else bisect.bisect_right(amounts, high)
+            result.extend(self.slots(amounts, ids, start, end))
+        return result
+
+    def exact(self, cents):
+        return self.between(cents, cents)
+
+    def largest(self, count, transType=None):
+        """The count largest rows of each type, plus any that tie with the smallest of them"""
+        result = []
+        for amounts, ids in self.orders(transType):
+            start = max(0, len(amounts) - count)
+            if start:
+                start = bisect.bisect_left(amounts, amounts[start], 0, start)
+            result.extend(self.slots(amounts, ids, start, len(amounts)))
+        return result
@@ -0,0 +1,148 @@
+import datetime
+import itertools
+from transactionTable import NO_DATE, MAX_CENTS
+from money import toCents
+
+try:
+    import numpy
+except ImportError:  # optional, the summaries fall back to the pure-Python loops
+    numpy = None
+
+# The summaries' arithmetic on NumPy arrays: amounts as int64 cents, dates
+# as datetime64[D] (NaT for rows without a date) and the type as a boolean
+# expense mask. Rows are turned into arrays a block at a time, so memory
+# stays as flat as with the row by row loops.
+
+BLOCK_ROWS = 4096  # rows turned into arrays at a time, bigger blocks only keep more rows alive for the GC
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()  # datetime64 counts days from here
+PERIODS = ("day", "week", "month", "year")
+MAX_WHOLE_DIGITS = 16  # whole part digits parsed on the arrays, the cents still fit an int64
+
+if numpy is not None:
+    # by a digit's place counted from two past the point: hundredths, tenths, the point, ones, tens...
+    DIGIT_CENTS = numpy.array([1, 10, 0] + [100 * 10**power for power in range(MAX_WHOLE_DIGITS)], numpy.int64)
+
+def available():
+    return numpy is not None
+
+def blocks(iterable, size=BLOCK_ROWS):
+    """Lists of up to size items of iterable, in order"""
+    iterator = iter(iterable)
+    while True:
+        block = list(itertools.islice(iterator, size))
+        if not block:
+            return
+        yield block
+
+def expenseMask(rows):
+    return numpy.array([row[0] for row in rows]) == "expense"
+
+def centsColumn(rows):
+    """int64 cents of the rows' amounts, as rowCents gives them (and with the same error for the first bad one)
+
+    Simple amounts (digits, then optionally a point and one or two digits)
+    are parsed on the array of their characters, only the others go
+    through rowCents one at a time.
+    """
+    texts = numpy.array([row[2] for row in rows])
+    width = texts.dtype.itemsize // 4
+    if not rows or width == 0:
+        values = numpy.zeros(len(rows), numpy.int64)
+        simple = numpy.zeros(len(rows), bool)
+    else:
+        # one row of UCS-4 code points per amount, padded with zeros
+        chars = texts.view(numpy.int32).reshape(len(rows), width)
+        length = (chars != 0).sum(1)
+        isDigit = (chars >= 48) & (chars <= 57)
+        isDot = chars == 46
+        dots = isDot.sum(1)
+        point = numpy.where(dots == 1, isDot.argmax(1), length)  # where the whole part ends
+        decimals = length - point - (dots == 1)
+        simple = (((isDigit | isDot) == (numpy.arange(width) < length[:, None])).all(1)
+                  & (dots <= 1) & (point >= 1) & (point <= MAX_WHOLE_DIGITS)
+                  & ((dots == 0) | (decimals >= 1)) & (decimals <= 2))
+        # cents each digit is worth by its place from the point, read off DIGIT_CENTS
+        place = numpy.clip(point[:, None] + 2 - numpy.arange(width), 0, len(DIGIT_CENTS) - 1)
+        values = (numpy.where(isDigit, chars - 48, 0) * DIGIT_CENTS[place]).sum(1)
+    others = numpy.flatnonzero(~simple).tolist()
+    if others:
+        # in row order, so the first amount that can't be converted is the one the error is about
+        converted = [toCents(texts[position].item()) for position in others]
+        if all(-MAX_CENTS <= cents <= MAX_CENTS for cents in converted):
+            values[others] = converted
+        else:
+            values = values.astype(object)  # Python ints, as the row by row loop adds
+            values[others] = converted
+    return values
+
+def dateColumn(ordinals):
+    """datetime64[D] of day ordinals, NaT for NO_DATE"""
+    days = numpy.array(ordinals, numpy.int64)
+    dates = (days - EPOCH_ORDINAL).astype("datetime64[D]")
+    dates[days == NO_DATE] = numpy.datetime64("NaT")
+    return dates
+
+def windowMask(dates, startOrdinal, endOrdinal):
+    """Dates from startOrdinal to endOrdinal, undated rows always pass (as inWindow)"""
+    start = numpy.datetime64(startOrdinal - EPOCH_ORDINAL, "D")
+    end = numpy.datetime64(endOrdinal - EPOCH_ORDINAL, "D")
+    return numpy.isnat(dates) | ((dates >= start) & (dates <= end))
+
+def anyDated(dates, mask):
+    """Whether mask selects a row that has a date"""
+    return bool((mask & ~numpy.isnat(dates)).any())
+
+def maskedTotals(isExpense, cents, mask=None):
+    """(income, expense) cents of the rows mask selects, all of them without one"""
+    if mask is not None:
+        isExpense, cents = isExpense[mask], cents[mask]
+    if cents.dtype == numpy.int64 and len(cents) and int(numpy.abs(cents).max()) > MAX_CENTS // len(cents):
+        cents = cents.astype(object)  # the sum could overflow an int64
+    expense = int(cents[isExpense].sum())
+    return int(cents.sum()) - expense, expense
+
+def periodStart(ordinal, period):
+    """Ordinal of the first day of the week (Monday), month or year an ordinal is in"""
+    if period == "week":
+        return ordinal - (ordinal - 1) % 7  # ordinal 1 was a Monday
+    if period == "day":
+        return ordinal
+    date = datetime.date.fromordinal(ordinal)
+    return date.replace(day=1).toordinal() if period == "month" else date.replace(month=1, day=1).toordinal()
+
+def groupTotals(days, period):
+    """[(period start ordinal, sums...)] in date order from (ordinal, values...) per day
+
+    Dated days only. A sort and reduceat on the arrays when NumPy is
+    there (and the sums fit an int64), a dict of running sums otherwise.
+    """
+    days = [day for day in days if day[0] != NO_DATE]
+    if not days:
+        return []
+    if numpy is None or max(abs(value) for day in days for value in day[1:]) > MAX_CENTS // len(days):
+        groups = {}
+        for ordinal, *values in days:
+            start = periodStart(ordinal, period)
+            sums = groups.get(start)
+            if sums is None:
+                groups[start] = values
+            else:
+                groups[start] = [total + value for total, value in zip(sums, values)]
+        return [(start, *sums) for start, sums in sorted(groups.items())]
+
+    ordinals, *values = (numpy.array(column, numpy.int64) for column in zip(*days))
+    dates = dateColumn(ordinals)
+    if period == "week":
+        # datetime64 weeks start on a Thursday (1970-01-01), shifting by 3 days makes them start on Monday
+        shift = numpy.timedelta64(3, "D")
+        starts = ((dates + shift).astype("datetime64[W]").astype("datetime64[D]") - shift)
+    else:
+        unit = {"day": "D", "month": "M", "year": "Y"}[period]
+        starts = dates.astype(f"datetime64[{unit}]").astype("datetime64[D]")
+    keys = starts.astype(numpy.int64) + EPOCH_ORDINAL
+    order = numpy.argsort(keys, kind="stable")
+    keys = keys[order]
+    first = numpy.flatnonzero(numpy.concatenate(([True], keys[1:] != keys[:-1])))
+    # reduceat keeps int64 sums, bincount would go through float64
+    sums = [numpy.add.reduceat(column[order], first).tolist() for column in values]
+    return list(zip(keys[first].tolist(), *sums))
@@ -0,0 +1,276 @@
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from transactionTable import TransactionTable, NO_ID, formatAmount, formatDate, NO_DATE, TYPE_INCOME
+
+# binary copy of the base CSV, the services load it instead of parsing the CSV
+BINARY_SUFFIX = ".bin"
+BINARY_MAGIC = b"TXBIN001"
+# magic, CSV inode, CSV size, CSV mtime, rows, descriptions, raw rows, ids sorted, CSV tail
+BINARY_HEADER = struct.Struct("<8sQQqQQQ?7x16s")
+# last bytes of the CSV kept in the header, tells an appended CSV from a rewritten one
+BINARY_TAIL_BYTES = 16
+# one fixed-width record per row: type, amount scale, date ordinal, id, cents, description number
+RECORD = struct.Struct("<BBxxiqqI4x")
+RECORD_FIELDS = {"type": (0, 1), "scale": (1, 1), "date": (4, 4), "id": (8, 8), "cents": (16, 8), "desc": (24, 4)}
+# after the records: description start offsets into the heap (one more than descriptions),
+# (row, heap offset, length) of every raw row, then the heap (UTF-8 descriptions, raw rows as JSON)
+HEAP_OFFSET = struct.Struct("<Q")
+RAW_ENTRY = struct.Struct("<QQQ")
+
+ROWS_PER_READ = 4096  # records copied out of the mapping at a time by iterRows
+
+TMP_SUFFIX = ".tmp"  # as in transactionStore, which imports this module
+
+class BinaryWriter:
+    """Writes the binary copy of a base CSV one row at a time
+
+    Records go straight to a temporary file, only the description heap is
+    kept in memory. finish() stamps the CSV signature and swaps the file in.
+    """
+
+    def __init__(self, path):
+        self.binaryPath = path + BINARY_SUFFIX
+        self.tmpPath = f"{self.binaryPath}.{os.getpid()}.{threading.get_ident()}{TMP_SUFFIX}"
+        self.file = open(self.tmpPath, 'wb')
+        self.file.write(bytes(BINARY_HEADER.size))
+        self.encoder = TransactionTable()  # only for encodeRow and its description pool
+        self.rows = 0
+        self.rawRows = []  # (row number, JSON text)
+        self.idsSorted = True
+        self.lastId = None
+
+    def add(self, row):
+        (transType, transactionId, cents, scale, date, descId), exact = self.encoder.encodeRow(row, self.rows)
+        # same rule as TransactionTable.appendRow
+        if self.lastId is not None and (transactionId < self.lastId or transactionId == self.lastId != NO_ID):
+            self.idsSorted = False
+        self.lastId = transactionId
+        self.file.write(RECORD.pack(transType, scale, date, transactionId, cents, descId))
+        if not exact:
+            self.rawRows.append((self.rows, json.dumps(row)))
+        self.rows += 1
+
+    def finish(self, signature, tail):
+        """Finish the file for the CSV with this signature and last bytes"""
+        heap = bytearray()
+        offsets = []
+        for desc in self.encoder.descPool:
+            offsets.append(len(heap))
+            heap += desc.encode('utf-8')
+        offsets.append(len(heap))
+        for offset in offsets:
+            self.file.write(HEAP_OFFSET.pack(offset))
+        rawTexts = [text.encode('utf-8') for _, text in self.rawRows]
+        start = len(heap)
+        for (position, _), text in zip(self.rawRows, rawTexts):
+            self.file.write(RAW_ENTRY.pack(position, start, len(text)))
+            start += len(text)
+        self.file.write(heap)
+        for text in rawTexts:
+            self.file.write(text)
+
+        self.file.seek(0)
+        self.file.write(BINARY_HEADER.pack(BINARY_MAGIC, signature[0], signature[1], signature[2], self.rows,
+                                           len(self.encoder.descPool), len(self.rawRows), self.idsSorted,
+                                           tail[-BINARY_TAIL_BYTES:]))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.tmpPath, self.binaryPath)
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.tmpPath)
+
+class BinaryLedger:
+    """Read access to a binary ledger file through mmap
+
+    Records are decoded one at a time when asked for, or a column at a
+    time (strided slices of the mapping) when a whole TransactionTable is
+    needed. Nothing is read into memory up front.
+    """
+
+    def __init__(self, binaryPath):
+        with open(binaryPath, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, inode, self.size, mtime, self.rows, self.descs, self.raws,
+         self.idsSorted, tail) = BINARY_HEADER.unpack_from(self.data)
+        self.tail = tail[:min(self.size, BINARY_TAIL_BYTES)]
+        self.signature = (inode, self.size, mtime)
+        self.recordsStart = BINARY_HEADER.size
+        self.offsetsStart = self.recordsStart + self.rows * RECORD.size
+        self.rawStart = self.offsetsStart + (self.descs + 1) * HEAP_OFFSET.size
+        self.heapStart = self.rawStart + self.raws * RAW_ENTRY.size
+        if magic != BINARY_MAGIC or len(self.data) < self.heapStart:
+            self.close()
+            raise ValueError(f"{binaryPath} is not a binary ledger")
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.rows
+
+    def covers(self, path, signature):
+        """Whether this is a copy of the CSV at path, or of the start of it if rows were appended since"""
+        if signature is None or not self.tail.endswith(b"\n"):
+            return False  # only files ending in a complete line, the rest is parsed from there
+        if signature == self.signature:
+            return True
+        if signature[0] != self.signature[0] or signature[1] <= self.size:
+            return False
+        with open(path, 'rb') as f:
+            f.seek(self.size - len(self.tail))
+            return f.read(len(self.tail)) == self.tail
+
+    def record(self, position):
+        """(type, scale, date, id, cents, descId) of one row"""
+        return RECORD.unpack_from(self.data, self.recordsStart + position * RECORD.size)
+
+    def description(self, descId):
+        start = self.offsetsStart + descId * HEAP_OFFSET.size
+        offset, = HEAP_OFFSET.unpack_from(self.data, start)
+        end, = HEAP_OFFSET.unpack_from(self.data, start + HEAP_OFFSET.size)
+        return self.text(offset, end - offset)
+
+    def text(self, offset, length):
+        start = self.heapStart + offset
+        return self.data[start:start + length].decode('utf-8')
+
+    def rawEntry(self, index):
+        return RAW_ENTRY.unpack_from(self.data, self.rawStart + index * RAW_ENTRY.size)
+
+    def rawRow(self, position):
+        """The original row if the record can't reproduce it, else None"""
+        low, high = 0, self.raws
+        while low < high:
+            middle = (low + high) // 2
+            if self.rawEntry(middle)[0] < position:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.raws:
+            rawPosition, offset, length = self.rawEntry(low)
+            if rawPosition == position:
+                return json.loads(self.text(offset, length))
+        return None
+
+    def row(self, position):
+        """The CSV row of one record, the same as TransactionTable.row"""
+        raw = self.rawRow(position)
+        if raw is not None:
+            return raw
+        transType, scale, date, transactionId, cents, descId = self.record(position)
+        return [
+            "income" if transType == TYPE_INCOME else "expense",
+            self.description(descId),
+            formatAmount(cents, scale),
+            formatDate(date) if date != NO_DATE else "",
+            str(transactionId),
+        ]
+
+    def iterRows(self):
+        """Every row in order, as row() gives them but decoded a block of records at a time"""
+        raws = {}
+        for index in range(self.raws):
+            position, offset, length = self.rawEntry(index)
+            raws[position] = offset, length
+        descriptions, dates = {}, {}
+        position = 0
+        for start in range(self.recordsStart, self.offsetsStart, ROWS_PER_READ * RECORD.size):
+            block = self.data[start:min(start + ROWS_PER_READ * RECORD.size, self.offsetsStart)]
+            for transType, scale, date, transactionId, cents, descId in RECORD.iter_unpack(block):
+                if position in raws:
+                    yield json.loads(self.text(*raws[position]))
+                    position += 1
+                    continue
+                position += 1
+                # descriptions and dates repeat, each one is only decoded once
+                description = descriptions.get(descId)
+                if description is None:
+                    description = descriptions[descId] = self.description(descId)
+                dateText = dates.get(date)
+                if dateText is None:
+                    dateText = dates[date] = formatDate(date) if date != NO_DATE else ""
+                yield [
+                    "income" if transType == TYPE_INCOME else "expense",
+                    description,
+                    formatAmount(cents, scale),
+                    dateText,
+                    str(transactionId),
+                ]
+
+    def find(self, transactionId):
+        """Row number of a transaction id (binary search over the records), None if it isn't there"""
+        if not self.idsSorted:
+            return next((p for p in range(self.rows) if self.record(p)[3] == transactionId), None)
+        ids = _RecordIds(self)
+        position = bisect.bisect_left(ids, transactionId)
+        if position < self.rows and ids[position] == transactionId:
+            return position
+        return None
+
+    def column(self, field, typecode):
+        """One record field for every row as an array"""
+        offset, size = RECORD_FIELDS[field]
+        start = self.recordsStart + offset
+        end = self.offsetsStart
+        values = bytearray(size * self.rows)
+        for byte in range(size):
+            # every RECORD.size-th byte of the mapping, copied by mmap in one go
+            values[byte::size] = self.data[start + byte:end:RECORD.size]
+        if size == 1:
+            return values
+        result = array(typecode)
+        result.frombytes(values)
+        if sys.byteorder != "little":
+            result.byteswap()
+        return result
+
+    def toTable(self):
+        """A TransactionTable with every row of the file"""
+        table = TransactionTable()
+        table.types = self.column("type", "B")
+        table.amountScales = self.column("scale", "B")
+        table.dates = self.column("date", "i")
+        table.ids = self.column("id", "q")
+        table.amounts = self.column("cents", "q")
+        table.descIds = self.column("desc", "I")
+        table.descPool = [self.description(descId) for descId in range(self.descs)]
+        table.descLookup = {desc: descId for descId, desc in enumerate(table.descPool)}
+        for index in range(self.raws):
+            position, offset, length = self.rawEntry(index)
+            table.rawRows[position] = json.loads(self.text(offset, length))
+        table.idsSorted = self.idsSorted
+        return table
+
+class _RecordIds:
+    """The id field of the records as a sequence, for bisect"""
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+
+    def __len__(self):
+        return self.ledger.rows
+
+    def __getitem__(self, position):
+        return self.ledger.record(position)[3]
+
+def openLedger(binaryPath):
+    """BinaryLedger for a file, None if there is no usable one"""
+    try:
+        return BinaryLedger(binaryPath)
+    except (FileNotFoundError, ValueError, struct.error):
+        return None
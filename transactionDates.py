@@ -0,0 +1,328 @@
+import heapq
+import os
+import struct
+import tempfile
+import threading
+from array import array
+from transactionStore import TMP_SUFFIX
+from transactionIndex import getIndex, scanBase, parseLine, readTail, appendedTo
+from transactionTable import rowId, withId, NO_DATE
+from transactionTotals import rowDate
+
+# base CSV rows sorted by date, for date window queries
+DATES_SUFFIX = ".dates"
+DATES_MAGIC = b"TXDATE01"
+# magic, base inode, base size, base mtime, rows in the base file, entries, base tail
+DATES_HEADER = struct.Struct("<8sQQqQQ16s")
+# one entry per transaction: date ordinal, byte offset of the row, id
+# sorted by date then offset, rows without a date (NO_DATE) come first
+ENTRY_FIELDS = 3
+ENTRY = struct.Struct("<qqq")
+ORDINAL = struct.Struct("<q")
+NO_ORDINAL = NO_DATE - 1  # a window entry for a row the log changed, its date comes from the log
+# entries a date index build sorts in memory at a time, see DateRuns
+RUN_ENTRIES = 1 << 18
+COPY_BYTES = 1 << 20
+
+class DateEntries:
+    """(ordinal, offset, id) entries collected column by column, a few bytes per row"""
+
+    def __init__(self):
+        self.ordinals = array('q')
+        self.offsets = array('q')
+        self.ids = array('q')
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def append(self, ordinal, offset, transactionId):
+        self.ordinals.append(ordinal)
+        self.offsets.append(offset)
+        self.ids.append(transactionId)
+
+    def extendFlat(self, flat):
+        self.ordinals.extend(flat[0::ENTRY_FIELDS])
+        self.offsets.extend(flat[1::ENTRY_FIELDS])
+        self.ids.extend(flat[2::ENTRY_FIELDS])
+
+    def sortedFlat(self):
+        """The entries flat and sorted by date then offset
+
+        Entries of one date must have been added in offset order, so a
+        counting sort by date (stable) puts them in order without a tuple
+        per row.
+        """
+        counts = {}
+        for ordinal in self.ordinals:
+            counts[ordinal] = counts.get(ordinal, 0) + 1
+        slots = {}
+        total = 0
+        for ordinal in sorted(counts):
+            slots[ordinal] = total
+            total += counts[ordinal]
+        flat = array('q', bytes(ENTRY.size * len(self.ordinals)))
+        for ordinal, offset, transactionId in zip(self.ordinals, self.offsets, self.ids):
+            slot = slots[ordinal]
+            slots[ordinal] = slot + 1
+            slot *= ENTRY_FIELDS
+            flat[slot] = ordinal
+            flat[slot + 1] = offset
+            flat[slot + 2] = transactionId
+        return flat
+
+    def writeTo(self, f):
+        self.sortedFlat().tofile(f)
+
+class DateRuns:
+    """DateEntries for a whole base file, in memory only RUN_ENTRIES at a time
+
+    Every RUN_ENTRIES entries are sorted and written to a temporary file as
+    a run, writeTo merges the runs a date at a time. Entries must be added
+    in offset order like DateEntries', so a run's entries of one date come
+    before a later run's.
+    """
+
+    def __init__(self, path):
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.current = DateEntries()
+        self.count = 0
+        self.file = None  # the runs, deleted once closed
+        self.runs = []  # (first entry in the file, ordinals, entries per ordinal) per run
+
+    def __len__(self):
+        return self.count
+
+    def append(self, ordinal, offset, transactionId):
+        self.current.append(ordinal, offset, transactionId)
+        self.count += 1
+        if len(self.current) >= RUN_ENTRIES:
+            self.spill()
+
+    def spill(self):
+        if self.file is None:
+            self.file = tempfile.TemporaryFile(dir=self.directory)
+        flat = self.current.sortedFlat()
+        ordinals, counts = array('q'), array('q')
+        for ordinal in flat[0::ENTRY_FIELDS]:
+            if ordinals and ordinals[-1] == ordinal:
+                counts[-1] += 1
+            else:
+                ordinals.append(ordinal)
+                counts.append(1)
+        self.file.seek(0, os.SEEK_END)
+        self.runs.append((self.file.tell() // ENTRY.size, ordinals, counts))
+        flat.tofile(self.file)
+        self.current = DateEntries()
+
+    def writeTo(self, f):
+        """Write every entry sorted by date then offset, and drop the runs"""
+        if self.file is None:
+            self.current.writeTo(f)
+            return
+        if len(self.current):
+            self.spill()
+        with self.file:
+            # (ordinal, run, its next ordinal, entry) for the next date of every run, earlier runs first on a tie
+            heap = [(ordinals[0], run, 0, start) for run, (start, ordinals, counts) in enumerate(self.runs)]
+            heapq.heapify(heap)
+            while heap:
+                ordinal, run, slot, entry = heap[0]
+                _, ordinals, counts = self.runs[run]
+                self.copy(f, entry, counts[slot])
+                if slot + 1 < len(ordinals):
+                    heapq.heapreplace(heap, (ordinals[slot + 1], run, slot + 1, entry + counts[slot]))
+                else:
+                    heapq.heappop(heap)
+        self.file = None
+
+    def copy(self, f, entry, count):
+        self.file.seek(entry * ENTRY.size)
+        remaining = count * ENTRY.size
+        while remaining:
+            data = self.file.read(min(remaining, COPY_BYTES))
+            f.write(data)
+            remaining -= len(data)
+
+def writeDatesFile(path, signature, entries, rows):
+    """Write the date index for a base file from DateEntries or DateRuns"""
+    datesPath = path + DATES_SUFFIX
+    tmpPath = f"{datesPath}.{os.getpid()}.{threading.get_ident()}{TMP_SUFFIX}"
+    with open(tmpPath, 'wb') as f:
+        f.write(DATES_HEADER.pack(DATES_MAGIC, signature[0], signature[1], signature[2], rows, len(entries),
+                                  readTail(path, signature[1])))
+        entries.writeTo(f)
+    os.replace(tmpPath, datesPath)
+
+class DateIndex:
+    """Finds the transactions in a date window without reading the whole ledger
+
+    The base CSV is reached through the on-disk date index, changes still in
+    the mutation log come from the id index's overlay.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.datesPath = path + DATES_SUFFIX
+        self.index = getIndex(path)
+        self.encoding = self.index.encoding
+        self.signature = None
+        self.rows = 0
+        self.count = 0
+
+    def refresh(self):
+        """Match the base file the id index has loaded (call with its lock held)"""
+        signature = self.index.baseSignature
+        if signature == self.signature:
+            return
+        self.signature = signature
+        if signature is None:
+            self.rows = self.count = 0
+            return
+
+        header = self.readHeader()
+        if header and header[1:4] == signature:
+            self.rows, self.count = header[4:6]
+        elif header and appendedTo(self.path, header, signature):
+            self.rows, self.count = header[4:6]
+            self.extend(header[2], signature)
+        else:
+            self.rebuild(signature)
+
+    def readHeader(self):
+        try:
+            with open(self.datesPath, 'rb') as f:
+                header = DATES_HEADER.unpack(f.read(DATES_HEADER.size))
+        except (FileNotFoundError, struct.error):
+            return None
+        return header if header[0] == DATES_MAGIC else None
+
+    def scan(self, start, signature, entries):
+        for offset, position, row in scanBase(self.path, self.encoding, start, self.rows, signature[1]):
+            self.rows = position + 1
+            if len(row) < 3:
+                continue
+            transactionId = rowId(row, position)
+            if transactionId is not None:
+                entries.append(rowDate(row), offset, transactionId)
+        return entries
+
+    def rebuild(self, signature):
+        self.rows = 0
+        entries = self.scan(0, signature, DateRuns(self.path))
+        writeDatesFile(self.path, signature, entries, self.rows)
+        self.count = len(entries)
+
+    def extend(self, start, signature):
+        appended = self.scan(start, signature, DateEntries())
+        with open(self.datesPath, 'r+b') as f:
+            last = self.readOrdinal(f, self.count - 1) if self.count else NO_DATE
+            if not appended.ordinals or min(appended.ordinals) >= last:
+                f.seek(DATES_HEADER.size + self.count * ENTRY.size)
+                appended.sortedFlat().tofile(f)
+                self.count += len(appended)
+                # header last, a crash before this just means extending again
+                f.seek(0)
+                f.write(DATES_HEADER.pack(DATES_MAGIC, signature[0], signature[1], signature[2],
+                                          self.rows, self.count, readTail(self.path, signature[1])))
+                return
+            # appended rows dated before the newest one, merge them in (they come after every old row)
+            entries = DateRuns(self.path)
+            for start in range(0, self.count, RUN_ENTRIES):
+                flat = self.readFlat(f, start, min(self.count, start + RUN_ENTRIES))
+                for ordinal, offset, transactionId in zip(flat[0::ENTRY_FIELDS], flat[1::ENTRY_FIELDS],
+                                                          flat[2::ENTRY_FIELDS]):
+                    entries.append(ordinal, offset, transactionId)
+            for entry in zip(appended.ordinals, appended.offsets, appended.ids):
+                entries.append(*entry)
+        writeDatesFile(self.path, signature, entries, self.rows)
+        self.count = len(entries)
+
+    def readOrdinal(self, f, position):
+        f.seek(DATES_HEADER.size + position * ENTRY.size)
+        return ORDINAL.unpack(f.read(ORDINAL.size))[0]
+
+    def readFlat(self, f, start, end):
+        f.seek(DATES_HEADER.size + start * ENTRY.size)
+        flat = array('q')
+        flat.frombytes(f.read((end - start) * ENTRY.size))
+        return flat
+
+    def findOrdinal(self, f, ordinal):
+        """First entry dated ordinal or later (binary search in the file)"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.readOrdinal(f, middle) < ordinal:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def window(self, startOrdinal, endOrdinal):
+        """(date ordinal, row) for rows dated startOrdinal..endOrdinal and every row without a date, in ledger order
+
+        Rows changed in the log are included whatever their date, callers
+        still check the date of every row they get. The rows are read as
+        they are used, only the offsets of the window are held.
+        """
+        index = self.index
+        with index.lock, index.ledgerLock.hold():
+            index.refresh()
+            self.refresh()
+
+            selected = DateEntries()  # base rows in the window, ordinal NO_ORDINAL for ones the log changed
+            if self.count:
+                with open(self.datesPath, 'rb') as f:
+                    undated = self.findOrdinal(f, NO_DATE + 1)
+                    first = max(undated, self.findOrdinal(f, startOrdinal))
+                    last = self.findOrdinal(f, endOrdinal + 1)
+                    for start, end in ((0, undated), (first, last)):
+                        if end > start:
+                            selected.extendFlat(self.readFlat(f, start, end))
+
+            overlay = dict(index.overlay)
+            added = []
+            for transactionId, row in overlay.items():
+                offset = index.baseOffset(transactionId)
+                if offset is not None:
+                    selected.append(NO_ORDINAL, offset, transactionId)
+                elif row is not None:
+                    added.append(transactionId)
+
+            # opened with the lock held, a compaction swapping in a new base can't change what we read
+            base = open(self.path, 'rb') if len(selected) else None
+        return self._windowRows(base, selected, overlay, added)
+
+    def _windowRows(self, base, selected, overlay, added):
+        if base is not None:
+            with base:
+                order = sorted(range(len(selected)), key=selected.offsets.__getitem__)
+                previous = None
+                for slot in order:
+                    offset = selected.offsets[slot]
+                    if offset == previous:
+                        continue  # a row of the window that the log also changed
+                    previous = offset
+                    transactionId = selected.ids[slot]
+                    if transactionId in overlay:
+                        row = overlay[transactionId]
+                        if row is not None:
+                            yield rowDate(row), row
+                        continue
+                    base.seek(offset)
+                    row = parseLine(base.readline(), self.encoding)
+                    yield selected.ordinals[slot], withId(row, transactionId)
+        # added since the last compaction, after the base rows like in the file
+        for transactionId in sorted(added):
+            yield rowDate(overlay[transactionId]), overlay[transactionId]
+
+# one date index per file, shared in the process
+_dateIndexes = {}
+_dateIndexesLock = threading.Lock()
+
+def getDateIndex(path):
+    key = os.path.abspath(path)
+    with _dateIndexesLock:
+        if key not in _dateIndexes:
+            _dateIndexes[key] = DateIndex(path)
+        return _dateIndexes[key]
@@ -0,0 +1,346 @@
+import csv
+import itertools
+import json
+import locale
+import os
+import struct
+import threading
+from array import array
+from transactionStore import getLedgerLock, readBaseMeta, _signature, _grewFrom, LOG_SUFFIX, TMP_SUFFIX
+from transactionTable import rowId, withId, ID_COLUMN
+from transactionBinary import openLedger, BINARY_SUFFIX
+
+# id -> byte offset of the row in the base CSV, one int64 per id
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"TXIDX002"
+# magic, base inode, base size, base mtime, rows, highest id, rows missing their id or date, base tail
+INDEX_HEADER = struct.Struct("<8sQQqQQQ16s")
+OFFSET = struct.Struct("<q")
+NO_OFFSET = -1
+
+# ids spread out more than this per row are kept in a dict instead of the dense file
+MAX_IDS_PER_ROW = 4
+
+# last bytes of the indexed base file kept in the header, tells an appended file from a rewritten one
+TAIL_BYTES = 16
+
+def parseLine(line, encoding):
+    """One CSV record from a line of the base file"""
+    if b'"' not in line:
+        text = line.rstrip(b"\r\n").decode(encoding)
+        return text.split(",") if text else []
+    return next(csv.reader([line.decode(encoding)]), [])
+
+def scanBase(path, encoding, start=0, position=0, end=None):
+    """Yield (offset, position, row) for the base file rows from byte offset start"""
+    with open(path, 'rb') as f:
+        yield from scanFile(f, encoding, start, position, end)
+
+def scanFile(f, encoding, start=0, position=0, end=None):
+    f.seek(start)
+    offset = start
+    for line in f:
+        if end is not None and offset >= end:
+            break
+        yield offset, position, parseLine(line, encoding)
+        offset += len(line)
+        position += 1
+
+def readTail(path, size):
+    with open(path, 'rb') as f:
+        f.seek(max(0, size - TAIL_BYTES))
+        return f.read(min(size, TAIL_BYTES))
+
+def appendedTo(path, header, signature):
+    """Whether the base file only grew since a sidecar header (inode, size, mtime, ..., tail) was written"""
+    return (header[1] == signature[0] and header[2] < signature[1]
+            and readTail(path, header[2]).ljust(TAIL_BYTES, b"\0") == header[-1])
+
+def needsMigration(row):
+    return len(row) >= 3 and (len(row) <= ID_COLUMN or not row[3])
+
+class OffsetEntries:
+    """(id, offset) pairs of the rows collected in two arrays, 16 bytes per row instead of a tuple"""
+
+    def __init__(self):
+        self.ids = array('q')
+        self.offsets = array('q')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return zip(self.ids, self.offsets)
+
+    def append(self, transactionId, offset):
+        self.ids.append(transactionId)
+        self.offsets.append(offset)
+
+    def dense(self, maxId):
+        """The offsets by id as the index file keeps them, NO_OFFSET for ids without a row"""
+        offsets = array('q', [NO_OFFSET]) * (maxId + 1)
+        for transactionId, offset in self:
+            offsets[transactionId] = offset
+        return offsets
+
+def writeIndexFile(path, signature, offsets, rows, maxId, migrate):
+    indexPath = path + INDEX_SUFFIX
+    # several processes may rebuild at once, each writes its own temporary file
+    tmpPath = f"{indexPath}.{os.getpid()}.{threading.get_ident()}{TMP_SUFFIX}"
+    with open(tmpPath, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, signature[0], signature[1], signature[2], rows, maxId, migrate,
+                                  readTail(path, signature[1])))
+        offsets.tofile(f)
+    os.replace(tmpPath, indexPath)
+
+class TransactionIndex:
+    """Finds one transaction by id without loading the ledger
+
+    The base CSV is reached through the on-disk id -> offset index, changes
+    that are still in the mutation log are kept in a small overlay.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.logPath = path + LOG_SUFFIX
+        self.indexPath = path + INDEX_SUFFIX
+        self.encoding = locale.getpreferredencoding(False)
+        self.lock = threading.RLock()
+        self.ledgerLock = getLedgerLock(path)
+        self.reset()
+
+    def reset(self):
+        self.baseSignature = None
+        self.rows = 0  # rows in the base file, ids of old rows are their row number
+        self.maxId = 0
+        self.migrate = 0  # base rows without a stored id or date
+        self.sparseOffsets = None
+        self.offsetsLoaded = False
+        self.metaNextId = 1
+        self.binary = None  # BinaryLedger of the base file, see loadBinary
+        self.binaryChecked = False
+        self.resetLog()
+
+    def resetLog(self):
+        self.logSignature = None
+        self.logOffset = 0
+        self.overlay = {}  # id -> latest row from the log, None once deleted
+        self.baseSeq = self.lastSeq = 0
+        self.maxLogId = 0
+
+    @property
+    def nextId(self):
+        self.loadOffsets()
+        return max(self.metaNextId, self.maxId + 1, self.maxLogId + 1)
+
+    def refresh(self):
+        with self.lock, self.ledgerLock.hold():
+            baseSignature = _signature(self.path)
+            logSignature = _signature(self.logPath)
+            if baseSignature != self.baseSignature:
+                # the id -> offset index itself is only read (or built) once something needs it
+                self.baseSignature = baseSignature
+                self.offsetsLoaded = False
+                # readers still going through the old mapping keep it open until they finish
+                self.binary = None
+                self.binaryChecked = False
+                meta = readBaseMeta(self.path)
+                self.resetLog()
+                self.baseSeq = self.lastSeq = meta["seq"]
+                self.metaNextId = meta["nextId"]
+            if logSignature != self.logSignature:
+                if not (self.logSignature is None or _grewFrom(self.logSignature, logSignature)):
+                    seq = self.baseSeq
+                    self.resetLog()
+                    self.baseSeq = self.lastSeq = seq
+                if logSignature is not None:
+                    self.readLog()
+                self.logSignature = logSignature
+
+    def loadOffsets(self):
+        """Read the id index of the current base file (building it if needed), call with the lock held"""
+        if self.offsetsLoaded:
+            return
+        self.offsetsLoaded = True
+        signature = self.baseSignature
+        self.sparseOffsets = None
+        if signature is None:
+            self.rows = self.maxId = self.migrate = 0
+            return
+
+        header = self.readHeader()
+        if header and header[1:4] == signature:
+            self.rows, self.maxId, self.migrate = header[4:7]
+        elif header and appendedTo(self.path, header, signature):
+            # the base file was appended to, index just the new rows
+            self.rows, self.maxId, self.migrate = header[4:7]
+            self.extend(header[2], signature)
+        else:
+            self.rebuild(signature)
+
+    def loadBinary(self):
+        """The binary copy of the current base file if there is one that matches it, call with the lock held"""
+        if not self.binaryChecked:
+            self.binaryChecked = True
+            ledger = openLedger(self.path + BINARY_SUFFIX) if self.baseSignature is not None else None
+            if ledger is not None and not ledger.covers(self.path, self.baseSignature):
+                ledger.close()
+                ledger = None
+            self.binary = ledger
+        return self.binary
+
+    def readHeader(self):
+        try:
+            with open(self.indexPath, 'rb') as f:
+                header = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+        except (FileNotFoundError, struct.error):
+            return None
+        return header if header[0] == INDEX_MAGIC else None
+
+    def scan(self, start, signature):
+        entries = OffsetEntries()
+        for offset, position, row in scanBase(self.path, self.encoding, start, self.rows, signature[1]):
+            self.rows = position + 1
+            if len(row) < 3:
+                continue
+            transactionId = rowId(row, position)
+            if transactionId is None:
+                continue
+            entries.append(transactionId, offset)
+            self.maxId = max(self.maxId, transactionId)
+            if needsMigration(row):
+                self.migrate += 1
+        return entries
+
+    def rebuild(self, signature):
+        self.rows = self.maxId = self.migrate = 0
+        entries = self.scan(0, signature)
+        if self.maxId > MAX_IDS_PER_ROW * self.rows + 1024:
+            self.sparseOffsets = dict(entries)
+            return
+        writeIndexFile(self.path, signature, entries.dense(self.maxId), self.rows, self.maxId, self.migrate)
+
+    def extend(self, start, signature):
+        entries = self.scan(start, signature)
+        if self.maxId > MAX_IDS_PER_ROW * self.rows + 1024:
+            self.rebuild(signature)
+            return
+        with open(self.indexPath, 'r+b') as f:
+            f.seek(0, os.SEEK_END)
+            known = (f.tell() - INDEX_HEADER.size) // OFFSET.size
+            if self.maxId >= known:
+                (array('q', [NO_OFFSET]) * (self.maxId + 1 - known)).tofile(f)
+            for transactionId, offset in entries:
+                f.seek(INDEX_HEADER.size + transactionId * OFFSET.size)
+                f.write(OFFSET.pack(offset))
+            # header last, a crash before this just means extending again
+            f.seek(0)
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, signature[0], signature[1], signature[2],
+                                      self.rows, self.maxId, self.migrate, readTail(self.path, signature[1])))
+
+    def readLog(self):
+        with open(self.logPath, 'rb') as f:
+            f.seek(self.logOffset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record["seq"] <= self.lastSeq:
+                continue
+            transactionId = record["id"]
+            self.overlay[transactionId] = record.get("row") if record["op"] != "delete" else None
+            if record["op"] == "add":
+                self.maxLogId = max(self.maxLogId, transactionId)
+            self.lastSeq = record["seq"]
+        self.logOffset += end
+
+    def baseOffset(self, transactionId):
+        self.loadOffsets()
+        if self.sparseOffsets is not None:
+            return self.sparseOffsets.get(transactionId)
+        if self.baseSignature is None or transactionId > self.maxId:
+            return None
+        with open(self.indexPath, 'rb') as f:
+            f.seek(INDEX_HEADER.size + transactionId * OFFSET.size)
+            offset = OFFSET.unpack(f.read(OFFSET.size))[0]
+        return None if offset == NO_OFFSET else offset
+
+    def readRowAt(self, offset):
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            line = f.readline()
+        return parseLine(line, self.encoding)
+
+    def getRow(self, transactionId):
+        """Current row of a transaction (with its id), None if there isn't one"""
+        with self.lock, self.ledgerLock.hold():
+            self.refresh()
+            if transactionId in self.overlay:
+                return self.overlay[transactionId]
+            binary = self.loadBinary()
+            if binary is not None and binary.idsSorted:
+                # a binary search over the mapped records, the one row found is decoded
+                position = binary.find(transactionId)
+                if position is not None:
+                    row = binary.row(position)
+                    return withId(row, transactionId) if len(row) >= 3 else None
+                if binary.size == self.baseSignature[1]:
+                    return None  # not in the base file at all
+            offset = self.baseOffset(transactionId)
+            if offset is None:
+                return None
+            row = self.readRowAt(offset)
+            return withId(row, transactionId) if len(row) >= 3 else None
+
+    def iterRows(self):
+        """Every row of the ledger in order, ids filled in (for rewriting the base file)
+
+        Takes a snapshot right away, the base file must not be replaced while
+        the rows are read.
+        """
+        return self._iterRows(dict(self.overlay), self.baseSignature, self.loadBinary())
+
+    def _iterRows(self, overlay, baseSignature, binary):
+        if baseSignature is not None:
+            with open(self.path, 'rb') as f:
+                yield from self._iterBase(f, overlay, baseSignature, binary)
+        # added since the last compaction, ids are handed out in order
+        for transactionId in sorted(overlay):
+            if overlay[transactionId] is not None:
+                yield overlay[transactionId]
+
+    def _iterBase(self, f, overlay, baseSignature, binary):
+        if binary is None:
+            rows = scanFile(f, self.encoding, 0, 0, baseSignature[1])
+        else:
+            # the rows the binary copy has are decoded from the mapping as they are read, only
+            # rows appended to the CSV since it was written are parsed
+            rows = itertools.chain(
+                ((None, position, row) for position, row in enumerate(binary.iterRows())),
+                scanFile(f, self.encoding, binary.size, len(binary), baseSignature[1]))
+        for offset, position, row in rows:
+            if len(row) < 3:
+                yield row
+                continue
+            transactionId = rowId(row, position)
+            if transactionId in overlay:
+                row = overlay.pop(transactionId)
+                if row is None:
+                    continue
+            yield withId(row, transactionId) if transactionId is not None else row
+
+# one index per file, shared in the process
+_indexes = {}
+_indexesLock = threading.Lock()
+
+def getIndex(path):
+    key = os.path.abspath(path)
+    with _indexesLock:
+        if key not in _indexes:
+            _indexes[key] = TransactionIndex(path)
+        return _indexes[key]
+
+def lookupTransaction(path, transactionId):
+    return getIndex(path).getRow(transactionId)
@@ -0,0 +1,73 @@
+from transactionTable import TYPE_INVALID, NO_ID
+
+# descriptions are indexed by every substring up to this long
+GRAM_LENGTH = 3
+
+def grams(text, length):
+    return {text[i:i + length] for i in range(len(text) - length + 1)}
+
+class KeywordIndex:
+    """Substring search over the descriptions of a TransactionTable
+
+    Every distinct description is indexed by its lowercase 1-, 2- and
+    3-grams. A keyword's grams narrow it down to a few descriptions, those
+    are checked with the same "keyword in description" test as before and
+    the table's per-description id lists give the transactions.
+    """
+
+    def __init__(self):
+        self.table = None
+        self.reset()
+
+    def reset(self):
+        self.grams = {}  # gram -> descIds containing it
+        self.lowered = []  # lowercase descPool, as far as it is indexed
+
+    def sync(self, table):
+        """Follow the table the store hands out (a new one after a full reload)"""
+        if table is not self.table:
+            self.table = table
+            self.reset()
+            table.trackDescriptions()
+        # the description pool only ever grows
+        for descId in range(len(self.lowered), len(table.descPool)):
+            desc = table.descPool[descId].lower()
+            self.lowered.append(desc)
+            for length in range(1, GRAM_LENGTH + 1):
+                for gram in grams(desc, length):
+                    descIds = self.grams.get(gram)
+                    if descIds is None:
+                        descIds = self.grams[gram] = set()
+                    descIds.add(descId)
+
+    def current(self, table):
+        """Whether every description of table is indexed, another reader of the store may have grown it"""
+        return table is self.table and len(self.lowered) == len(table.descPool)
+
+    def usable(self):
+        # repeated or broken ids (hand-edited files) are searched the slow way
+        return self.table.idsUnique()
+
+    def matchingDescriptions(self, keyword):
+        keyword = keyword.lower()
+        length = min(len(keyword), GRAM_LENGTH)
+        candidates = None
+        for gram in sorted(grams(keyword, length), key=lambda gram: len(self.grams.get(gram, ()))):
+            descIds = self.grams.get(gram)
+            if not descIds:
+                return []
+            candidates = set(descIds) if candidates is None else candidates & descIds
+            if not candidates:
+                return []
+        return [descId for descId in candidates if keyword in self.lowered[descId]]
+
+    def search(self, keyword):
+        """Slots of the valid transactions whose description contains keyword, in ledger order"""
+        table = self.table
+        positions = []
+        for descId in self.matchingDescriptions(keyword):
+            for transactionId in table.descPostings.get(descId, ()):
+                if transactionId != NO_ID:
+                    positions.append(table.find(transactionId))
+        positions.sort()
+        return [position for position in positions if table.types[position] != TYPE_INVALID]
@@ -0,0 +1,46 @@
+from transactionIndex import getIndex
+from money import toCents
+from transactionTable import parseId, ID_COLUMN, NO_ID, NO_DATE
+from transactionTotals import rowDate
+
+# Generator stages for going through the ledger one row at a time. A
+# pipeline like inWindow(datedRows(validRows(ledgerRows(path))), ...) only
+# ever holds the row it is on, so memory stays flat however big the file is.
+
+def ledgerRows(path):
+    """Every row of the ledger in order (base file plus log), read as they are used"""
+    index = getIndex(path)
+    with index.lock, index.ledgerLock.hold():
+        index.refresh()
+        rows = index.iterRows()
+        # opens the base file, a compaction swapping in a new one can't change what we read after this
+        first = next(rows, None)
+    if first is None:
+        return
+    yield first
+    yield from rows
+
+def validRows(rows):
+    """Rows with at least Type, Description and Amount"""
+    return (row for row in rows if len(row) >= 3)
+
+def withIds(rows):
+    """(id, row) pairs, NO_ID for rows whose ID column is broken"""
+    for row in rows:
+        transactionId = parseId(row[ID_COLUMN]) if len(row) > ID_COLUMN else None
+        yield transactionId or NO_ID, row
+
+def datedRows(rows):
+    """(date ordinal, row) pairs, NO_DATE for rows without a (valid) date"""
+    for row in rows:
+        yield rowDate(row), row
+
+def inWindow(entries, startOrdinal, endOrdinal):
+    """(ordinal, row) pairs dated startOrdinal..endOrdinal, rows without a date always pass"""
+    for entry in entries:
+        if entry[0] == NO_DATE or startOrdinal <= entry[0] <= endOrdinal:
+            yield entry
+
+def rowCents(row):
+    """Amount of a row in cents, a row whose amount isn't a number raises the ValueError it always has"""
+    return toCents(row[2])
@@ -0,0 +1,343 @@
+import contextlib
+import csv
+import io
+import json
+import locale
+import os
+import threading
+import zlib
+from transactionTable import TransactionTable
+from transactionBinary import openLedger, BINARY_SUFFIX
+
+try:
+    import fcntl
+except ImportError:  # no file locks on windows, single writer assumed
+    fcntl = None
+
+# how many bytes before the last parsed line we compare on refresh
+# catches files that were rewritten in place and happen to grow
+TAIL_CHECK_BYTES = 64
+
+# files that sit next to the base CSV
+LOG_SUFFIX = ".log"  # append-only mutation log (see mutationLog.py)
+META_SUFFIX = ".meta"  # last log sequence number already in the base file
+LOCK_SUFFIX = ".lock"
+TMP_SUFFIX = ".tmp"
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+def versionOf(baseSignature, logSignature):
+    """Short text that changes with either file, for cursors and cached results"""
+    return format(zlib.crc32(repr((baseSignature, logSignature)).encode()), "08x")
+
+def ledgerVersion(path):
+    return versionOf(_signature(path), _signature(path + LOG_SUFFIX))
+
+def _grewFrom(old, new):
+    return old is not None and new is not None and new[0] == old[0] and new[1] > old[1]
+
+def readBaseMeta(path):
+    """Meta data of the base file: seq (last log record folded into it) and nextId"""
+    metaPath = path + META_SUFFIX
+    # a compaction that crashed after swapping in the new base but before its meta
+    if os.path.exists(metaPath + TMP_SUFFIX) and not os.path.exists(path + TMP_SUFFIX):
+        metaPath = metaPath + TMP_SUFFIX
+    meta = {"seq": 0, "nextId": 1}
+    try:
+        with open(metaPath, 'r') as f:
+            meta.update(json.load(f))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return meta
+
+def isMigrated(path):
+    """Whether every row of the base file is known to have its id and date, without reading it
+
+    The meta holds the signature of the last base file that was written (or
+    checked) that way, a base file changed any other way is checked again.
+    """
+    signature = _signature(path)
+    return signature is None or readBaseMeta(path).get("migrated") == list(signature)
+
+class LedgerLock:
+    """File lock shared by every process that reads or writes one ledger
+
+    Readers take it shared, writers exclusive. Nested use in the same process
+    is fine as long as an exclusive hold is the outer one.
+    """
+
+    def __init__(self, path):
+        self.lockPath = path + LOCK_SUFFIX
+        self.threadLock = threading.RLock()
+        self.depth = 0
+        self.exclusive = False
+        self.file = None
+
+    @contextlib.contextmanager
+    def hold(self, exclusive=False):
+        with self.threadLock:
+            if self.depth == 0:
+                if fcntl is not None:
+                    self.file = open(self.lockPath, 'a')
+                    fcntl.flock(self.file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                self.exclusive = exclusive
+            elif exclusive and not self.exclusive:
+                raise RuntimeError("cannot upgrade a shared ledger lock")
+            self.depth += 1
+            try:
+                yield
+            finally:
+                self.depth -= 1
+                if self.depth == 0 and self.file is not None:
+                    fcntl.flock(self.file, fcntl.LOCK_UN)
+                    self.file.close()
+                    self.file = None
+
+class TableLock:
+    """Lets any number of threads read a store's table while none changes it
+
+    Writers take writing() with the store's lock held, so there is only
+    ever one; it waits for the readers already in, and new readers wait
+    for it.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writers = 0
+
+    @contextlib.contextmanager
+    def reading(self):
+        with self.condition:
+            self.condition.wait_for(lambda: not self.writers)
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.readers -= 1
+                self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def writing(self):
+        with self.condition:
+            self.writers += 1
+            self.condition.wait_for(lambda: not self.readers)
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writers -= 1
+                self.condition.notify_all()
+
+class TransactionStore:
+    """Parsed copy of a transactions CSV plus its mutation log
+
+    The base CSV and the log are only re-read when they change, and when
+    they only grew just the new part is parsed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.logPath = path + LOG_SUFFIX
+        self.encoding = locale.getpreferredencoding(False)  # same as a plain open()
+        self.lock = threading.RLock()
+        self.ledgerLock = getLedgerLock(path)
+        self.tableLock = TableLock()
+        self.reset()
+
+    def getTable(self):
+        """Return the current table (shared, do not modify it)"""
+        with self.lock:
+            self.refresh()
+            return self.table
+
+    def isCurrent(self):
+        """Whether the table already matches the files, i.e. refresh() would change nothing"""
+        with self.lock, self.ledgerLock.hold():
+            return self.loaded and (_signature(self.path), _signature(self.logPath)) == (self.signature, self.logSignature)
+
+    def getRows(self):
+        """Return the current rows as a new list"""
+        return list(self.getTable().iterRows())
+
+    def reset(self):
+        self.table = TransactionTable()
+        self.loaded = False
+        self.signature = None  # (inode, size, mtime) of the base file when we last read it
+        self.offset = 0  # byte offset just past the last complete line we parsed
+        self.partialRows = 0  # rows parsed from an unterminated last line
+        self.tailBytes = b""
+        self.logSignature = None
+        self.logOffset = 0
+        self.baseSeq = 0
+        self.lastSeq = 0  # newest log record applied to the table
+        self.generation = 0  # bumped by every compaction
+
+    def refresh(self):
+        with self.lock, self.ledgerLock.hold():
+            baseSignature = _signature(self.path)
+            logSignature = _signature(self.logPath)
+            if self.loaded and (baseSignature, logSignature) == (self.signature, self.logSignature):
+                return
+
+            # base rows that were only appended can go after what we have,
+            # unless log records were applied on top of them already
+            baseOk = baseSignature == self.signature or (
+                self.lastSeq == self.baseSeq
+                and _grewFrom(self.signature, baseSignature)
+                and self.tailMatches())
+            logOk = logSignature == self.logSignature or (
+                self.logSignature is None or _grewFrom(self.logSignature, logSignature))
+            if not (self.loaded and baseOk and logOk):
+                meta = readBaseMeta(self.path)
+                if self.canRebase(meta):
+                    self.rebase(meta, baseSignature)
+                    logSignature = self.logSignature
+                else:
+                    self.reset()
+                    self.baseSeq = self.lastSeq = meta["seq"]
+                    self.generation = meta.get("generation", 0)
+
+            if baseSignature != self.signature and baseSignature is not None:
+                if self.offset == 0 and not len(self.table):
+                    self.loadBinary(baseSignature)
+                self.readFrom(self.offset)
+            if logSignature != self.logSignature and logSignature is not None:
+                self.readLog(self.logOffset)
+
+            self.signature, self.logSignature = baseSignature, logSignature
+            self.loaded = True
+
+    def canRebase(self, meta):
+        # a plain compaction of what we have, and the log still has every record we haven't applied
+        return (self.loaded
+                and meta.get("keepsView")
+                and meta.get("generation", 0) == self.generation + 1
+                and meta.get("logStart", 0) <= self.lastSeq)
+
+    def rebase(self, meta, baseSignature):
+        """Keep the parsed table across a compaction instead of parsing the new base file"""
+        self.signature = baseSignature
+        self.offset = baseSignature[1] if baseSignature else 0
+        self.partialRows = 0
+        self.tailBytes = b""
+        if baseSignature:
+            with open(self.path, 'rb') as f:
+                f.seek(max(0, self.offset - TAIL_CHECK_BYTES))
+                self.tailBytes = f.read()
+        self.baseSeq = meta["seq"]
+        self.generation = meta["generation"]
+        # the new log starts with records we may have applied already, those are skipped
+        self.logSignature = _signature(self.logPath)
+        self.logOffset = 0
+        if self.logSignature is not None:
+            self.readLog(0)
+
+    def loadBinary(self, baseSignature):
+        """Start from the binary copy of the base file (see transactionBinary.py) if it is up to date"""
+        ledger = openLedger(self.path + BINARY_SUFFIX)
+        if ledger is None:
+            return
+        with ledger:
+            if not ledger.covers(self.path, baseSignature):
+                return
+            self.table = ledger.toTable()
+            self.offset = ledger.size
+        # rows appended to the CSV since are parsed from there as usual
+        with open(self.path, 'rb') as f:
+            f.seek(max(0, self.offset - TAIL_CHECK_BYTES))
+            self.tailBytes = f.read(self.offset - f.tell())
+
+    def tailMatches(self):
+        if not self.tailBytes:
+            return True
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset - len(self.tailBytes))
+            return f.read(len(self.tailBytes)) == self.tailBytes
+
+    def readFrom(self, offset):
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+
+        # drop rows from an unterminated line, we parse it again below
+        if self.partialRows:
+            self.table.truncate(len(self.table) - self.partialRows)
+            self.partialRows = 0
+
+        end = data.rfind(b"\n") + 1
+        complete, rest = data[:end], data[end:]
+
+        self.table.appendRows(self.parseBytes(complete))
+        self.offset = offset + len(complete)
+        if complete:
+            tail = (self.tailBytes + complete)[-TAIL_CHECK_BYTES:]
+            self.tailBytes = tail
+
+        # a last line without a newline still counts as a row
+        if rest:
+            before = len(self.table)
+            self.table.appendRows(self.parseBytes(rest))
+            self.partialRows = len(self.table) - before
+
+    def parseBytes(self, data):
+        if not data:
+            return []
+        text = data.decode(self.encoding)
+        return csv.reader(io.StringIO(text, newline=''))
+
+    def readLog(self, offset):
+        with open(self.logPath, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+
+        # a torn last line is left for the next writer to clean up
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                self.applyRecord(json.loads(line))
+        self.logOffset = offset + end
+
+    def applyRecord(self, record):
+        seq = record["seq"]
+        if seq <= self.lastSeq:  # already part of the base file
+            return
+        op = record["op"]
+        position = self.table.find(record["id"])
+        if op == "add":
+            if position is None:
+                self.table.appendRow(record["row"])
+        elif position is not None:
+            if op == "edit":
+                self.table.setRow(position, record["row"])
+            elif op == "delete":
+                self.table.deleteRow(position)
+        self.lastSeq = seq
+
+# one store and lock per file so every caller in a process shares them
+_stores = {}
+_locks = {}
+_storesLock = threading.Lock()
+
+def getLedgerLock(path):
+    key = os.path.abspath(path)
+    with _storesLock:
+        if key not in _locks:
+            _locks[key] = LedgerLock(path)
+        return _locks[key]
+
+def getStore(path):
+    key = os.path.abspath(path)
+    with _storesLock:
+        store = _stores.get(key)
+    if store is None:
+        store = TransactionStore(path)
+        with _storesLock:
+            store = _stores.setdefault(key, store)
+    return store
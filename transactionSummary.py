@@ -1,16 +1,42 @@
 import datetime
-import csv
-import zmq
+import multiprocessing
+import os
+import threading
+from money import formatCents
+from transactionTable import rowId, formatDate, NO_DATE
+from transactionDates import getDateIndex
+from transactionIndex import getIndex, parseLine
+from transactionTotals import rowDate, getTotals
+from transactionStore import ledgerVersion
+from transactionPipeline import ledgerRows, validRows, datedRows, inWindow, rowCents
+import transactionArrays
+from resultCache import ResultCache, processCache, disabledReply, addCacheOptions, DEFAULT_ENTRIES, DEFAULT_MB
+from servicePool import serve, serviceParser, encodeJson, makeCursor, readPage, READ, END, DEFAULT_WORKERS
 
 MAX_DESC_LENGTH = 35
 MAX_NUM_DIGITS = 10
 
-def receiveInfo(socket):
+CHUNKS_PER_PROCESS = 4  # byte ranges handed to each pool process, evens out uneven chunks
+READ_BLOCK = 1 << 20
+
+PAGE_LINES = 100  # transaction lines on a summary page unless a limit is given
+STREAM_CHUNK = 1 << 16  # bytes of summary text per streamed message
+
+ROLLUP_LIMIT = 10  # descriptions in a "rollup description" reply unless another number is asked for
+
+summaryProcesses = 1  # set by main(), above 1 summaries run on a process pool
+useArrays = transactionArrays.available()  # NumPy engine for the serial summaries, set by main()
+# replies to repeated summaries, turned on by main() unless the readers are processes
+resultCache = ResultCache(0)
+
+def parseInfo(message):
     isStart, time, isEnd = 0, 0, 0
     
-    message = socket.recv()
-    
-    command, days = message.decode().split(" ")
+    try:
+        # options after the time range are read by handleRequest
+        command, days = message.decode().split(" ")[:2]
+    except ValueError:
+        return isStart, time, isEnd
     if command == "summary":
         isStart = 1
         time = days
@@ -20,175 +46,608 @@ def receiveInfo(socket):
     return isStart, time, isEnd
 
 def parseCSV(path):
-    array = []
-    with open(path, 'r') as csvfile:
-        csvreader = csv.reader(csvfile, delimiter=',')
-        for row in csvreader:
-            array.append(row)
+    # rows are read as the summary goes, the ledger is never held in memory
+    return ledgerRows(path)
+
+def dateRange(timeRange):
+    endDate = datetime.date.today()
+    try:
+        # Convert timeRange to integer for date filtering
+        daysBack = int(timeRange)
+        startDate = endDate - datetime.timedelta(days=daysBack)
+    except ValueError:
+        # Handle invalid time range
+        daysBack = 30  # Default to 30 days
+        startDate = endDate - datetime.timedelta(days=daysBack)
+    return startDate, endDate
+
+def loadWindow(path, timeRange):
+    # only the rows the date index puts in the window (and undated ones), not the whole file
+    startDate, endDate = dateRange(timeRange)
+    return getDateIndex(path).window(startDate.toordinal(), endDate.toordinal())
+
+def formatLine(desc, dateStr, sign, amount):
+    # Add date to display if available
+    displayDesc = desc
+    if dateStr != "N/A":
+        displayDesc = f"{desc} ({dateStr})"
     
-    return array
+    # Ensure description fits within column width
+    if len(displayDesc) > MAX_DESC_LENGTH - 2:
+        displayDesc = displayDesc[:MAX_DESC_LENGTH-5] + "..."
+        
+    return f"{displayDesc.ljust(MAX_DESC_LENGTH)}| {sign}${amount}\n"
 
-def createSummary(array, timeRange):
-    string = ''
-    totalExpense = 0
+def formatTotals(totalIncome, totalExpense):
+    string = "-"*(MAX_DESC_LENGTH+MAX_NUM_DIGITS) + "\n"
+    string += "Total Income" + " "*(MAX_DESC_LENGTH - 12) + f"| ${formatCents(totalIncome)}\n"
+    string += "Total Expense" + " "*(MAX_DESC_LENGTH - 13) + f"| ${formatCents(totalExpense)}\n"
+    
+    string += "Net Income" + " "*(MAX_DESC_LENGTH - 10)
+    if totalExpense > totalIncome:
+        string += f"| -${formatCents(totalExpense - totalIncome)}\n"
+    elif totalIncome > totalExpense:
+        string += f"| +${formatCents(totalIncome - totalExpense)}\n"
+    else:
+        string += f"| $0\n"
+    
+    string += "-"*(MAX_DESC_LENGTH+MAX_NUM_DIGITS) + "\n"
+    return string
+
+def summaryHeader(title):
+    line = "-"*(MAX_DESC_LENGTH+MAX_NUM_DIGITS) + "\n"
+    return line + title + "\n" + line
+
+class SummaryPage:
+    """Which transaction lines of a summary are written, the totals still cover every row
+
+    count is set to the number of lines there were once the summary is read.
+    """
+
+    def __init__(self, offset, limit):
+        self.offset = offset
+        self.end = offset + limit
+        self.count = 0
+
+    def bounds(self, number, length):
+        """(start, stop) of the part of a block of length lines, the first one number, that is on the page"""
+        return min(max(self.offset - number, 0), length), min(max(self.end - number, 0), length)
+
+def allSummaryParts(rows, page=None):
+    """The "all" summary piece by piece, only the running totals are kept"""
+    totalExpense = 0  # in cents
     totalIncome = 0
+    number = 0
     
-    # Determine date range
-    endDate = datetime.date.today()
+    yield summaryHeader("All Transaction Info")
     
-    if timeRange == "all":
-        string += "-"*(MAX_DESC_LENGTH+MAX_NUM_DIGITS) + "\n"
-        string += "All Transaction Info\n"
-        string += "-"*(MAX_DESC_LENGTH+MAX_NUM_DIGITS) + "\n"
-        
-        for line in array:
-            if len(line) < 3:  # Skip rows that don't have enough data
-                continue
-            
-            # Get transaction data    
-            transType, desc, amount = line[0], line[1], line[2]
-            dateStr = line[3] if len(line) >= 4 else "N/A"
-            
-            sign = '+'
-            if transType == "expense":
-                sign = '-'
-                totalExpense += float(amount)
-            else:
-                totalIncome += float(amount)
-            
-            # Add date to display if available
-            displayDesc = desc
-            if dateStr != "N/A":
-                displayDesc = f"{desc} ({dateStr})"
-            
-            # Ensure description fits within column width
-            if len(displayDesc) > MAX_DESC_LENGTH - 2:
-                displayDesc = displayDesc[:MAX_DESC_LENGTH-5] + "..."
-                
-            string += f"{displayDesc.ljust(MAX_DESC_LENGTH)}| {sign}${amount}\n"
-            
-        string += "-"*(MAX_DESC_LENGTH+MAX_NUM_DIGITS) + "\n"
-        string += "Total Income" + " "*(MAX_DESC_LENGTH - 12) + f"| ${totalIncome:.2f}\n"
-        string += "Total Expense" + " "*(MAX_DESC_LENGTH - 13) + f"| ${totalExpense:.2f}\n"
+    for row in validRows(rows):  # Skip rows that don't have enough data
+        dateStr = row[3] if len(row) >= 4 and row[3] else "N/A"
         
-        string += "Net Income" + " "*(MAX_DESC_LENGTH - 10)
-        if totalExpense > totalIncome:
-            string += f"| -${totalExpense - totalIncome:.2f}\n"
-        elif totalIncome > totalExpense:
-            string += f"| +${totalIncome - totalExpense:.2f}\n"
+        sign = '+'
+        if row[0] == "expense":
+            sign = '-'
+            totalExpense += rowCents(row)
         else:
-            string += f"| $0\n"
+            totalIncome += rowCents(row)
         
-        string += "-"*(MAX_DESC_LENGTH+MAX_NUM_DIGITS) + "\n"
+        if page is None or page.offset <= number < page.end:
+            yield formatLine(row[1], dateStr, sign, row[2])
+        number += 1
     
-    else:
-        try:
-            # Convert timeRange to integer for date filtering
-            daysBack = int(timeRange)
-            startDate = endDate - datetime.timedelta(days=daysBack)
-        except ValueError:
-            # Handle invalid time range
-            daysBack = 30  # Default to 30 days
-            startDate = endDate - datetime.timedelta(days=daysBack)
+    if page is not None:
+        page.count = number
+    yield formatTotals(totalIncome, totalExpense)
+
+def windowSummaryParts(entries, timeRange, page=None):
+    """The summary for a date window piece by piece, from (ordinal, row) pairs"""
+    totalExpense = 0  # in cents
+    totalIncome = 0
+    number = 0
+    
+    startDate, endDate = dateRange(timeRange)
+    startOrdinal, endOrdinal = startDate.toordinal(), endDate.toordinal()
+    
+    yield summaryHeader(f"{startDate} -> {endDate} Transaction Info")
+    
+    # Track if we found any transactions in the date range
+    transactionsInRange = False
+    
+    # the date index also hands out rows changed in the log, so every date is checked
+    for ordinal, row in inWindow(entries, startOrdinal, endOrdinal):
+        if len(row) < 3:  # Skip rows that don't have enough data
+            continue
+        
+        if ordinal != NO_DATE:
+            dateStr = row[3]
+            transactionsInRange = True
+        else:
+            # No date in the transaction, we can't filter it
+            dateStr = "N/A"
         
-        string += "-"*(MAX_DESC_LENGTH+MAX_NUM_DIGITS) + "\n"
-        string += f"{startDate} -> {endDate} Transaction Info\n"
-        string += "-"*(MAX_DESC_LENGTH+MAX_NUM_DIGITS) + "\n"
+        sign = '+'
+        if row[0] == "expense":
+            sign = '-'
+            totalExpense += rowCents(row)
+        else:
+            totalIncome += rowCents(row)
         
-        # Track if we found any transactions in the date range
-        transactionsInRange = False
+        if page is None or page.offset <= number < page.end:
+            yield formatLine(row[1], dateStr, sign, row[2])
+        number += 1
+    
+    if page is not None:
+        page.count = number
+    if not transactionsInRange:
+        yield "No transactions found in this date range.\n"
         
-        for line in array:
-            if len(line) < 3:  # Skip rows that don't have enough data
-                continue
-                
-            transType, desc, amount = line[0], line[1], line[2]
-            
-            # Check if this transaction has a date
-            if len(line) >= 4:
-                try:
-                    transDate = datetime.datetime.strptime(line[3], "%Y-%m-%d").date()
-                    # Only include transactions within date range
-                    if transDate < startDate or transDate > endDate:
-                        continue
-                    dateStr = line[3]
-                    transactionsInRange = True
-                except ValueError:
-                    # If date is invalid, treat as if no date
-                    dateStr = "N/A"
-            else:
-                # No date in the transaction, we can't filter it
+    yield formatTotals(totalIncome, totalExpense)
+
+def lineSign(row):
+    return '-' if row[0] == "expense" else '+'
+
+def arrayAllSummaryParts(rows, page=None):
+    """allSummaryParts() with the totals added up on NumPy arrays a block of rows at a time"""
+    totalExpense = 0  # in cents
+    totalIncome = 0
+    number = 0
+    
+    yield summaryHeader("All Transaction Info")
+    
+    for block in transactionArrays.blocks(validRows(rows)):
+        income, expense = transactionArrays.maskedTotals(
+            transactionArrays.expenseMask(block), transactionArrays.centsColumn(block))
+        totalIncome += income
+        totalExpense += expense
+        if page is not None:
+            start, stop = page.bounds(number, len(block))
+            number += len(block)
+            block = block[start:stop]
+        yield "".join(formatLine(row[1], row[3] if len(row) >= 4 and row[3] else "N/A", lineSign(row), row[2])
+                      for row in block)
+    
+    if page is not None:
+        page.count = number
+    yield formatTotals(totalIncome, totalExpense)
+
+def arrayWindowSummaryParts(entries, timeRange, page=None):
+    """windowSummaryParts() with the window filter and totals done on NumPy arrays"""
+    totalExpense = 0  # in cents
+    totalIncome = 0
+    number = 0
+    
+    startDate, endDate = dateRange(timeRange)
+    startOrdinal, endOrdinal = startDate.toordinal(), endDate.toordinal()
+    
+    yield summaryHeader(f"{startDate} -> {endDate} Transaction Info")
+    
+    transactionsInRange = False
+    
+    for block in transactionArrays.blocks(entries):
+        block = [entry for entry in block if len(entry[1]) >= 3]  # Skip rows that don't have enough data
+        dates = transactionArrays.dateColumn([ordinal for ordinal, row in block])
+        keep = transactionArrays.windowMask(dates, startOrdinal, endOrdinal)
+        # the date index hands out rows in the window, only rows changed in the log can fall outside
+        selected = block if keep.all() else [entry for entry, kept in zip(block, keep.tolist()) if kept]
+        rows = [row for ordinal, row in selected]
+        income, expense = transactionArrays.maskedTotals(
+            transactionArrays.expenseMask(rows), transactionArrays.centsColumn(rows))
+        totalIncome += income
+        totalExpense += expense
+        transactionsInRange = transactionsInRange or transactionArrays.anyDated(dates, keep)
+        if page is not None:
+            start, stop = page.bounds(number, len(selected))
+            number += len(selected)
+            selected = selected[start:stop]
+        yield "".join(formatLine(row[1], row[3] if ordinal != NO_DATE else "N/A", lineSign(row), row[2])
+                      for ordinal, row in selected)
+    
+    if page is not None:
+        page.count = number
+    if not transactionsInRange:
+        yield "No transactions found in this date range.\n"
+        
+    yield formatTotals(totalIncome, totalExpense)
+
+def summaryParts(path, timeRange, page=None):
+    """The summary of the ledger at path piece by piece, with the NumPy engine if it's in use
+
+    With a SummaryPage only the transaction lines on it are written.
+    """
+    if timeRange == "all":
+        return (arrayAllSummaryParts if useArrays else allSummaryParts)(parseCSV(path), page)
+    entries = loadWindow(path, timeRange)
+    return (arrayWindowSummaryParts if useArrays else windowSummaryParts)(entries, timeRange, page)
+
+def pagedSummary(path, timeRange, offset=None, limit=None, cursor=None):
+    """Reply dict with one page of a summary: its header, limit transaction lines from offset and the totals
+
+    Every page still reads the whole ledger (or date window) for the
+    totals, a stream is the way to get all of a long summary.
+    """
+    version = ledgerVersion(path)
+    try:
+        offset, limit = readPage(offset, limit, cursor, version, PAGE_LINES)
+    except ValueError as e:
+        return {"success": False, "message": str(e)}
+    
+    page = SummaryPage(offset, limit)
+    summary = "".join(summaryParts(path, timeRange, page))
+    return {
+        "success": True,
+        "summary": summary,
+        "offset": offset,
+        "count": page.count,
+        "nextCursor": makeCursor(version, page.end, limit) if page.end < page.count else None
+    }
+
+def streamSummary(path, timeRange):
+    """The summary as chunks of about STREAM_CHUNK bytes, each sent as soon as it is written"""
+    chunk = bytearray()
+    try:
+        for part in summaryParts(path, timeRange):
+            chunk += part.encode()
+            if len(chunk) >= STREAM_CHUNK:
+                yield chunk
+                chunk = bytearray()
+        print(f"Streamed summary for: {timeRange}")
+    except Exception as e:
+        summaryString = f"Error generating summary: {str(e)}"
+        print(summaryString)
+        chunk += summaryString.encode()
+    yield chunk
+
+def summaryOptions(words):
+    """Options after the time range of a summary request: stream, offset=N, limit=N, cursor=C"""
+    options = {"stream": False}
+    for word in words:
+        name, equals, value = word.partition("=")
+        if word == "stream":
+            options["stream"] = True
+        elif equals and name in ("offset", "limit", "cursor"):
+            options[name] = value
+        else:
+            raise ValueError(f"Unknown summary option {word}")
+    return options
+
+def createSummary(rows, timeRange):
+    """Summary of any iterable of rows, they are streamed through once"""
+    if timeRange == "all":
+        return "".join(allSummaryParts(rows))
+    return "".join(windowSummaryParts(datedRows(validRows(rows)), timeRange))
+
+def createWindowSummary(entries, timeRange):
+    """Same as createSummary(rows, timeRange) for a date window, from the (ordinal, row) pairs loadWindow found"""
+    return "".join(windowSummaryParts(entries, timeRange))
+
+class BaseChanged(Exception):
+    """The base file was replaced (compacted) while a parallel summary read it"""
+
+def chunkLines(rows, window):
+    """(summary text, income, expense, any dated row) for rows that are already in ledger order
+
+    window is (start ordinal, end ordinal) for a date window summary, None for "all".
+    """
+    lines = []
+    totalExpense = 0  # in cents
+    totalIncome = 0
+    transactionsInRange = False
+    for row in validRows(rows):
+        if window is None:
+            dateStr = row[3] if len(row) >= 4 and row[3] else "N/A"
+        else:
+            ordinal = rowDate(row)
+            if ordinal == NO_DATE:
                 dateStr = "N/A"
-            
-            sign = '+'
-            if transType == "expense":
-                sign = '-'
-                totalExpense += float(amount)
+            elif window[0] <= ordinal <= window[1]:
+                dateStr = row[3]
+                transactionsInRange = True
             else:
-                totalIncome += float(amount)
-            
-            # Add date to display if available
-            displayDesc = desc
-            if dateStr != "N/A":
-                displayDesc = f"{desc} ({dateStr})"
-            
-            # Ensure description fits within column width
-            if len(displayDesc) > MAX_DESC_LENGTH - 2:
-                displayDesc = displayDesc[:MAX_DESC_LENGTH-5] + "..."
-                
-            string += f"{displayDesc.ljust(MAX_DESC_LENGTH)}| {sign}${amount}\n"
-            
-        if not transactionsInRange:
-            string += "No transactions found in this date range.\n"
-            
-        string += "-"*(MAX_DESC_LENGTH+MAX_NUM_DIGITS) + "\n"
-        string += "Total Income" + " "*(MAX_DESC_LENGTH - 12) + f"| ${totalIncome:.2f}\n"
-        string += "Total Expense" + " "*(MAX_DESC_LENGTH - 13) + f"| ${totalExpense:.2f}\n"
+                continue
         
-        string += "Net Income" + " "*(MAX_DESC_LENGTH - 10)
-        if totalExpense > totalIncome:
-            string += f"| -${totalExpense - totalIncome:.2f}\n"
-        elif totalIncome > totalExpense:
-            string += f"| +${totalIncome - totalExpense:.2f}\n"
+        sign = '+'
+        if row[0] == "expense":
+            sign = '-'
+            totalExpense += rowCents(row)
         else:
-            string += f"| $0\n"
+            totalIncome += rowCents(row)
         
-        string += "-"*(MAX_DESC_LENGTH+MAX_NUM_DIGITS) + "\n"
+        lines.append(formatLine(row[1], dateStr, sign, row[2]))
+    return "".join(lines), totalIncome, totalExpense, transactionsInRange
 
-    return string
+def openBase(path, inode):
+    f = open(path, 'rb')
+    if os.fstat(f.fileno()).st_ino != inode:
+        f.close()
+        raise BaseChanged(path)
+    return f
 
-def sendSummary(socket, string):
-    socket.send(str.encode(string))
-    return
+def countLines(task):
+    """Rows of the base file between two line-aligned byte offsets (runs in a pool process)"""
+    path, inode, start, end = task
+    count = 0
+    last = b"\n"
+    with openBase(path, inode) as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(READ_BLOCK, remaining))
+            if not block:
+                break
+            count += block.count(b"\n")
+            last = block[-1:]
+            remaining -= len(block)
+    # a last line without a newline is still a row
+    return count + (last != b"\n")
 
-def main():
-    context = zmq.Context()
-    socket = context.socket(zmq.REP)
-    socket.bind("tcp://*:5555")
+def summariseChunk(task):
+    """chunkLines() of the base file rows between two byte offsets, plus the log ids they replaced (runs in a pool process)"""
+    path, encoding, inode, start, end, position, overlay, window = task
+    matched = []
     
-    print("Transaction Summary (A)")
+    def rows(f):
+        nonlocal position
+        offset = start
+        f.seek(start)
+        for line in f:
+            if offset >= end:
+                break
+            offset += len(line)
+            position += 1
+            row = parseLine(line, encoding)
+            # the log's version of a row replaces it, as in TransactionIndex.iterRows
+            if overlay and len(row) >= 3:
+                transactionId = rowId(row, position - 1)
+                if transactionId in overlay:
+                    matched.append(transactionId)
+                    row = overlay[transactionId]
+                    if row is None:
+                        continue
+            yield row
     
-    while True:
-        isStart, timeRange, isEnd = receiveInfo(socket)
-        if isStart:
-            filePath = "./transactions.csv"
-            try:
-                transactionsArray = parseCSV(filePath)
-                summaryString = createSummary(transactionsArray, timeRange)
-                sendSummary(socket, summaryString)
-                print(f"Sent summary for: {timeRange}")
-            except Exception as e:
-                errorMsg = f"Error generating summary: {str(e)}"
-                sendSummary(socket, errorMsg)
-                print(errorMsg)
-            
-        if isEnd:
-            socket.send(b"Transaction Summary Microservice shutting down")
-            print("Transaction Summary Microservice shutting down")
-            break
-    
-    socket.close()
-    context.term()
+    with openBase(path, inode) as f:
+        result = chunkLines(rows(f), window)
+    return result + (matched,)
+
+def chunkBounds(path, size, count):
+    """Byte offsets splitting the first size bytes of path into count ranges at line starts"""
+    bounds = [0]
+    with open(path, 'rb') as f:
+        for number in range(1, count):
+            target = size * number // count
+            if target == 0:
+                continue
+            f.seek(target - 1)
+            f.readline()  # to the start of the next line
+            bound = min(f.tell(), size)
+            if bound > bounds[-1]:
+                bounds.append(bound)
+    if size > bounds[-1]:
+        bounds.append(size)
+    return bounds
+
+_pool = None
+_poolSize = 0
+_poolLock = threading.Lock()
+
+def getPool(processes):
+    global _pool, _poolSize
+    with _poolLock:
+        if _pool is None or _poolSize != processes:
+            if _pool is not None:
+                _pool.terminate()
+            # spawned, not forked: the service has threads and a zmq context a fork would copy
+            _pool = multiprocessing.get_context("spawn").Pool(processes)
+            _poolSize = processes
+        return _pool
+
+def parallelSummary(path, timeRange, processes=None):
+    """The same text as createSummary(parseCSV(path), timeRange), the base file parsed on a process pool
+
+    The base file is split into line-aligned byte ranges, each pool process
+    parses and totals its ranges and the parts are joined in file order.
+    """
+    processes = processes or os.cpu_count() or 1
+    for attempt in range(3):
+        try:
+            return _parallelSummary(path, timeRange, getPool(processes), processes)
+        except BaseChanged:
+            pass  # a compaction swapped in a new base file, start over from a new snapshot
+    return createSummary(parseCSV(path), timeRange)
+
+def _parallelSummary(path, timeRange, pool, processes):
+    index = getIndex(path)
+    with index.lock, index.ledgerLock.hold():
+        index.refresh()
+        overlay, baseSignature, encoding = dict(index.overlay), index.baseSignature, index.encoding
+    
+    if timeRange == "all":
+        window = None
+        title = "All Transaction Info"
+    else:
+        startDate, endDate = dateRange(timeRange)
+        window = (startDate.toordinal(), endDate.toordinal())
+        title = f"{startDate} -> {endDate} Transaction Info"
+    
+    results = []
+    if baseSignature is not None:
+        inode, size = baseSignature[0], baseSignature[1]
+        bounds = chunkBounds(path, size, processes * CHUNKS_PER_PROCESS)
+        ranges = list(zip(bounds, bounds[1:]))
+        # rows from before ids were stored are known by their row number, which only matters for the log's rows
+        positions = [0] * len(ranges)
+        if overlay:
+            counts = pool.map(countLines, [(path, inode, start, end) for start, end in ranges], chunksize=1)
+            for number in range(1, len(ranges)):
+                positions[number] = positions[number - 1] + counts[number - 1]
+        tasks = [(path, encoding, inode, start, end, position, overlay, window)
+                 for (start, end), position in zip(ranges, positions)]
+        results = pool.map(summariseChunk, tasks, chunksize=1)
+    
+    # added since the last compaction, ids are handed out in order
+    matched = set()
+    for result in results:
+        matched.update(result[4])
+    added = [overlay[transactionId] for transactionId in sorted(overlay)
+             if transactionId not in matched and overlay[transactionId] is not None]
+    results.append(chunkLines(added, window) + ([],))
+    
+    parts = [summaryHeader(title)]
+    parts.extend(result[0] for result in results)
+    if window is not None and not any(result[3] for result in results):
+        parts.append("No transactions found in this date range.\n")
+    parts.append(formatTotals(sum(result[1] for result in results), sum(result[2] for result in results)))
+    return "".join(parts)
+
+def encodeParts(parts):
+    """The reply bytes of a summary, encoded part by part so the text is only held once"""
+    reply = bytearray()
+    for part in parts:
+        reply += part.encode()
+    return reply
+
+def periodLabel(ordinal, period):
+    date = datetime.date.fromordinal(ordinal)
+    if period == "week":
+        year, week, _ = date.isocalendar()
+        return f"{year}-W{week:02d}"
+    if period == "month":
+        return f"{date.year:04d}-{date.month:02d}"
+    if period == "year":
+        return f"{date.year:04d}"
+    return date.isoformat()
+
+def rollupTotals(income, expense, other, rows):
+    return {"income": income, "expense": expense, "other": other, "net": income - expense, "count": rows}
+
+def periodRollup(path, period):
+    """Totals per day, week, month or year (amounts in cents), grouped from the running per-day totals"""
+    days = getTotals(path).dayTotals()
+    groups = transactionArrays.groupTotals([(ordinal, *totals) for ordinal, totals in days.items()], period)
+    results = [{"period": periodLabel(start, period), "start": formatDate(start), **rollupTotals(*totals)}
+               for start, *totals in groups]
+    undated = days.get(NO_DATE)
+    return {
+        "success": True,
+        "rollup": period,
+        "count": len(results),
+        "results": results,
+        "undated": rollupTotals(*undated) if undated else None
+    }
+
+def descriptionRollup(path, limit=ROLLUP_LIMIT):
+    """The descriptions with the most spent and their totals (amounts in cents), limit None for all of them"""
+    descriptions = getTotals(path).descriptionTotals()
+    ranked = sorted(descriptions.items(), key=lambda item: (-item[1][1], item[0]))
+    if limit is not None:
+        ranked = ranked[:limit]
+    results = [{"description": desc, **rollupTotals(*totals)} for desc, totals in ranked]
+    return {
+        "success": True,
+        "rollup": "description",
+        "count": len(results),
+        "descriptions": len(descriptions),
+        "results": results
+    }
+
+def rollup(path, words):
+    """Reply dict for "rollup day|week|month|year" and "rollup description [N|all]" """
+    if len(words) == 1 and words[0] in transactionArrays.PERIODS:
+        return periodRollup(path, words[0])
+    if words[:1] == ["description"] and len(words) <= 2:
+        limit = words[1] if len(words) == 2 else str(ROLLUP_LIMIT)
+        if limit == "all":
+            return descriptionRollup(path, None)
+        if limit.isdigit() and int(limit) > 0:
+            return descriptionRollup(path, int(limit))
+        return {"success": False, "message": "The number of descriptions must be a positive number or all"}
+    return {"success": False, "message": "Use rollup day|week|month|year or rollup description [N|all]"}
+
+def routeRequest(message):
+    # summaries only read, any number can run at once
+    return END if parseInfo(message)[2] else READ
+
+def handleRequest(message):
+    isStart, timeRange, isEnd = parseInfo(message)
+    if isEnd:
+        print("Transaction Summary Microservice shutting down")
+        return b"Transaction Summary Microservice shutting down"
+    
+    filePath = "./transactions.csv"
+    words = message.decode(errors="replace").split()
+    if words == ["cache", "stats"]:
+        if not resultCache.enabled:
+            return encodeJson(disabledReply())
+        return encodeJson({"success": True, **resultCache.stats()})
+    if words[:1] == ["rollup"]:
+        # answered from the running totals, the ledger isn't read
+        try:
+            result = rollup(filePath, words[1:])
+            print(f"Sent rollup for: {' '.join(words[1:])}")
+        except Exception as e:
+            print(f"Error generating rollup: {e}")
+            result = {"success": False, "message": f"Error: {str(e)}"}
+        return encodeJson(result)
+    if not isStart:
+        return b"Unknown command"
+    
+    try:
+        options = summaryOptions(words[2:])
+    except ValueError as e:
+        return str.encode(str(e))
+    if options.pop("stream"):
+        if options:
+            return b"A streamed summary has no offset, limit or cursor"
+        # sent to the client a chunk at a time, the reply is never held whole
+        return streamSummary(filePath, timeRange)
+    
+    if options:
+        try:
+            reply = resultCache.reply(summaryKey(timeRange, options), ledgerVersion(filePath),
+                                      lambda: encodeJson(pagedSummary(filePath, timeRange, **options)))
+            print(f"Sent summary page for: {timeRange}")
+        except Exception as e:
+            print(f"Error generating summary: {str(e)}")
+            reply = encodeJson({"success": False, "message": f"Error generating summary: {str(e)}"})
+        return reply
+    
+    try:
+        reply = resultCache.reply(summaryKey(timeRange, options), ledgerVersion(filePath),
+                                  lambda: summaryReply(filePath, timeRange))
+        print(f"Sent summary for: {timeRange}")
+    except Exception as e:
+        summaryString = f"Error generating summary: {str(e)}"
+        print(summaryString)
+        reply = str.encode(summaryString)
+    return reply
+
+def summaryKey(timeRange, options):
+    # the same summary of the same ledger on the same day is the same text, "30" and "030" included
+    return ("summary", "all" if timeRange == "all" else dateRange(timeRange), tuple(sorted(options.items())))
+
+def summaryReply(filePath, timeRange):
+    if summaryProcesses > 1:
+        return str.encode(parallelSummary(filePath, timeRange, summaryProcesses))
+    return encodeParts(summaryParts(filePath, timeRange))
+
+def main(workers=DEFAULT_WORKERS, processes=False, asyncRuntime=False, parallel=1, engine="numpy",
+         cacheEntries=DEFAULT_ENTRIES, cacheBytes=DEFAULT_MB << 20):
+    global summaryProcesses, useArrays, resultCache
+    print("Transaction Summary (A)")
+    summaryProcesses = parallel
+    resultCache = processCache(cacheEntries, cacheBytes, processes)
+    useArrays = engine == "numpy" and transactionArrays.available()
+    if engine == "numpy" and not useArrays:
+        print("NumPy isn't installed, summaries use the pure-Python engine")
+    # a slow full summary no longer holds up the requests behind it
+    serve("tcp://*:5555", handleRequest, routeRequest, workers, processes, asyncRuntime)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = serviceParser("Transaction Summary (A)")
+    parser.add_argument("--parallel", type=int, default=1, metavar="N",
+                        help="split each full summary across N processes")
+    parser.add_argument("--engine", choices=["numpy", "python"], default="numpy",
+                        help="add up summaries on NumPy arrays (the default, if NumPy is installed) or row by row")
+    args = addCacheOptions(parser).parse_args()
+    main(args.workers, args.processes, args.asyncRuntime, args.parallel, args.engine,
+         args.cache_entries, args.cache_mb << 20)
@@ -0,0 +1,361 @@
+import bisect
+import datetime
+import functools
+from array import array
+from money import parseAmount, formatAmount, toCents
+
+# values of the type column
+TYPE_INCOME = 0
+TYPE_EXPENSE = 1
+TYPE_OTHER = 2  # some other type text, the original row is kept in rawRows
+TYPE_INVALID = 3  # less than Type, Description, Amount - skipped everywhere
+
+TYPE_NAMES = {"income": TYPE_INCOME, "expense": TYPE_EXPENSE}
+
+NO_DATE = 0  # date ordinal for rows without a date
+NO_ID = 0  # id of invalid rows
+MAX_CENTS = 2**63 - 1  # what fits in the int64 amount column
+
+# CSV columns: Type, Description, Amount, Date, ID
+ID_COLUMN = 4
+
+DATE_CACHE_SIZE = 1 << 14  # distinct date strings remembered, about 45 years of days
+
+def parseDate(text):
+    """Day ordinal for a YYYY-MM-DD date, None if it isn't one"""
+    if len(text) != 10 or not text.isascii() or text[4] != "-" or text[7] != "-":
+        return None
+    year, month, day = text[:4], text[5:7], text[8:]
+    if not (year.isdigit() and month.isdigit() and day.isdigit()):
+        return None
+    try:
+        return datetime.date(int(year), int(month), int(day)).toordinal()
+    except ValueError:
+        return None
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def dateOrdinal(text):
+    """Day ordinal of a date strptime(text, "%Y-%m-%d") accepts, None for one it rejects
+
+    YYYY-MM-DD is read directly, only other forms strptime takes (like
+    2024-1-5) go through it. Remembered per string, a ledger has a few
+    dates on many rows.
+    """
+    ordinal = parseDate(text)
+    if ordinal is None:
+        try:
+            ordinal = datetime.datetime.strptime(text, "%Y-%m-%d").toordinal()
+        except ValueError:
+            return None
+    return ordinal
+
+def formatDate(ordinal):
+    return datetime.date.fromordinal(ordinal).isoformat()
+
+def parseId(text):
+    """Transaction id from "005" or "5", None if it isn't one"""
+    if not isinstance(text, str) or not text.isascii() or not text.isdigit():
+        return None
+    transactionId = int(text)
+    return transactionId if transactionId > 0 else None
+
+def formatId(transactionId):
+    return f"{transactionId:03d}"  # 001, 002, etc.
+
+def withId(row, transactionId):
+    """Row with its id in the ID column (rows without a date get an empty one)"""
+    if len(row) < 3 or len(row) > ID_COLUMN:
+        return row
+    return row + [""] * (ID_COLUMN - len(row)) + [str(transactionId)]
+
+def rowId(row, position):
+    """Stored id of a CSV row, rows from before ids were stored use their row number"""
+    if len(row) > ID_COLUMN:
+        return parseId(row[ID_COLUMN])
+    return position + 1
+
+class TransactionTable:
+    """Transactions stored column by column instead of one list/dict per row
+
+    Rows the typed columns can't reproduce exactly (odd amounts, odd dates,
+    unknown types, extra columns) keep their original row in rawRows.
+    Rows are kept in file order, which is also increasing id order.
+    """
+
+    def __init__(self):
+        self.types = bytearray()
+        self.ids = array('q')
+        self.amounts = array('q')  # cents
+        self.amountScales = bytearray()  # digits after the decimal point as written
+        self.dates = array('i')  # day ordinals, NO_DATE if there isn't one
+        self.descIds = array('I')  # index into descPool
+        self.descPool = []
+        self.descLookup = {}
+        self.rawRows = {}
+        self.idsSorted = True
+        self.idSlots = None  # id -> slot, only built if the ids are out of order
+        self.descPostings = None  # descId -> sorted ids using it, see trackDescriptions
+        self.amountOrder = None  # type -> (cents, ids) sorted by amount, see trackAmounts
+
+    @classmethod
+    def fromRows(cls, rows):
+        table = cls()
+        table.appendRows(rows)
+        return table
+
+    def __len__(self):
+        return len(self.types)
+
+    def internDescription(self, desc):
+        descId = self.descLookup.get(desc)
+        if descId is None:
+            descId = len(self.descPool)
+            self.descPool.append(desc)
+            self.descLookup[desc] = descId
+        return descId
+
+    def appendRows(self, rows):
+        for row in rows:
+            self.appendRow(row)
+
+    def encodeRow(self, row, position):
+        """Column values (type, id, cents, scale, date, descId) for a row and whether they reproduce it exactly"""
+        if len(row) < 3:
+            return (TYPE_INVALID, NO_ID, 0, 0, NO_DATE, self.internDescription("")), False
+
+        exact = len(row) <= ID_COLUMN + 1
+        transType = TYPE_NAMES.get(row[0])
+        if transType is None:
+            transType = TYPE_OTHER
+            exact = False
+
+        transactionId = rowId(row, position)
+        if transactionId is None or (len(row) > ID_COLUMN and formatId(transactionId) != row[ID_COLUMN]
+                                     and str(transactionId) != row[ID_COLUMN]):
+            transactionId = transactionId or NO_ID
+            exact = False
+
+        amount = parseAmount(row[2])
+        if amount is None or amount[0] > MAX_CENTS or formatAmount(*amount) != row[2]:
+            exact = False
+            try:
+                amount = (toCents(row[2]), 2)
+            except (ValueError, OverflowError):
+                amount = (0, 2)
+            if abs(amount[0]) > MAX_CENTS:
+                amount = (0, 2)
+
+        date = NO_DATE
+        if len(row) >= 4 and row[3]:
+            date = parseDate(row[3])
+            if date is None:
+                date = NO_DATE
+                exact = False
+
+        return (transType, transactionId, amount[0], amount[1], date, self.internDescription(row[1])), exact
+
+    def appendRow(self, row):
+        position = len(self.types)
+        (transType, transactionId, cents, scale, date, descId), exact = self.encodeRow(row, position)
+        # invalid rows (id 0) only keep the order at the very start
+        if self.ids and (transactionId < self.ids[-1] or transactionId == self.ids[-1] != NO_ID):
+            self.idsSorted = False
+        if self.idSlots is not None and transactionId != NO_ID:
+            self.idSlots[transactionId] = position
+        self.types.append(transType)
+        self.ids.append(transactionId)
+        self.amounts.append(cents)
+        self.amountScales.append(scale)
+        self.dates.append(date)
+        self.descIds.append(descId)
+        if not exact:
+            self.rawRows[position] = row
+        if self.descPostings is not None:
+            self.addPosting(descId, transactionId)
+        if self.amountOrder is not None and exact and transType in self.amountOrder:
+            self.addAmount(transType, cents, transactionId)
+
+    def setRow(self, position, row):
+        # an edit keeps the transaction's id
+        (transType, _, cents, scale, date, descId), exact = self.encodeRow(row, position)
+        if self.descPostings is not None and descId != self.descIds[position]:
+            self.removePosting(self.descIds[position], self.ids[position])
+            self.addPosting(descId, self.ids[position])
+        oldAmount = self.amountEntry(position) if self.amountOrder is not None else None
+        self.types[position] = transType
+        self.amounts[position] = cents
+        self.amountScales[position] = scale
+        self.dates[position] = date
+        self.descIds[position] = descId
+        if exact:
+            self.rawRows.pop(position, None)
+        else:
+            self.rawRows[position] = row
+        if self.amountOrder is not None:
+            newAmount = self.amountEntry(position)
+            if newAmount != oldAmount:
+                if oldAmount is not None:
+                    self.removeAmount(*oldAmount)
+                if newAmount is not None:
+                    self.addAmount(*newAmount)
+
+    def deleteRow(self, position):
+        """Remove a slot, later slots move up by one like rows in the file"""
+        if self.descPostings is not None:
+            self.removePosting(self.descIds[position], self.ids[position])
+        if self.amountOrder is not None and self.amountEntry(position) is not None:
+            self.removeAmount(*self.amountEntry(position))
+        del self.types[position]
+        del self.ids[position]
+        del self.amounts[position]
+        del self.amountScales[position]
+        del self.dates[position]
+        del self.descIds[position]
+        if self.rawRows:
+            self.rawRows = {
+                (p - 1 if p > position else p): raw
+                for p, raw in self.rawRows.items() if p != position
+            }
+        self.idSlots = None
+
+    def truncate(self, length):
+        """Drop every slot from length onwards"""
+        for position in range(length, len(self.types)):
+            if self.descPostings is not None:
+                self.removePosting(self.descIds[position], self.ids[position])
+            if self.amountOrder is not None and self.amountEntry(position) is not None:
+                self.removeAmount(*self.amountEntry(position))
+        del self.types[length:]
+        del self.ids[length:]
+        del self.amounts[length:]
+        del self.amountScales[length:]
+        del self.dates[length:]
+        del self.descIds[length:]
+        for position in [p for p in self.rawRows if p >= length]:
+            del self.rawRows[position]
+        self.idSlots = None
+
+    def trackDescriptions(self):
+        """Keep the ids of every description's transactions from now on (for keyword search)"""
+        if self.descPostings is not None:
+            return
+        self.descPostings = {}
+        for position in range(len(self.types)):
+            self.addPosting(self.descIds[position], self.ids[position])
+
+    def addPosting(self, descId, transactionId):
+        postings = self.descPostings.get(descId)
+        if postings is None:
+            postings = self.descPostings[descId] = array('q')
+        if not postings or postings[-1] <= transactionId:
+            postings.append(transactionId)  # new rows usually have the highest id
+        else:
+            postings.insert(bisect.bisect_right(postings, transactionId), transactionId)
+
+    def removePosting(self, descId, transactionId):
+        postings = self.descPostings[descId]
+        index = bisect.bisect_left(postings, transactionId)
+        if index < len(postings) and postings[index] == transactionId:
+            del postings[index]
+
+    def trackAmounts(self):
+        """Keep the income and expense rows sorted by amount from now on
+
+        Rows in rawRows are left out, their amount column is only an approximation.
+        """
+        if self.amountOrder is not None:
+            return
+        entries = {TYPE_INCOME: [], TYPE_EXPENSE: []}
+        for position in range(len(self.types)):
+            transType = self.types[position]
+            if transType in entries and position not in self.rawRows:
+                entries[transType].append((self.amounts[position], self.ids[position]))
+        self.amountOrder = {}
+        for transType, pairs in entries.items():
+            pairs.sort()
+            self.amountOrder[transType] = (array('q', [cents for cents, _ in pairs]),
+                                           array('q', [transactionId for _, transactionId in pairs]))
+
+    def amountEntry(self, position):
+        transType = self.types[position]
+        if transType not in self.amountOrder or position in self.rawRows:
+            return None
+        return transType, self.amounts[position], self.ids[position]
+
+    def amountSlot(self, transType, cents, transactionId):
+        # first place (cents, id) could go in the type's sorted arrays
+        amounts, ids = self.amountOrder[transType]
+        low = bisect.bisect_left(amounts, cents)
+        high = bisect.bisect_right(amounts, cents, low)
+        return bisect.bisect_left(ids, transactionId, low, high)
+
+    def addAmount(self, transType, cents, transactionId):
+        amounts, ids = self.amountOrder[transType]
+        if not amounts or (amounts[-1], ids[-1]) <= (cents, transactionId):
+            slot = len(amounts)
+        else:
+            slot = self.amountSlot(transType, cents, transactionId)
+        amounts.insert(slot, cents)
+        ids.insert(slot, transactionId)
+
+    def removeAmount(self, transType, cents, transactionId):
+        amounts, ids = self.amountOrder[transType]
+        slot = self.amountSlot(transType, cents, transactionId)
+        if slot < len(amounts) and amounts[slot] == cents and ids[slot] == transactionId:
+            del amounts[slot]
+            del ids[slot]
+
+    def idsUnique(self):
+        """Whether every valid row can be found by its id
+
+        Hand-edited files can have repeated or broken ids.
+        """
+        if not self.idsSorted:
+            return False
+        # rows without an id (NO_ID) can only be at the start of a sorted table
+        unnumbered = bisect.bisect_right(self.ids, NO_ID)
+        return all(self.types[position] == TYPE_INVALID for position in range(unnumbered))
+
+    def find(self, transactionId):
+        """Slot holding a transaction id, None if there isn't one"""
+        if self.idsSorted:
+            position = bisect.bisect_left(self.ids, transactionId)
+            if position < len(self.ids) and self.ids[position] == transactionId:
+                return position
+            return None
+        if self.idSlots is None:
+            self.idSlots = {i: p for p, i in enumerate(self.ids) if i != NO_ID}
+        return self.idSlots.get(transactionId)
+
+    def row(self, position):
+        """The CSV row for a slot (Type, Description, Amount, Date, ID)"""
+        raw = self.rawRows.get(position)
+        if raw is not None:
+            return raw
+        date = self.dates[position]
+        return [
+            "income" if self.types[position] == TYPE_INCOME else "expense",
+            self.descPool[self.descIds[position]],
+            formatAmount(self.amounts[position], self.amountScales[position]),
+            formatDate(date) if date != NO_DATE else "",
+            str(self.ids[position]),
+        ]
+
+    def iterRows(self):
+        for position in range(len(self.types)):
+            yield self.row(position)
+
+    def transaction(self, position):
+        """Result dict in the format the clients expect, None for invalid rows"""
+        if self.types[position] == TYPE_INVALID:
+            return None
+        row = self.row(position)
+        transaction = {
+            "id": formatId(self.ids[position]),
+            "type": row[0],
+            "description": row[1],
+            "amount": row[2]
+        }
+        if len(row) >= 4 and row[3]:
+            transaction["date"] = row[3]
+        return transaction
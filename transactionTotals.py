@@ -0,0 +1,291 @@
+import json
+import os
+import threading
+from money import centsOrNone
+from transactionStore import getStore, getLedgerLock, readBaseMeta, _signature, LOG_SUFFIX, TMP_SUFFIX
+from transactionTable import TYPE_NAMES, TYPE_OTHER, TYPE_INVALID, NO_DATE, dateOrdinal
+
+# running totals of the ledger, kept next to the base CSV
+TOTALS_SUFFIX = ".totals"
+TOTALS_FORMAT = 2  # amounts with more than two decimals round with Decimal since 2
+# log records the ledger's writer applies before it saves the totals again
+SAVE_RECORDS = 1000
+
+def rowDate(row):
+    """Day ordinal of a row's date the way the summary reads it, NO_DATE if it has none"""
+    if len(row) < 4 or not row[3]:
+        return NO_DATE
+    ordinal = dateOrdinal(row[3])
+    return NO_DATE if ordinal is None else ordinal
+
+def rowTotals(row):
+    """(type, cents, date ordinal) a row adds to the totals, None for rows the summaries skip
+
+    cents is None if the amount isn't a number.
+    """
+    if len(row) < 3:
+        return None
+    transType = TYPE_NAMES.get(row[0], TYPE_OTHER)
+    return transType, centsOrNone(row[2]), rowDate(row)
+
+def addTo(groups, key, transType, cents, sign):
+    """Add a row's amount to the [income, expense, other, rows] of its group, dropping groups left empty"""
+    group = groups.get(key)
+    if group is None:
+        group = groups[key] = [0, 0, 0, 0]
+    group[transType] += sign * cents
+    group[3] += sign
+    if group[3] == 0:
+        del groups[key]
+
+class TotalsCache:
+    """Income/expense totals, counts, per-day and per-description totals of a ledger
+
+    Saved to disk together with the ledger version it belongs to (base file,
+    compaction generation and last log sequence number). New log records are
+    applied on top, so it is only rebuilt from the full ledger when the base
+    file was replaced by something other than a plain compaction. Applying
+    them happens in memory, the copy on disk (per-day and per-description
+    totals and all) is only rewritten by a rebuild, by the writer every
+    SAVE_RECORDS records and after each compaction.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.logPath = path + LOG_SUFFIX
+        self.cachePath = path + TOTALS_SUFFIX
+        # rebuilding reads the store's table, sharing its lock keeps the lock order simple
+        self.store = getStore(path)
+        self.lock = self.store.lock
+        self.ledgerLock = getLedgerLock(path)
+        self.loaded = False
+        self.clear()
+
+    def clear(self):
+        self.rows = 0  # every CSV record, invalid ones included
+        self.totals = [0, 0, 0]  # cents by type: income, expense, other
+        self.counts = [0, 0, 0]
+        self.invalid = [0, 0, 0]  # rows whose amount isn't a number, by type
+        self.days = {}  # ordinal -> [income, expense, other, rows]
+        self.descriptions = {}  # description -> [income, expense, other, rows]
+        self.seq = 0
+        self.savedSeq = 0  # seq of the copy on disk
+        self.generation = 0
+        self.signature = None
+        self.logSignature = None
+        self.logOffset = 0
+
+    def get(self):
+        """Current totals as a dict (rows, totals, counts, invalid)"""
+        with self.lock:
+            self.refresh()
+            return {
+                "rows": self.rows,
+                "totals": list(self.totals),
+                "counts": list(self.counts),
+                "invalid": list(self.invalid),
+            }
+
+    def dayTotals(self):
+        """Copy of the per-day totals, ordinal -> [income, expense, other, rows]"""
+        with self.lock:
+            self.refresh()
+            return {ordinal: list(day) for ordinal, day in self.days.items()}
+
+    def descriptionTotals(self):
+        """Copy of the per-description totals, description -> [income, expense, other, rows]"""
+        with self.lock:
+            self.refresh()
+            return {desc: list(totals) for desc, totals in self.descriptions.items()}
+
+    def refresh(self, rebuild=True, save=False):
+        """Bring the totals up to the ledger on disk
+
+        With rebuild=False nothing is read but the cache file and the log,
+        returns False if that isn't enough. save=True is for the ledger's
+        writer, it saves the totals once SAVE_RECORDS records went unsaved.
+        """
+        with self.lock, self.ledgerLock.hold():
+            baseSignature = _signature(self.path)
+            logSignature = _signature(self.logPath)
+            if self.loaded and (baseSignature, logSignature) == (self.signature, self.logSignature):
+                return True
+
+            meta = readBaseMeta(self.path)
+            if not self.matches(meta, baseSignature):
+                # another process may have saved a newer copy
+                self.load()
+                if not self.matches(meta, baseSignature):
+                    if rebuild:
+                        self.rebuild()
+                    return rebuild
+
+            if not self.catchUp(logSignature) or self.seq < meta["seq"]:
+                if not rebuild:
+                    self.loaded = False
+                    return False
+                self.rebuild()
+                return True
+            if save and self.seq - self.savedSeq >= SAVE_RECORDS:
+                self.save()
+            return True
+
+    def persist(self):
+        """Save the totals of the ledger as it is now, if the log is enough to get there
+
+        Called after a compaction: the log it trims may hold records the copy
+        on disk doesn't have yet, without them the next load would rebuild.
+        """
+        with self.lock:
+            if self.refresh(rebuild=False):
+                self.save()
+
+    def matches(self, meta, baseSignature):
+        if not self.loaded:
+            return False
+        if self.signature == baseSignature and self.generation == meta.get("generation", 0):
+            return True
+        # a plain compaction doesn't change the totals, the log still has every record we need
+        if (meta.get("keepsView")
+                and meta.get("generation", 0) == self.generation + 1
+                and meta.get("logStart", 0) <= self.seq):
+            self.signature = baseSignature
+            self.generation = meta["generation"]
+            self.logSignature = None
+            self.logOffset = 0
+            return True
+        return False
+
+    def catchUp(self, logSignature):
+        """Apply log records newer than ours, False if some are missing"""
+        if logSignature is None:
+            self.logSignature, self.logOffset = None, 0
+            return True
+        offset = self.logOffset
+        if (self.logSignature is None or logSignature[0] != self.logSignature[0]
+                or logSignature[1] < offset):
+            offset = 0  # the log was trimmed by a compaction
+
+        with open(self.logPath, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            seq = record["seq"]
+            if seq <= self.seq:
+                continue
+            if seq != self.seq + 1 or not self.applyRecord(record):
+                return False
+            self.seq = seq
+        self.logSignature = logSignature
+        self.logOffset = offset + end
+        return True
+
+    def applyRecord(self, record):
+        op = record["op"]
+        if op in ("edit", "delete"):
+            if record.get("old") is None:
+                return False
+            self.applyRow(record["old"], -1)
+        if op in ("add", "edit"):
+            self.applyRow(record["row"], 1)
+        return True
+
+    def applyRow(self, row, sign):
+        self.rows += sign
+        entry = rowTotals(row)
+        if entry is None:
+            return
+        transType, cents, ordinal = entry
+        if cents is None:
+            self.counts[transType] += sign
+            self.invalid[transType] += sign
+            return
+        self.add(transType, cents, ordinal, row[1], sign)
+
+    def add(self, transType, cents, ordinal, desc, sign=1):
+        self.totals[transType] += sign * cents
+        self.counts[transType] += sign
+        addTo(self.days, ordinal, transType, cents, sign)
+        addTo(self.descriptions, desc, transType, cents, sign)
+
+    def rebuild(self):
+        """Sum up the whole ledger (through the shared in-memory copy)"""
+        store = self.store
+        with store.lock:
+            table = store.getTable()
+            self.clear()
+            types, amounts, dates, rawRows = table.types, table.amounts, table.dates, table.rawRows
+            descIds, descPool = table.descIds, table.descPool
+            for position in range(len(types)):
+                raw = rawRows.get(position)
+                if raw is not None:
+                    self.applyRow(raw, 1)
+                    continue
+                self.rows += 1
+                if types[position] != TYPE_INVALID:
+                    self.add(types[position], amounts[position], dates[position], descPool[descIds[position]])
+            self.seq = store.lastSeq
+            self.generation = store.generation
+            self.signature = store.signature
+            self.logSignature = store.logSignature
+            self.logOffset = store.logOffset
+        self.loaded = True
+        self.save()
+
+    def load(self):
+        self.clear()
+        self.loaded = False
+        try:
+            with open(self.cachePath, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self.rows = data["rows"]
+        self.totals, self.counts, self.invalid = data["totals"], data["counts"], data["invalid"]
+        if data.get("format") != TOTALS_FORMAT:
+            return  # saved by an older version, rebuilt on the next refresh
+        self.days = {int(ordinal): day for ordinal, day in data["days"].items()}
+        self.descriptions = data["descriptions"]
+        self.seq, self.generation = data["seq"], data["generation"]
+        self.signature = tuple(data["signature"]) if data["signature"] else None
+        self.logSignature = tuple(data["logSignature"]) if data["logSignature"] else None
+        self.logOffset = data["logOffset"]
+        self.savedSeq = self.seq
+        self.loaded = True
+
+    def save(self):
+        data = {
+            "format": TOTALS_FORMAT,
+            "seq": self.seq,
+            "generation": self.generation,
+            "signature": self.signature,
+            "logSignature": self.logSignature,
+            "logOffset": self.logOffset,
+            "rows": self.rows,
+            "totals": self.totals,
+            "counts": self.counts,
+            "invalid": self.invalid,
+            "days": self.days,
+            "descriptions": self.descriptions,
+        }
+        # readers save a rebuild too, each writes its own temporary file
+        tmpPath = f"{self.cachePath}.{os.getpid()}.{threading.get_ident()}{TMP_SUFFIX}"
+        with open(tmpPath, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmpPath, self.cachePath)
+        self.savedSeq = self.seq
+
+# one cache per file, shared in the process
+_caches = {}
+_cachesLock = threading.Lock()
+
+def getTotals(path):
+    key = os.path.abspath(path)
+    with _cachesLock:
+        if key not in _caches:
+            _caches[key] = TotalsCache(path)
+        return _caches[key]